@@ -1,21 +1,65 @@
+from functools import reduce
+import operator
+
 from django.conf.urls import url
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
 from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
 from apps.b3_migration.models.switch import Switch
 from apps.b3_organization.models.organization import Organization
 
 
 def switch_on(modeladmin, request, queryset):
-    queryset.update(active=True)
+    queryset.toggle(True)
 
 
 def switch_off(modeladmin, request, queryset):
-    queryset.update(active=False)
+    queryset.toggle(False)
 
 
 switch_on.short_description = "Turn on all selected Switches"
 switch_off.short_description = "Turn off all selected Switches"
 
+SWITCH_CREATE_BATCH_SIZE = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids a full ``COUNT(*)`` on large, unfiltered tables.
+
+    On PostgreSQL the planner's row estimate from ``pg_class.reltuples`` is
+    used when the queryset has no filters and the estimate is above
+    :attr: `exact_count_threshold`. Filtered querysets, small tables and other
+    database backends fall back to the exact count
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = self._estimated_count()
+            if estimate is not None and \
+                    estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
+
+    def _estimated_count(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
 
 @admin.register(Switch)
 class SwitchAdmin(admin.ModelAdmin):
@@ -27,12 +71,19 @@ class SwitchAdmin(admin.ModelAdmin):
         'active',
     )
     list_filter = ('active', )
+    # `organization` and its site are rendered in every row -
+    # `Switch.__str__()` dereferences `organization` as well
+    list_select_related = ('organization', 'organization__site')
     search_fields = (
         'feature',
         'organization__site__name',
         'organization__showname',
         'organization__site__domain',
     )
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered `COUNT(*)` on filtered pages
+    show_full_result_count = False
+    raw_id_fields = ('organization', )
 
     def site(self, obj):
         return obj.organization.site
@@ -45,11 +96,52 @@ class SwitchAdmin(admin.ModelAdmin):
         return my_urls + urls
 
     def create_all_switches(self, request):
-        for feature in Switch.FEATURE_CHOICES:
-            for organization in Organization.objects.all():
-                Switch.objects.get_or_create(
-                    feature=feature[0], organization=organization
-                )
+        """
+        Create every missing (organization, feature) switch, inactive by
+        default.
+
+        The missing pairs are computed with a single anti-join query and
+        inserted in chunks of :const: `SWITCH_CREATE_BATCH_SIZE`, so the
+        number of queries does not grow with the number of organizations.
+        Pairs created concurrently after the anti-join ran are skipped as
+        conflicts, but still counted as created
+        """
+        features = [feature for feature, _ in Switch.FEATURE_CHOICES]
+        has_switch = {
+            f'has_{feature}': Exists(Switch.objects.filter(
+                organization=OuterRef('pk'), feature=feature))
+            for feature in features
+        }
+        missing_any = reduce(
+            operator.or_, (Q(**{name: False}) for name in has_switch))
+        organizations = Organization.objects.annotate(
+            **has_switch
+        ).filter(missing_any).values_list('pk', *has_switch)
+
+        created = 0
+        batch = []
+        for organization_id, *flags in organizations:
+            batch.extend(
+                Switch(organization_id=organization_id, feature=feature)
+                for feature, exists in zip(features, flags)
+                if not exists
+            )
+            if len(batch) >= SWITCH_CREATE_BATCH_SIZE:
+                created += self._bulk_create_switches(batch)
+                batch = []
+        if batch:
+            created += self._bulk_create_switches(batch)
+
+        self.message_user(request, f'Created {created} switches')
         return HttpResponseRedirect("../")
 
+    @staticmethod
+    def _bulk_create_switches(switches):
+        Switch.objects.bulk_create(
+            switches,
+            batch_size=SWITCH_CREATE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        return len(switches)
+
     actions = [switch_on, switch_off]
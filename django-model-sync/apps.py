@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class B3MigrationConfig(AppConfig):
+    name = 'apps.b3_migration'
+    verbose_name = 'Migration'
+
+    def ready(self):
+        from apps.b3_migration.model_descriptors.registry import registry
+
+        autodiscover_modules('sync_descriptors')
+        registry.compile()
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
+from apps.b3_migration.sync.dead_letters import record_failures
+from apps.b3_migration.sync.initial_sync.bulk import DEFAULT_CHUNK_SIZE
+from apps.b3_migration.sync.initial_sync.catch_up import (
+    DEFAULT_OVERLAP,
+    catch_up_sync,
+)
+from apps.b3_migration.sync.initial_sync.scheduler import \
+    run_in_dependency_order
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+
+
+class Command(BaseCommand):
+    help = (
+        'Sync the source instances modified since the last run of this '
+        'command, for descriptor pairs whose source descriptor declares a '
+        'modified_field. Meant to be scheduled every few minutes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'descriptor_ids',
+            nargs='*',
+            help='Ids of the registered descriptor pairs to catch up, '
+                 'defaults to all pairs with a modified_field')
+        parser.add_argument(
+            '--overlap',
+            type=int,
+            default=DEFAULT_OVERLAP,
+            help='Seconds before the last watermark that are synced again')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Initial number of source instances per chunk')
+        parser.add_argument(
+            '--rows-per-second',
+            type=int,
+            help='Maximal number of source instances synced per second, '
+                 'per descriptor pair')
+
+    def handle(self, *args, descriptor_ids, overlap, chunk_size,
+               rows_per_second, **options):
+        if not descriptor_ids:
+            descriptor_ids = [
+                pair.id for pair in registry.get_pairs()
+                if pair.source.descriptor.get('modified_field')
+            ]
+        try:
+            for descriptor_id in descriptor_ids:
+                pair = registry.get_pair(descriptor_id)
+                if not pair.source.descriptor.get('modified_field'):
+                    raise CommandError(
+                        f'{descriptor_id} has no modified_field')
+        except LookupError as exc:
+            raise CommandError(exc)
+
+        def sync_pair(pair):
+            stats = catch_up_sync(
+                pair.source.descriptor,
+                pair.target.descriptor,
+                checkpoint_id=pair.id,
+                overlap=overlap,
+                throttle=Throttle(
+                    chunk_size, rows_per_second=rows_per_second),
+            )
+            # Failing source instances are left unsynced, and behind the
+            # watermark
+            record_failures(pair.id, SyncDeadLetter.CREATE, stats.errors)
+            record_failures(
+                pair.id, SyncDeadLetter.UPDATE, stats.update_errors)
+            return stats
+
+        results = run_in_dependency_order(
+            descriptor_ids, sync_pair, on_result=self._write_result)
+
+        failed = [result for result in results if not result.succeeded]
+        if failed:
+            raise CommandError(
+                f'{len(failed)} of {len(results)} descriptor pairs failed '
+                f'or were skipped')
+
+    def _write_result(self, result):
+        pair_id = result.pair.id
+        if result.skipped:
+            self.stderr.write(f'{pair_id}: SKIPPED - a dependency failed')
+        elif result.error is not None:
+            self.stderr.write(f'{pair_id}: FAILED - {result.error}')
+        else:
+            self.stdout.write(
+                f'{pair_id}: {result.stats.processed} modified, '
+                f'{result.stats.updated} updated, '
+                f'{result.stats.created} created, '
+                f'{result.stats.failed} failed in '
+                f'{result.duration:.2f}s')
@@ -0,0 +1,262 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+
+import structlog as logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.models.switch import Switch
+from apps.b3_migration.sync.initial_sync.bulk import (
+    DEFAULT_CHUNK_SIZE,
+    bulk_sync,
+    get_source_queryset,
+)
+from apps.b3_migration.sync.initial_sync.reconciliation import compare
+from apps.b3_organization.models.organization import Organization
+
+logger = logging.getLogger(__name__)
+
+
+class CutoverError(Exception):
+    pass
+
+
+def get_cutover_descriptor_pairs(feature):
+    """
+    Get the (source descriptor, target descriptor) pairs that have to be in
+    sync before `feature` can be switched on for an organization.
+
+    They are configured in the `MODEL_SYNC_CUTOVER_DESCRIPTORS` setting,
+    which maps features to lists of registered descriptor pair ids, e.g.
+
+        MODEL_SYNC_CUTOVER_DESCRIPTORS = {
+            'new_basket': ['basket.basket->b3_basket.basket'],
+        }
+    """
+    configured = getattr(settings, 'MODEL_SYNC_CUTOVER_DESCRIPTORS', {})
+    if feature not in configured:
+        raise CommandError(
+            f'No descriptors configured for {feature} in '
+            f'MODEL_SYNC_CUTOVER_DESCRIPTORS')
+    try:
+        pairs = [
+            registry.get_pair(descriptor_id)
+            for descriptor_id in configured[feature]
+        ]
+    except LookupError as exc:
+        raise CommandError(
+            f'Invalid MODEL_SYNC_CUTOVER_DESCRIPTORS for {feature}: {exc}')
+    for pair in pairs:
+        if not pair.source.descriptor.get('organization_lookup'):
+            raise CommandError(
+                f'Invalid MODEL_SYNC_CUTOVER_DESCRIPTORS for {feature}: '
+                f'{pair.id} has no organization_lookup and cannot be cut '
+                f'over per organization')
+    return [
+        (pair.source.descriptor, pair.target.descriptor) for pair in pairs
+    ]
+
+
+def cutover_organization(organization_id, feature, descriptor_pairs,
+                         chunk_size):
+    """
+    Sync all rows of an organization, verify them and activate the feature
+    switch.
+
+    The rows are synced and compared chunk by chunk first. Only the rows
+    created in the meantime are synced inside the final transaction, which
+    activates the switch if none of them failed, so that it holds its
+    locks briefly
+    :return: (number of synced rows, duration in seconds)
+    """
+    started = time.monotonic()
+    synced = 0
+    for source_descriptor, target_descriptor in descriptor_pairs:
+        queryset = get_source_queryset(
+            source_descriptor, organization=organization_id)
+        synced += bulk_sync(
+            source_descriptor,
+            target_descriptor,
+            queryset=queryset,
+            chunk_size=chunk_size,
+            logging_prefix='CUTOVER',
+        ).created
+        # Rows created since are synced below, and updated ones by the
+        # auto sync
+        report = compare(
+            source_descriptor, target_descriptor, queryset,
+            chunk_size=chunk_size)
+        if report.mismatched_pks:
+            raise CutoverError(
+                f'{queryset.model.__name__} not in sync: '
+                f'{len(report.mismatched_pks)} mismatched')
+
+    with transaction.atomic():
+        for source_descriptor, target_descriptor in descriptor_pairs:
+            queryset = get_source_queryset(
+                source_descriptor, organization=organization_id)
+            stats = bulk_sync(
+                source_descriptor,
+                target_descriptor,
+                queryset=queryset,
+                chunk_size=chunk_size,
+                logging_prefix='CUTOVER',
+            )
+            if stats.failed:
+                raise CutoverError(
+                    f'{queryset.model.__name__} not in sync: '
+                    f'{stats.failed} failed')
+            synced += stats.created
+
+        Switch.objects.bulk_create(
+            [Switch(organization_id=organization_id, feature=feature)],
+            ignore_conflicts=True,
+        )
+        Switch.objects.filter(
+            organization_id=organization_id, feature=feature,
+        ).toggle(True)
+    return synced, time.monotonic() - started
+
+
+def cutover_organization_in_worker(*args):
+    """
+    Same as :function: `cutover_organization()`, in a worker thread
+    """
+    try:
+        return cutover_organization(*args)
+    finally:
+        # Every worker thread has its own connection
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Sync the data of organizations one at a time, verify it and '
+        'activate a feature switch for each organization that is in sync'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'feature',
+            choices=[feature for feature, _ in Switch.FEATURE_CHOICES],
+        )
+        parser.add_argument(
+            '--organization',
+            dest='organization_ids',
+            type=int,
+            nargs='+',
+            help='Organizations to cut over, defaults to all organizations '
+                 'without an active switch',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of organizations cut over concurrently, in worker '
+                 'threads. With 1, they are cut over in the main thread',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, feature, organization_ids, workers, chunk_size,
+               **options):
+        descriptor_pairs = get_cutover_descriptor_pairs(feature)
+
+        if organization_ids is None:
+            organization_ids = list(
+                Organization.objects.exclude(
+                    pk__in=Switch.objects.filter(
+                        feature=feature, active=True,
+                    ).values('organization_id')
+                ).values_list('pk', flat=True)
+            )
+
+        sizes = self._get_organization_sizes(
+            organization_ids, descriptor_pairs)
+        # Largest organizations first, so that the small ones fill the gaps
+        # at the end instead of one large organization running alone
+        queue = sorted(
+            organization_ids, key=lambda pk: sizes.get(pk, 0), reverse=True)
+
+        self.stdout.write(
+            f'Cutting over {len(queue)} organizations to {feature} with '
+            f'{workers} workers')
+
+        if workers == 1:
+            # No thread needed, organizations are cut over in order
+            results = (
+                (organization_id, partial(
+                    cutover_organization, organization_id, feature,
+                    descriptor_pairs, chunk_size))
+                for organization_id in queue
+            )
+            failed = self._report(feature, results)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(
+                        cutover_organization_in_worker,
+                        organization_id,
+                        feature,
+                        descriptor_pairs,
+                        chunk_size,
+                    ): organization_id
+                    for organization_id in queue
+                }
+                failed = self._report(feature, (
+                    (futures[future], future.result)
+                    for future in as_completed(futures)
+                ))
+
+        if failed:
+            raise CommandError(f'{failed} organizations failed')
+        self.stdout.write(self.style.SUCCESS(
+            f'Cut over {len(queue)} organizations to {feature}'))
+
+    def _report(self, feature, results):
+        """
+        Report the result of every organization
+        :param results: iterable of (organization id, callable returning
+            the result of :function: `cutover_organization()`) tuples
+        :return: number of failed organizations
+        """
+        failed = 0
+        for organization_id, get_result in results:
+            try:
+                synced, duration = get_result()
+            except Exception as exc:
+                failed += 1
+                logger.error(f'CUTOVER: Organization {organization_id} '
+                             f'failed: {exc}', exc_info=True)
+                self.stderr.write(
+                    f'Organization {organization_id}: FAILED - {exc}')
+            else:
+                self.stdout.write(
+                    f'Organization {organization_id}: {synced} rows '
+                    f'synced, {feature} activated in {duration:.2f}s')
+        return failed
+
+    @staticmethod
+    def _get_organization_sizes(organization_ids, descriptor_pairs):
+        """
+        Number of source rows per organization, one query per descriptor
+        """
+        sizes = {}
+        for source_descriptor, _ in descriptor_pairs:
+            # Checked by get_cutover_descriptor_pairs()
+            organization_lookup = source_descriptor['organization_lookup']
+            rows = get_source_queryset(source_descriptor).filter(
+                **{f'{organization_lookup}__in': organization_ids}
+            ).values(organization_lookup).annotate(
+                count=Count('pk')
+            ).values_list(organization_lookup, 'count')
+            for organization_id, count in rows:
+                sizes[organization_id] = sizes.get(organization_id, 0) + count
+        return sizes
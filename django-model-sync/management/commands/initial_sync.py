@@ -0,0 +1,150 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
+from apps.b3_migration.sync.dead_letters import record_failures
+from apps.b3_migration.sync.initial_sync.bulk import (
+    DEFAULT_CHUNK_SIZE,
+    bulk_sync,
+)
+from apps.b3_migration.sync.initial_sync.scheduler import \
+    run_in_dependency_order
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+
+
+class Command(BaseCommand):
+    help = (
+        'Create target instances for all source instances of registered '
+        'descriptor pairs that are not in sync yet. Every pair keeps a '
+        'checkpoint of the last source pk it processed: interrupted runs '
+        'are resumed from their last committed chunk, and later runs - '
+        'even of completed pairs - skip the source instances with a pk up '
+        'to that one unless --restart is passed. Descriptor pairs are '
+        'synced after the pairs they depend on, independent ones '
+        'concurrently with --workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'descriptor_ids',
+            nargs='*',
+            help='Ids of the registered descriptor pairs to sync. Pairs are '
+                 'synced after the pairs they depend on')
+        parser.add_argument(
+            '--all',
+            dest='all_pairs',
+            action='store_true',
+            help='Sync all registered descriptor pairs')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of independent descriptor pairs synced '
+                 'concurrently')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Initial number of source instances per chunk')
+        parser.add_argument(
+            '--rows-per-second',
+            type=int,
+            help='Maximal number of source instances synced per second, '
+                 'per descriptor pair')
+        parser.add_argument(
+            '--target-latency',
+            type=int,
+            help='Commit latency per chunk in milliseconds; chunks shrink '
+                 'above it and grow well below it')
+        parser.add_argument(
+            '--read-using',
+            help='Database alias to read the source instances from, e.g. a '
+                 'read replica. Writes always go to the default database')
+        parser.add_argument(
+            '--max-lag',
+            type=float,
+            help='Wait before every chunk until the replication lag of '
+                 '--read-using is at most this many seconds')
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Discard saved progress and start from the first pk, '
+                 'e.g. to sync source instances created with a lower pk '
+                 'after a completed run')
+
+    def handle(self, *args, descriptor_ids, all_pairs, workers, chunk_size,
+               restart, rows_per_second, target_latency, read_using, max_lag,
+               **options):
+        if all_pairs:
+            descriptor_ids = [pair.id for pair in registry.get_pairs()]
+        elif not descriptor_ids:
+            raise CommandError('Pass descriptor pair ids or --all')
+        try:
+            for descriptor_id in descriptor_ids:
+                registry.get_pair(descriptor_id)
+        except LookupError as exc:
+            raise CommandError(exc)
+        if read_using is not None and read_using not in connections:
+            raise CommandError(f'Unknown database alias {read_using}')
+
+        if restart:
+            for checkpoint in SyncCheckpoint.objects.filter(
+                    descriptor_id__in=descriptor_ids):
+                checkpoint.reset()
+
+        if target_latency:
+            target_latency /= 1000
+        throttles = {}
+
+        def sync_pair(pair):
+            throttles[pair.id] = Throttle(
+                chunk_size,
+                rows_per_second=rows_per_second,
+                target_latency=target_latency,
+            )
+            stats = bulk_sync(
+                pair.source.descriptor,
+                pair.target.descriptor,
+                checkpoint_id=pair.id,
+                throttle=throttles[pair.id],
+                read_using=read_using,
+                max_lag=max_lag,
+            )
+            # Failing source instances are left unsynced, and past the
+            # checkpoint
+            record_failures(pair.id, SyncDeadLetter.CREATE, stats.errors)
+            return stats
+
+        results = run_in_dependency_order(
+            descriptor_ids, sync_pair, workers=workers,
+            on_result=lambda result: self._write_result(
+                result, throttles.get(result.pair.id)))
+
+        failed = [result for result in results if not result.succeeded]
+        if failed:
+            raise CommandError(
+                f'{len(failed)} of {len(results)} descriptor pairs failed '
+                f'or were skipped')
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced {len(results)} descriptor pairs'))
+
+    def _write_result(self, result, throttle=None):
+        pair_id = result.pair.id
+        if result.skipped:
+            self.stderr.write(f'{pair_id}: SKIPPED - a dependency failed')
+        elif result.error is not None:
+            self.stderr.write(f'{pair_id}: FAILED - {result.error}')
+        else:
+            checkpoint = SyncCheckpoint.objects.get(descriptor_id=pair_id)
+            message = (
+                f'{pair_id}: {result.stats.created} created in '
+                f'{result.duration:.2f}s, {checkpoint.processed} processed '
+                f'in total up to pk {checkpoint.last_pk}'
+            )
+            if result.stats.failed:
+                message += f', {result.stats.failed} failed'
+            if throttle is not None:
+                message += f' ({throttle.describe()})'
+            self.stdout.write(message)
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.sync.initial_sync.bulk import (
+    DEFAULT_CHUNK_SIZE,
+    get_source_queryset,
+)
+from apps.b3_migration.sync.initial_sync import reconciliation
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare source instances with their synced target instances and '
+        'optionally repair the ones that drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'descriptor_id',
+            help='Id of the registered descriptor pair')
+        parser.add_argument(
+            '--organization',
+            type=int,
+            help='Only compare the rows of this organization')
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Create missing and update mismatched target instances')
+        parser.add_argument(
+            '--read-using',
+            help='Database alias to read the source instances from, e.g. a '
+                 'read replica. Writes always go to the default database')
+        parser.add_argument(
+            '--max-lag',
+            type=float,
+            help='Wait before every chunk until the replication lag of '
+                 '--read-using is at most this many seconds')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Initial number of source instances per chunk')
+        parser.add_argument(
+            '--rows-per-second',
+            type=int,
+            help='Maximal number of source instances synced per second')
+        parser.add_argument(
+            '--target-latency',
+            type=int,
+            help='Commit latency per chunk in milliseconds; chunks shrink '
+                 'above it and grow well below it')
+
+    def handle(self, *args, descriptor_id, organization, repair, chunk_size,
+               rows_per_second, target_latency, read_using, max_lag,
+               **options):
+        try:
+            pair = registry.get_pair(descriptor_id)
+        except LookupError as exc:
+            raise CommandError(exc)
+        if read_using is not None and read_using not in connections:
+            raise CommandError(f'Unknown database alias {read_using}')
+        source_descriptor = pair.source.descriptor
+        target_descriptor = pair.target.descriptor
+        queryset = get_source_queryset(
+            source_descriptor, organization=organization)
+
+        report = reconciliation.compare(
+            source_descriptor, target_descriptor, queryset,
+            chunk_size=chunk_size, read_using=read_using, max_lag=max_lag)
+        self.stdout.write(
+            f'{report.source_count} compared, {report.synced_count} synced, '
+            f'{len(report.missing_pks)} missing, '
+            f'{len(report.mismatched_pks)} mismatched')
+
+        if report.in_sync:
+            self.stdout.write(self.style.SUCCESS('In sync'))
+            return
+        if not repair:
+            raise CommandError('Not in sync')
+
+        throttle = Throttle(
+            chunk_size,
+            rows_per_second=rows_per_second,
+            target_latency=target_latency / 1000 if target_latency else None,
+        )
+        reconciliation.repair(
+            source_descriptor, target_descriptor, report, throttle=throttle,
+            read_using=read_using, max_lag=max_lag)
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired ({throttle.describe()})'))
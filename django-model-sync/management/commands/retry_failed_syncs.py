@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.b3_migration.sync.dead_letters import get_max_attempts
+from apps.b3_migration.sync.initial_sync.retry import (
+    DEFAULT_BATCH_SIZE,
+    retry_dead_letters,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Retry the failed syncs recorded as dead letters whose next attempt '
+        'is due, in batches. Meant to be scheduled every few minutes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Maximal number of dead letters retried per batch')
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=get_max_attempts(),
+            help='Number of failures after which a dead letter is given up '
+                 'on')
+
+    def handle(self, *args, batch_size, max_attempts, **options):
+        stats = retry_dead_letters(
+            batch_size=batch_size, max_attempts=max_attempts)
+        self.stdout.write(
+            f'{stats.resolved} resolved, {stats.failed} failed again, '
+            f'{stats.exhausted} given up on')
@@ -0,0 +1,123 @@
+import time
+import zlib
+
+import structlog as logging
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.b3_migration.models.switch import Switch
+from apps.b3_organization.models.organization import Organization
+
+logger = logging.getLogger(__name__)
+
+
+def is_in_rollout(feature, organization_id, percentage):
+    """
+    Deterministically decide whether an organization is part of a
+    percentage rollout of a feature.
+
+    The same organizations stay selected when the rollout is re-run with a
+    higher percentage, so a rollout can be widened step by step
+    :param feature: feature being rolled out
+    :param organization_id: pk of the organization
+    :param percentage: share of organizations to select, 0 - 100
+    :return: bool
+    """
+    bucket = zlib.crc32(f'{feature}:{organization_id}'.encode()) % 100
+    return bucket < percentage
+
+
+class Command(BaseCommand):
+    help = (
+        'Activate a feature switch for a set or a percentage of '
+        'organizations, in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'feature',
+            choices=[feature for feature, _ in Switch.FEATURE_CHOICES],
+        )
+        parser.add_argument(
+            '--organization',
+            dest='organization_ids',
+            type=int,
+            nargs='+',
+            help='Only roll out to these organization ids',
+        )
+        parser.add_argument(
+            '--percentage',
+            type=int,
+            default=100,
+            help='Share of the selected organizations to roll out to',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of organizations switched per transaction',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between two batches',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only print how many organizations would be switched',
+        )
+
+    def handle(self, *args, feature, organization_ids, percentage,
+               batch_size, pause, dry_run, **options):
+        if not 0 <= percentage <= 100:
+            raise CommandError('--percentage must be between 0 and 100')
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        organizations = Organization.objects.order_by('pk')
+        if organization_ids:
+            organizations = organizations.filter(pk__in=organization_ids)
+        selected_ids = [
+            organization_id
+            for organization_id in organizations.values_list('pk', flat=True)
+            if is_in_rollout(feature, organization_id, percentage)
+        ]
+        total = len(selected_ids)
+
+        self.stdout.write(
+            f'Rolling out {feature} to {total} organizations '
+            f'in batches of {batch_size}')
+        if dry_run:
+            return
+
+        activated = 0
+        for start in range(0, total, batch_size):
+            batch_ids = selected_ids[start:start + batch_size]
+            with transaction.atomic():
+                Switch.objects.bulk_create(
+                    [
+                        Switch(organization_id=organization_id,
+                               feature=feature)
+                        for organization_id in batch_ids
+                    ],
+                    ignore_conflicts=True,
+                )
+                activated += Switch.objects.filter(
+                    feature=feature,
+                    organization_id__in=batch_ids,
+                ).toggle(True)
+
+            done = start + len(batch_ids)
+            logger.info(f'ROLLOUT: {feature}: {done}/{total} organizations, '
+                        f'{activated} switches activated')
+            self.stdout.write(
+                f'{done}/{total} organizations processed, '
+                f'{activated} switches activated')
+
+            if done < total and pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled out {feature}: {activated} switches activated'))
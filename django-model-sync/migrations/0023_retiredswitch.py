@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0022_auto_20191017_0649'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetiredSwitch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('organization_id', models.IntegerField(db_index=True, verbose_name='Organization ID')),
+                ('feature', models.CharField(max_length=32, verbose_name='Feature')),
+                ('active', models.BooleanField(verbose_name='Active')),
+                ('note', models.TextField(blank=True, verbose_name='Note')),
+                ('creation_date', models.DateTimeField(verbose_name='Created')),
+                ('last_modified', models.DateTimeField(verbose_name='Last Modified')),
+                ('retired_date', models.DateTimeField(auto_now_add=True, help_text='Date when the feature of this Switch was retired.', verbose_name='Retired')),
+            ],
+            options={
+                'verbose_name': 'Retired Switch',
+                'verbose_name_plural': 'Retired Switches',
+            },
+        ),
+    ]
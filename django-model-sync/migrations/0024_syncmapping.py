@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0023_retiredswitch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncMapping',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descriptor_id', models.CharField(help_text='Mapping name shared by the descriptors of the pair', max_length=64, verbose_name='Descriptor ID')),
+                ('source_pk', models.BigIntegerField(verbose_name='Source PK')),
+                ('target_pk', models.BigIntegerField(verbose_name='Target PK')),
+            ],
+            options={
+                'verbose_name': 'Sync Mapping',
+                'verbose_name_plural': 'Sync Mappings',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncmapping',
+            constraint=models.UniqueConstraint(fields=('descriptor_id', 'source_pk'), name='b3_migration_syncmapping_source'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncmapping',
+            constraint=models.UniqueConstraint(fields=('descriptor_id', 'target_pk'), name='b3_migration_syncmapping_target'),
+        ),
+    ]
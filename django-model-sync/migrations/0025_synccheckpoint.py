@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0024_syncmapping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descriptor_id', models.CharField(help_text='Id of the registered descriptor pair', max_length=255, unique=True, verbose_name='Descriptor ID')),
+                ('last_pk', models.BigIntegerField(help_text='PK of the last processed source instance', null=True, verbose_name='Last PK')),
+                ('processed', models.PositiveIntegerField(default=0, help_text='Number of processed source instances', verbose_name='Processed')),
+                ('created', models.PositiveIntegerField(default=0, help_text='Number of created target instances', verbose_name='Created')),
+                ('last_modified', models.DateTimeField(auto_now=True, help_text='Date when this Checkpoint was last modified.', verbose_name='Last Modified')),
+            ],
+            options={
+                'verbose_name': 'Sync Checkpoint',
+                'verbose_name_plural': 'Sync Checkpoints',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0025_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synccheckpoint',
+            name='watermark',
+            field=models.DateTimeField(help_text='Source instances modified before this date are caught up', null=True, verbose_name='Watermark'),
+        ),
+    ]
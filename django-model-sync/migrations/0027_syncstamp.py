@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0026_synccheckpoint_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncStamp',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Buddy model label or mapping name', max_length=255, verbose_name='Scope')),
+                ('key', models.BigIntegerField(help_text='PK of the instance on the canonical side of the mapping', verbose_name='Key')),
+                ('origin', models.CharField(help_text='Label of the model the last sync originated from', max_length=255, verbose_name='Origin')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Number of syncs between the two instances', verbose_name='Version')),
+                ('digest', models.CharField(help_text='Digest of the synced values of the last written instance', max_length=64, verbose_name='Digest')),
+                ('source_modified', models.DateTimeField(help_text='Modification date of the source of the last sync', null=True, verbose_name='Source Modified')),
+                ('last_modified', models.DateTimeField(auto_now=True, help_text='Date when this Stamp was last modified.', verbose_name='Last Modified')),
+            ],
+            options={
+                'verbose_name': 'Sync Stamp',
+                'verbose_name_plural': 'Sync Stamps',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncstamp',
+            constraint=models.UniqueConstraint(fields=('scope', 'key'), name='b3_migration_syncstamp_key'),
+        ),
+    ]
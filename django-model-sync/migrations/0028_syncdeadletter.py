@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0027_syncstamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncDeadLetter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descriptor_id', models.CharField(help_text='Id of the registered descriptor pair', max_length=255, verbose_name='Descriptor ID')),
+                ('source_pk', models.BigIntegerField(help_text='PK of the source instance that failed to sync', verbose_name='Source PK')),
+                ('target_pk', models.BigIntegerField(help_text='PK of the target instance of a failed delete, whose mapping may be deleted along with the source instance', null=True, verbose_name='Target PK')),
+                ('operation', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=16, verbose_name='Operation')),
+                ('error_class', models.CharField(help_text='Class of the last error', max_length=255, verbose_name='Error Class')),
+                ('error_message', models.TextField(blank=True, help_text='Message of the last error', verbose_name='Error Message')),
+                ('attempts', models.PositiveIntegerField(default=1, help_text='Number of failed attempts', verbose_name='Attempts')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, help_text='Date of the next retry, empty once retries are exhausted', null=True, verbose_name='Next Attempt')),
+                ('creation_date', models.DateTimeField(auto_now_add=True, help_text='Date when the sync first failed.', verbose_name='Created')),
+                ('last_modified', models.DateTimeField(auto_now=True, help_text='Date when this Dead Letter was last modified.', verbose_name='Last Modified')),
+            ],
+            options={
+                'verbose_name': 'Sync Dead Letter',
+                'verbose_name_plural': 'Sync Dead Letters',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncdeadletter',
+            constraint=models.UniqueConstraint(fields=('descriptor_id', 'source_pk', 'operation'), name='b3_migration_syncdeadletter_source'),
+        ),
+    ]
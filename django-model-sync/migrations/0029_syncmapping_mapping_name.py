@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('b3_migration', '0028_syncdeadletter'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='syncmapping',
+            name='b3_migration_syncmapping_source',
+        ),
+        migrations.RemoveConstraint(
+            model_name='syncmapping',
+            name='b3_migration_syncmapping_target',
+        ),
+        migrations.RenameField(
+            model_name='syncmapping',
+            old_name='descriptor_id',
+            new_name='mapping_name',
+        ),
+        migrations.AlterField(
+            model_name='syncmapping',
+            name='mapping_name',
+            field=models.CharField(help_text='Mapping name shared by the descriptors of the pair', max_length=64, verbose_name='Mapping Name'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncmapping',
+            constraint=models.UniqueConstraint(fields=('mapping_name', 'source_pk'), name='b3_migration_syncmapping_source'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncmapping',
+            constraint=models.UniqueConstraint(fields=('mapping_name', 'target_pk'), name='b3_migration_syncmapping_target'),
+        ),
+    ]
@@ -0,0 +1,428 @@
+"""
+Registry of model descriptor pairs.
+
+Every app that syncs models registers its (source, target) descriptor pairs
+in a `sync_descriptors` module:
+
+    from apps.b3_migration.model_descriptors.registry import registry
+
+    registry.register(OLD_ADDRESS_DESCRIPTOR, ADDRESS_DESCRIPTOR)
+    registry.register(ADDRESS_DESCRIPTOR, OLD_ADDRESS_DESCRIPTOR)
+
+These modules are imported in :function: `B3MigrationConfig.ready()`, after
+which all registered descriptors are validated against the real model
+fields and compiled once, so that typos fail at startup rather than at
+write time.
+
+A pair depends on the pairs its foreign keys are translated through, and
+on the pair ids listed in `'dependencies'` of its target descriptor. Pairs
+are synced after the pairs they depend on, see :function: `get_sync_order()`
+"""
+import typing as t
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+
+
+class CompiledDescriptor:
+    """
+    A model descriptor with its model and buddy classes resolved
+    """
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.model_class = apps.get_model(
+            descriptor['app_name'], descriptor['model_name'])
+        self.manager = getattr(
+            self.model_class, descriptor.get('model_manager', 'objects'))
+        if 'buddy_app_name' in descriptor:
+            self.buddy_class = apps.get_model(
+                descriptor['buddy_app_name'], descriptor['buddy_model_name'])
+        else:
+            self.buddy_class = None
+        self.related_name_in_buddy = descriptor.get('related_name_in_buddy')
+        self.field_name_in_buddy = descriptor.get('field_name_in_buddy')
+        self.fields_mapping = tuple(
+            descriptor.get('fields_mapping', {}).items())
+        self.fields_optional = frozenset(
+            descriptor.get('fields_optional', []))
+        self.fields_funcs = tuple(descriptor.get('fields_funcs', []))
+
+    def __repr__(self):
+        return f'<CompiledDescriptor: {self.model_class._meta.label}>'
+
+
+class DescriptorPair:
+    """
+    A registered (source, target) descriptor pair. `index` is the position
+    of the pair in registration order
+    """
+    def __init__(self, descriptor_id, index, source, target):
+        self.id = descriptor_id
+        self.index = index
+        self.source = source
+        self.target = target
+        self.dependencies = get_dependencies(target.descriptor)
+        # Set by :function: `get_mapping_store()` on first use
+        self.mapping_store = None
+
+    @property
+    def buddy_class(self):
+        return self.target.buddy_class
+
+    def __repr__(self):
+        return f'<DescriptorPair: {self.id}>'
+
+
+class DescriptorRegistry:
+    def __init__(self):
+        self._registrations = []
+        self._pairs = {}
+        self._pairs_by_source_model = defaultdict(list)
+        self._pairs_by_buddy_model = defaultdict(list)
+        # Compiled descriptors by name, see :function: `get_descriptor_name()`
+        self._compiled = defaultdict(list)
+        self.ready = False
+
+    def register(self, source_descriptor, target_descriptor,
+                 descriptor_id=None):
+        """
+        Register a (source, target) descriptor pair
+        :param source_descriptor: source model descriptor
+        :param target_descriptor: target model descriptor
+        :param descriptor_id: unique id of the pair, defaults to
+            `<source app>.<source model>-><target app>.<target model>`
+        """
+        if descriptor_id is None:
+            descriptor_id = (
+                f'{source_descriptor["app_name"]}.'
+                f'{source_descriptor["model_name"]}->'
+                f'{target_descriptor["app_name"]}.'
+                f'{target_descriptor["model_name"]}'
+            ).lower()
+        if any(descriptor_id == registered_id
+               for registered_id, _, _ in self._registrations):
+            raise ImproperlyConfigured(
+                f'Descriptor pair {descriptor_id} is already registered')
+        registration = (descriptor_id, source_descriptor, target_descriptor)
+        if self.ready:
+            # Registered after startup, validated on its own
+            self._validate(self._registrations + [registration], [
+                registration])
+            self._compile_pair(*registration)
+        self._registrations.append(registration)
+
+    def compile(self):
+        """
+        Validate and compile all registered descriptor pairs. Raises
+        :error: `ImproperlyConfigured` listing every invalid descriptor
+        """
+        self._validate(self._registrations, self._registrations)
+        for registration in self._registrations:
+            self._compile_pair(*registration)
+        self.ready = True
+
+    @staticmethod
+    def _validate(registrations, validated):
+        """
+        Raise :error: `ImproperlyConfigured` listing every invalid
+        descriptor of the `validated` registrations, and the dependency
+        cycles between all `registrations`
+        """
+        errors = []
+        descriptor_ids = {
+            descriptor_id for descriptor_id, _, _ in registrations}
+        for _, source_descriptor, target_descriptor in validated:
+            errors.extend(validate_descriptor_pair(
+                source_descriptor, target_descriptor, descriptor_ids))
+        _, cyclic = sort_by_dependencies({
+            descriptor_id: get_dependencies(target_descriptor)
+            for descriptor_id, _, target_descriptor in registrations
+        })
+        if cyclic:
+            errors.append(f'Dependency cycle between descriptor pairs '
+                          f'{", ".join(cyclic)}')
+        if errors:
+            raise ImproperlyConfigured(
+                'Invalid model descriptors:\n' + '\n'.join(errors))
+
+    def _compile_pair(self, descriptor_id, source_descriptor,
+                      target_descriptor):
+        pair = DescriptorPair(
+            descriptor_id,
+            len(self._pairs),
+            self._compile_descriptor(source_descriptor),
+            self._compile_descriptor(target_descriptor),
+        )
+        self._pairs[descriptor_id] = pair
+        self._pairs_by_source_model[pair.source.model_class].append(pair)
+        if pair.buddy_class is not None:
+            self._pairs_by_buddy_model[pair.buddy_class].append(pair)
+
+    def _compile_descriptor(self, descriptor):
+        compiled = self._find_compiled(descriptor)
+        if compiled is None:
+            compiled = CompiledDescriptor(descriptor)
+            self._compiled[get_descriptor_name(descriptor)].append(compiled)
+        return compiled
+
+    def _find_compiled(self, descriptor) -> t.Optional[CompiledDescriptor]:
+        # Variants of the descriptor of a model share its name
+        for compiled in self._compiled.get(
+                get_descriptor_name(descriptor), ()):
+            if compiled.descriptor is descriptor:
+                return compiled
+        return None
+
+    def get_compiled(self, descriptor) -> CompiledDescriptor:
+        """
+        Get the compiled version of a descriptor. Descriptors that are not
+        registered are compiled on every call
+        """
+        compiled = self._find_compiled(descriptor)
+        if compiled is not None:
+            return compiled
+        return CompiledDescriptor(descriptor)
+
+    def get_pair(self, descriptor_id) -> DescriptorPair:
+        try:
+            return self._pairs[descriptor_id]
+        except KeyError:
+            raise LookupError(
+                f'No descriptor pair registered as {descriptor_id}')
+
+    def get_pair_for_descriptors(
+            self, source_descriptor, target_descriptor
+    ) -> t.Optional[DescriptorPair]:
+        """
+        Get the registered pair of two descriptors, if there is one
+        """
+        source = self._find_compiled(source_descriptor)
+        if source is None:
+            return None
+        for pair in self._pairs_by_source_model[source.model_class]:
+            if pair.source is source and \
+                    pair.target.descriptor is target_descriptor:
+                return pair
+        return None
+
+    def get_pair_id(self, source_descriptor, target_descriptor) -> str:
+        """
+        Get the id of the registered pair of two descriptors, or a label
+        made of their model names if they are not registered
+        """
+        pair = self.get_pair_for_descriptors(
+            source_descriptor, target_descriptor)
+        if pair is not None:
+            return pair.id
+        return f'{source_descriptor["model_name"]}->' \
+            f'{target_descriptor["model_name"]}'
+
+    def get_pairs(self) -> t.List[DescriptorPair]:
+        """
+        Get all pairs in registration order
+        """
+        return list(self._pairs.values())
+
+    def get_sync_order(self, descriptor_ids=None) -> t.List[DescriptorPair]:
+        """
+        Get pairs ordered so that every pair comes after the pairs it depends
+        on, otherwise in registration order
+        :param descriptor_ids: ids of the pairs to order, defaults to all
+            pairs. Dependencies on other pairs are ignored
+        """
+        if descriptor_ids is None:
+            pairs = self.get_pairs()
+        else:
+            pairs = sorted(
+                (self.get_pair(descriptor_id)
+                 for descriptor_id in descriptor_ids),
+                key=lambda pair: pair.index)
+        ordered, cyclic = sort_by_dependencies(
+            {pair.id: pair.dependencies for pair in pairs})
+        if cyclic:
+            raise ImproperlyConfigured(
+                f'Dependency cycle between descriptor pairs '
+                f'{", ".join(cyclic)}')
+        return [self._pairs[descriptor_id] for descriptor_id in ordered]
+
+    def get_pairs_for_source_model(self, model_class) \
+            -> t.List[DescriptorPair]:
+        return list(self._pairs_by_source_model.get(model_class, []))
+
+    def get_pairs_for_buddy_model(self, buddy_class) \
+            -> t.List[DescriptorPair]:
+        return list(self._pairs_by_buddy_model.get(buddy_class, []))
+
+
+def get_descriptor_name(descriptor) -> str:
+    """
+    Get the name of a descriptor, `<app name>.<model name>`
+    """
+    return f'{descriptor.get("app_name")}.' \
+        f'{descriptor.get("model_name")}'.lower()
+
+
+def get_dependencies(target_descriptor) -> t.Tuple[str, ...]:
+    """
+    Get the ids of the pairs a pair depends on, from its target descriptor
+    """
+    dependencies = list(target_descriptor.get('dependencies', []))
+    for _, _, descriptor_id in target_descriptor.get('fields_translated', []):
+        if descriptor_id not in dependencies:
+            dependencies.append(descriptor_id)
+    return tuple(dependencies)
+
+
+def sort_by_dependencies(dependencies) -> t.Tuple[t.List, t.List]:
+    """
+    Sort ids so that every id comes after the ids it depends on, otherwise
+    in the order of `dependencies`. Dependencies on ids that are not keys of
+    `dependencies` are ignored
+    :param dependencies: dict of descriptor pair id to the ids it depends on
+    :return: (sorted ids, ids that cannot be sorted because of a cycle)
+    """
+    remaining = dict(dependencies)
+    ordered = []
+    while remaining:
+        ready = [
+            descriptor_id
+            for descriptor_id, descriptor_dependencies in remaining.items()
+            if not any(dependency in remaining
+                       for dependency in descriptor_dependencies)
+        ]
+        if not ready:
+            break
+        ordered.extend(ready)
+        for descriptor_id in ready:
+            del remaining[descriptor_id]
+    return ordered, list(remaining)
+
+
+def _has_field(model_class, field_name):
+    try:
+        model_class._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        # Properties and other attributes can be synced as well
+        return hasattr(model_class, field_name)
+    return True
+
+
+def validate_descriptor_pair(source_descriptor, target_descriptor,
+                             descriptor_ids=()) -> t.List[str]:
+    """
+    Validate a (source, target) descriptor pair against the real models
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param descriptor_ids: ids of all registered pairs, which foreign keys
+        can be translated through
+    :return: list of error messages, empty if the pair is valid
+    """
+    errors = []
+    model_classes = []
+    for descriptor in (source_descriptor, target_descriptor):
+        try:
+            model_classes.append(apps.get_model(
+                descriptor['app_name'], descriptor['model_name']))
+        except (KeyError, LookupError) as exc:
+            errors.append(f'{descriptor.get("model_name")}: {exc!r}')
+    if 'mapping_name' in source_descriptor:
+        buddy_class = None
+    else:
+        try:
+            buddy_class = apps.get_model(
+                target_descriptor['buddy_app_name'],
+                target_descriptor['buddy_model_name'])
+        except (KeyError, LookupError) as exc:
+            errors.append(
+                f'{target_descriptor.get("model_name")}: buddy: {exc!r}')
+    if errors:
+        return errors
+
+    source_class, target_class = model_classes
+    source_name = source_class._meta.label
+    target_name = target_class._meta.label
+
+    fields_optional = set(source_descriptor.get('fields_optional', [])) | \
+        set(target_descriptor.get('fields_optional', []))
+    for source_field_name, target_field_name in target_descriptor.get(
+            'fields_mapping', {}).items():
+        if source_field_name in fields_optional:
+            continue
+        if not _has_field(source_class, source_field_name):
+            errors.append(f'{source_name} has no field {source_field_name}')
+        if not _has_field(target_class, target_field_name):
+            errors.append(f'{target_name} has no field {target_field_name}')
+
+    for key, func, optional in target_descriptor.get('fields_funcs', []):
+        if not callable(func):
+            errors.append(f'{target_name}: fields_funcs for {key} is not '
+                          f'callable')
+        if not optional and not _has_field(target_class, key):
+            errors.append(f'{target_name} has no field {key}')
+
+    modified_field = source_descriptor.get('modified_field')
+    if modified_field and not _has_field(source_class, modified_field):
+        errors.append(f'{source_name} has no field {modified_field}')
+
+    for option in ('sync_stamps', 'lock_ordering'):
+        if bool(source_descriptor.get(option)) != \
+                bool(target_descriptor.get(option)):
+            errors.append(f'{source_name} and {target_name}: {option} must '
+                          f'be set on both descriptors')
+
+    for descriptor_id in target_descriptor.get('dependencies', []):
+        if descriptor_id not in descriptor_ids:
+            errors.append(f'{target_name} depends on unknown descriptor pair '
+                          f'{descriptor_id}')
+
+    for source_field_name, target_field_name, descriptor_id in \
+            target_descriptor.get('fields_translated', []):
+        if not _has_field(source_class, source_field_name):
+            errors.append(f'{source_name} has no field {source_field_name}')
+        if not _has_field(target_class, target_field_name):
+            errors.append(f'{target_name} has no field {target_field_name}')
+        if descriptor_id not in descriptor_ids:
+            errors.append(f'{target_name}: {target_field_name} is translated '
+                          f'through unknown descriptor pair {descriptor_id}')
+
+    if buddy_class is None:
+        errors.extend(_validate_generic_mapping(
+            source_name, source_descriptor, target_descriptor))
+        return errors
+
+    related_name_in_buddy = source_descriptor.get('related_name_in_buddy')
+    if not related_name_in_buddy or \
+            not hasattr(source_class, related_name_in_buddy):
+        errors.append(f'{source_name} has no relation to its buddy '
+                      f'{related_name_in_buddy}')
+    for model_name, descriptor in (
+            (source_name, source_descriptor),
+            (target_name, target_descriptor)):
+        field_name_in_buddy = descriptor.get('field_name_in_buddy')
+        if not field_name_in_buddy or \
+                not _has_field(buddy_class, field_name_in_buddy):
+            errors.append(
+                f'{buddy_class._meta.label} has no field '
+                f'{field_name_in_buddy} for {model_name}')
+    return errors
+
+
+def _validate_generic_mapping(source_name, source_descriptor,
+                              target_descriptor):
+    errors = []
+    if source_descriptor['mapping_name'] != \
+            target_descriptor.get('mapping_name'):
+        errors.append(f'{source_name}: mapping_name differs between source '
+                      f'and target descriptor')
+    sides = {
+        source_descriptor.get('mapping_side'),
+        target_descriptor.get('mapping_side'),
+    }
+    if sides != {'source', 'target'}:
+        errors.append(f'{source_name}: mapping_side must be "source" for '
+                      f'one descriptor and "target" for the other')
+    return errors
+
+
+registry = DescriptorRegistry()
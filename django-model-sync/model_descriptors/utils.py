@@ -2,7 +2,7 @@
 Utility classes for model descriptors, meant to package commonly performed
 commands into small functions
 """
-from django.apps import apps
+from apps.b3_migration.model_descriptors.registry import registry
 
 
 def get_model_class(descriptor):
@@ -11,9 +11,7 @@ def get_model_class(descriptor):
     :param descriptor: model descriptor
     :return:
     """
-    app_name = descriptor['app_name']
-    model_name = descriptor['model_name']
-    return apps.get_model(app_name, model_name)
+    return registry.get_compiled(descriptor).model_class
 
 
 def get_buddy_class(descriptor):
@@ -22,6 +20,4 @@ def get_buddy_class(descriptor):
     :param descriptor: model descriptor
     :return:
     """
-    buddy_app_name = descriptor['buddy_app_name']
-    buddy_model_name = descriptor['buddy_model_name']
-    return apps.get_model(buddy_app_name, buddy_model_name)
+    return registry.get_compiled(descriptor).buddy_class
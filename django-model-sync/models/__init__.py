@@ -1 +1,5 @@
 # flake8: noqa
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.models.sync_mapping import SyncMapping
+from apps.b3_migration.models.sync_stamp import SyncStamp
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
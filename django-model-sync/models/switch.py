@@ -1,7 +1,53 @@
-from django.db import models
+from collections import defaultdict
+from functools import partial
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from apps.b3_migration.signals import switches_toggled
 from apps.b3_organization.utils import get_current_org
 
 
+class SwitchQuerySet(models.QuerySet):
+    def toggle(self, active):
+        """
+        Turn all switches in the queryset on or off with a single UPDATE.
+
+        Unlike a plain :function: `update()`, this also bumps
+        :field: `last_modified` and sends :signal: `switches_toggled` once
+        per feature for the switches that actually changed, once the
+        transaction commits, so that receivers can invalidate whatever they
+        cache per switch
+        :param active: new value of :field: `active`
+        :return: number of switches that changed
+        """
+        changed = list(
+            self.exclude(active=active).values_list(
+                'pk', 'feature', 'organization_id')
+        )
+        if not changed:
+            return 0
+
+        count = self.model.objects.filter(
+            pk__in=[pk for pk, _, _ in changed]
+        ).update(active=active, last_modified=timezone.now())
+
+        organization_ids_by_feature = defaultdict(list)
+        for _, feature, organization_id in changed:
+            organization_ids_by_feature[feature].append(organization_id)
+        # Receivers must not invalidate their caches before the new values
+        # are visible, nor at all if the transaction is rolled back
+        for feature, organization_ids in organization_ids_by_feature.items():
+            transaction.on_commit(partial(
+                switches_toggled.send,
+                sender=self.model,
+                feature=feature,
+                organization_ids=organization_ids,
+                active=active,
+            ))
+        return count
+
+
 class Switch(models.Model):
     """A feature switch.
     Switches are active, or inactive, per organization.
@@ -51,6 +97,8 @@ class Switch(models.Model):
         verbose_name='Last Modified',
     )
 
+    objects = SwitchQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Switch'
         verbose_name_plural = 'Switches'
@@ -76,3 +124,39 @@ class Switch(models.Model):
             return switch.active
         except Switch.DoesNotExist:
             return False
+
+
+class RetiredSwitch(models.Model):
+    """A switch of a retired feature, archived before being deleted by
+    :class: `RetireSwitchFeature`.
+    """
+    organization_id = models.IntegerField(
+        db_index=True,
+        verbose_name='Organization ID',
+    )
+    feature = models.CharField(
+        max_length=32,
+        verbose_name='Feature',
+    )
+    active = models.BooleanField(
+        verbose_name='Active',
+    )
+    note = models.TextField(
+        blank=True,
+        verbose_name='Note',
+    )
+    creation_date = models.DateTimeField(
+        verbose_name='Created',
+    )
+    last_modified = models.DateTimeField(
+        verbose_name='Last Modified',
+    )
+    retired_date = models.DateTimeField(
+        auto_now_add=True,
+        help_text='Date when the feature of this Switch was retired.',
+        verbose_name='Retired',
+    )
+
+    class Meta:
+        verbose_name = 'Retired Switch'
+        verbose_name_plural = 'Retired Switches'
@@ -0,0 +1,71 @@
+from django.db import models
+
+
+class SyncCheckpoint(models.Model):
+    """Progress of the initial sync of a descriptor pair, saved after every
+    committed chunk so that an interrupted sync can be resumed, and the
+    watermark of its catch-up syncs.
+    """
+    descriptor_id = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text='Id of the registered descriptor pair',
+        verbose_name='Descriptor ID',
+    )
+    last_pk = models.BigIntegerField(
+        null=True,
+        help_text='PK of the last processed source instance',
+        verbose_name='Last PK',
+    )
+    processed = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of processed source instances',
+        verbose_name='Processed',
+    )
+    created = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of created target instances',
+        verbose_name='Created',
+    )
+    watermark = models.DateTimeField(
+        null=True,
+        help_text='Source instances modified before this date are caught up',
+        verbose_name='Watermark',
+    )
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text='Date when this Checkpoint was last modified.',
+        verbose_name='Last Modified',
+    )
+
+    class Meta:
+        verbose_name = 'Sync Checkpoint'
+        verbose_name_plural = 'Sync Checkpoints'
+
+    def __str__(self):
+        return f'{self.descriptor_id}: {self.processed} processed'
+
+    def advance(self, last_pk, processed, created):
+        """
+        Record a committed chunk. Meant to be called inside the chunk's
+        transaction, so that the checkpoint never gets ahead of the data
+        """
+        self.last_pk = last_pk
+        self.processed += processed
+        self.created += created
+        self.save(update_fields=[
+            'last_pk', 'processed', 'created', 'last_modified'])
+
+    def reset(self):
+        """
+        Restart the initial sync from the first pk. The watermark is kept
+        """
+        self.last_pk = None
+        self.processed = 0
+        self.created = 0
+        self.save(update_fields=[
+            'last_pk', 'processed', 'created', 'last_modified'])
+
+    def advance_watermark(self, watermark):
+        self.watermark = watermark
+        self.save(update_fields=['watermark', 'last_modified'])
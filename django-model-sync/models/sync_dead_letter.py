@@ -0,0 +1,82 @@
+from django.db import models
+
+
+class SyncDeadLetter(models.Model):
+    """An auto sync that failed and was swallowed by
+    :function: `call_with_error_handling()`, to be retried by the
+    `retry_failed_syncs` command.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OPERATION_CHOICES = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    )
+
+    descriptor_id = models.CharField(
+        max_length=255,
+        help_text='Id of the registered descriptor pair',
+        verbose_name='Descriptor ID',
+    )
+    source_pk = models.BigIntegerField(
+        help_text='PK of the source instance that failed to sync',
+        verbose_name='Source PK',
+    )
+    target_pk = models.BigIntegerField(
+        null=True,
+        help_text='PK of the target instance of a failed delete, whose '
+                  'mapping may be deleted along with the source instance',
+        verbose_name='Target PK',
+    )
+    operation = models.CharField(
+        max_length=16,
+        choices=OPERATION_CHOICES,
+        verbose_name='Operation',
+    )
+    error_class = models.CharField(
+        max_length=255,
+        help_text='Class of the last error',
+        verbose_name='Error Class',
+    )
+    error_message = models.TextField(
+        blank=True,
+        help_text='Message of the last error',
+        verbose_name='Error Message',
+    )
+    attempts = models.PositiveIntegerField(
+        default=1,
+        help_text='Number of failed attempts',
+        verbose_name='Attempts',
+    )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        db_index=True,
+        help_text='Date of the next retry, empty once retries are exhausted',
+        verbose_name='Next Attempt',
+    )
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        help_text='Date when the sync first failed.',
+        verbose_name='Created',
+    )
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text='Date when this Dead Letter was last modified.',
+        verbose_name='Last Modified',
+    )
+
+    class Meta:
+        verbose_name = 'Sync Dead Letter'
+        verbose_name_plural = 'Sync Dead Letters'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['descriptor_id', 'source_pk', 'operation'],
+                name='b3_migration_syncdeadletter_source',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.descriptor_id}: {self.operation} of ' \
+            f'{self.source_pk} failed {self.attempts} times'
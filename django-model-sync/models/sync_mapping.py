@@ -0,0 +1,38 @@
+from django.db import models
+
+
+class SyncMapping(models.Model):
+    """Mapping between a source and a target instance of a descriptor pair,
+    used instead of a buddy model by descriptors with a `mapping_name`.
+
+    A pk is mapped at most once per side, and the unique index of each side
+    serves the lookups in that direction.
+    """
+    mapping_name = models.CharField(
+        max_length=64,
+        help_text='Mapping name shared by the descriptors of the pair',
+        verbose_name='Mapping Name',
+    )
+    source_pk = models.BigIntegerField(
+        verbose_name='Source PK',
+    )
+    target_pk = models.BigIntegerField(
+        verbose_name='Target PK',
+    )
+
+    class Meta:
+        verbose_name = 'Sync Mapping'
+        verbose_name_plural = 'Sync Mappings'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mapping_name', 'source_pk'],
+                name='b3_migration_syncmapping_source',
+            ),
+            models.UniqueConstraint(
+                fields=['mapping_name', 'target_pk'],
+                name='b3_migration_syncmapping_target',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.mapping_name}: {self.source_pk} -> {self.target_pk}'
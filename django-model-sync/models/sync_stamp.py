@@ -0,0 +1,57 @@
+from django.db import models
+
+
+class SyncStamp(models.Model):
+    """Origin and version of the last auto sync between the two instances of
+    a mapping, used to drop echo writes.
+
+    A mapping is identified by its `scope` - the buddy model label or the
+    mapping name - and the pk of the instance on its canonical side.
+    """
+    scope = models.CharField(
+        max_length=255,
+        help_text='Buddy model label or mapping name',
+        verbose_name='Scope',
+    )
+    key = models.BigIntegerField(
+        help_text='PK of the instance on the canonical side of the mapping',
+        verbose_name='Key',
+    )
+    origin = models.CharField(
+        max_length=255,
+        help_text='Label of the model the last sync originated from',
+        verbose_name='Origin',
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of syncs between the two instances',
+        verbose_name='Version',
+    )
+    digest = models.CharField(
+        max_length=64,
+        help_text='Digest of the synced values of the last written instance',
+        verbose_name='Digest',
+    )
+    source_modified = models.DateTimeField(
+        null=True,
+        help_text='Modification date of the source of the last sync',
+        verbose_name='Source Modified',
+    )
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text='Date when this Stamp was last modified.',
+        verbose_name='Last Modified',
+    )
+
+    class Meta:
+        verbose_name = 'Sync Stamp'
+        verbose_name_plural = 'Sync Stamps'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'key'],
+                name='b3_migration_syncstamp_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}: {self.key} v{self.version} from {self.origin}'
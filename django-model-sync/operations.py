@@ -0,0 +1,86 @@
+"""
+Reusable migration operations
+"""
+from django.db.migrations.operations.base import Operation
+
+SWITCH_FIELDS_TO_ARCHIVE = (
+    'organization_id',
+    'feature',
+    'active',
+    'note',
+    'creation_date',
+    'last_modified',
+)
+
+
+class RetireSwitchFeature(Operation):
+    """
+    Delete all switches of one or more retired features.
+
+    Switches are deleted in chunks of `chunk_size` with one filtered DELETE
+    per chunk, so memory use does not depend on the size of the switch
+    table. With `archive=True` every chunk is copied to
+    :model: `RetiredSwitch` before it is deleted - this requires migration
+    `0023_retiredswitch` to be a dependency of the migration.
+
+    Usage:
+
+        operations = [
+            RetireSwitchFeature('left_navigation'),
+            migrations.AlterField(...),
+        ]
+
+    Reversing the operation does not bring the switches back
+    """
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, *features, archive=False, chunk_size=1000):
+        self.features = features
+        self.archive = archive
+        self.chunk_size = chunk_size
+
+    def deconstruct(self):
+        kwargs = {}
+        if self.archive:
+            kwargs['archive'] = self.archive
+        if self.chunk_size != 1000:
+            kwargs['chunk_size'] = self.chunk_size
+        return self.__class__.__name__, self.features, kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        Switch = from_state.apps.get_model('b3_migration', 'Switch')
+        alias = schema_editor.connection.alias
+        if not self.allow_migrate_model(alias, Switch):
+            return
+
+        switches = Switch._default_manager.using(alias).filter(
+            feature__in=self.features).order_by('pk')
+        if self.archive:
+            RetiredSwitch = from_state.apps.get_model(
+                'b3_migration', 'RetiredSwitch')
+
+        while True:
+            if self.archive:
+                rows = list(switches.values('pk', *SWITCH_FIELDS_TO_ARCHIVE)[
+                    :self.chunk_size])
+                pks = [row.pop('pk') for row in rows]
+                RetiredSwitch._default_manager.using(alias).bulk_create(
+                    [RetiredSwitch(**row) for row in rows])
+            else:
+                pks = list(
+                    switches.values_list('pk', flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            Switch._default_manager.using(alias).filter(pk__in=pks).delete()
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        pass
+
+    def describe(self):
+        return f'Delete switches of feature(s) {", ".join(self.features)}'
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by :function: `SwitchQuerySet.toggle()` after switches were turned on
+# or off in bulk, i.e. without calling :function: `save()` on each of them.
+# Keyword arguments: `feature`, `organization_ids` and `active`
+switches_toggled = Signal()
@@ -1,9 +1,22 @@
+from functools import partial
+
 import structlog as logging
 
-from apps.b3_migration.model_descriptors.utils import get_buddy_class
+from apps.b3_migration.model_descriptors.utils import (
+    get_model_class,
+)
+from apps.b3_migration.sync.coalescing import get_coalescer
+from apps.b3_migration.sync.dead_letters import record_auto_sync_failure
+from apps.b3_migration.sync.locking import run_locked, uses_lock_ordering
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.sync.profiling import profile_sync
+from apps.b3_migration.sync.slow_sync import detect_slow_sync
+from apps.b3_migration.sync.stamps import record, should_sync, uses_stamps
 from apps.b3_migration.sync.utils import sync_source_and_target_models
-from apps.b3_migration.sync.auto_synchronization_base import \
-    AutoSynchronizationBase
+from apps.b3_migration.sync.auto_synchronization_base import (
+    AutoSynchronizationBase,
+    is_auto_sync_suppressed,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +50,34 @@ class ModelToModelAutoSynchronizationMixin(AutoSynchronizationBase):
             or -obviously- any raw SQL queries...
     """
 
+    def save(self, *args, **kwargs):
+        """
+        Save, together with the sync, in a transaction locking both rows in
+        a canonical order for pairs with `lock_ordering` - see
+        :module: `locking` - and profiled if enabled - see
+        :module: `profiling`
+        """
+        return self._run_synced(super().save, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._run_synced(super().delete, *args, **kwargs)
+
+    def _run_synced(self, func, *args, **kwargs):
+        if kwargs.get('target') or is_auto_sync_suppressed(self):
+            # Already locked and profiled by the initiator, or not synced
+            return func(*args, **kwargs)
+        source_descriptor, target_descriptor = \
+            self.get_source_and_target_descriptors()
+        with profile_sync(source_descriptor, target_descriptor):
+            if not uses_lock_ordering(source_descriptor, target_descriptor):
+                return func(*args, **kwargs)
+            return run_locked(
+                partial(func, *args, **kwargs),
+                self,
+                source_descriptor,
+                target_descriptor,
+            )
+
     def _pre_save(self, *args, update=False, target=False, **kwargs):
         """
         Pre-save, check if deleted, then don't do anything i.e. don't
@@ -73,19 +114,35 @@ class ModelToModelAutoSynchronizationMixin(AutoSynchronizationBase):
 
         Steps:
             1. If self is not the target -and thus the initiator-,
-                call sync function
+                call sync function - or, for updates inside of a
+                :function: `coalesce_auto_sync()` block, defer it
+            2. For pairs with `sync_stamps`, drop the sync of an update that
+                echoes the last sync - see :module: `stamps` - and stamp the
+                sync otherwise
         """
         if not target:
             source_descriptor, target_descriptor = \
                 self.get_source_and_target_descriptors()
-            sync_source_and_target_models(
-                self,
-                source_descriptor,
-                target_descriptor,
-                get_buddy_class(target_descriptor),
-                'AUTO-SYNC',
-                update=update
-            )
+            stamped = uses_stamps(source_descriptor, target_descriptor)
+            if update and stamped and not should_sync(
+                    self, source_descriptor, target_descriptor):
+                return
+            coalescer = get_coalescer()
+            if update and coalescer is not None:
+                coalescer.defer(self, source_descriptor, target_descriptor)
+                return
+            with detect_slow_sync('update' if update else 'create', self,
+                                  source_descriptor, target_descriptor):
+                target_instance = sync_source_and_target_models(
+                    self,
+                    source_descriptor,
+                    target_descriptor,
+                    'AUTO-SYNC',
+                    update=update
+                )
+            if stamped:
+                record(self, source_descriptor, target_descriptor,
+                       target_instance)
 
     def _pre_delete(self, *args, target=False, **kwargs):
         """
@@ -112,33 +169,52 @@ class ModelToModelAutoSynchronizationMixin(AutoSynchronizationBase):
             source_descriptor, target_descriptor = \
                 self.get_source_and_target_descriptors()
 
-            source_related_name_in_buddy = source_descriptor[
-                'related_name_in_buddy']
+            coalescer = get_coalescer()
+            if coalescer is not None:
+                coalescer.discard(self, source_descriptor, target_descriptor)
 
-            if hasattr(self, source_related_name_in_buddy):
-                buddy_instance = getattr(self, source_related_name_in_buddy)
+            with detect_slow_sync('delete', self, source_descriptor,
+                                  target_descriptor):
+                self._delete_target(
+                    source_descriptor, target_descriptor, *args, **kwargs)
+        return True
 
-                target_field_name_in_buddy = target_descriptor[
-                    'field_name_in_buddy']
-                target_instance = getattr(
-                    buddy_instance, target_field_name_in_buddy)
+    def _delete_target(self, source_descriptor, target_descriptor, *args,
+                       **kwargs):
+        mapping_store = get_mapping_store(
+            source_descriptor, target_descriptor)
+        target_pk = mapping_store.get_target_pk(self.pk)
 
-                logger.debug(f'AUTO-SYNC: Starting delete for buddy '
-                             f'instance: {buddy_instance}')
+        if target_pk is not None:
+            logger.debug(f'AUTO-SYNC: Starting delete for buddy '
+                         f'instance of: {self}')
 
-                buddy_instance.delete()
+            mapping_store.delete(self.pk, target_pk)
 
-                logger.debug(f'AUTO-SYNC: Completed delete for buddy '
-                             f'instance: {buddy_instance}')
+            logger.debug(f'AUTO-SYNC: Completed delete for buddy '
+                         f'instance of: {self}')
 
+            target_instance = get_model_class(
+                target_descriptor)._base_manager.filter(
+                    pk=target_pk).first()
+            if target_instance is not None:
                 target_instance.delete(*args, target=True, **kwargs)
-        return True
 
     def _post_delete(self, *args, target=False, **kwargs):
         """
         Do nothing after deletion
         """
 
+    def _on_sync_error(self, exc, operation):
+        """
+        Record the failed sync as a dead letter, to be retried by the
+        `retry_failed_syncs` command
+        """
+        source_descriptor, target_descriptor = \
+            self.get_source_and_target_descriptors()
+        record_auto_sync_failure(
+            self, source_descriptor, target_descriptor, operation, exc)
+
     def get_source_and_target_descriptors(self):
         """
         Gets the source and target descriptors - Needed for sync.
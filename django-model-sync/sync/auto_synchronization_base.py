@@ -1,32 +1,80 @@
 import typing as t
+from contextlib import contextmanager
+from functools import partial
+from contextvars import ContextVar
+
 import structlog as logging
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from apps.b3_migration.sync.locking import is_deadlock
 
 logger = logging.getLogger(__name__)
 
+# Model classes whose auto sync is suppressed in the current thread or
+# asyncio task, see :function: `suppress_auto_sync()`
+_suppressed_models: ContextVar[t.FrozenSet[type]] = ContextVar(
+    'suppressed_models', default=frozenset())
+
+
+@contextmanager
+def suppress_auto_sync(*model_classes: type):
+    """
+    Suppress auto sync of instances of `model_classes` - and of their
+    subclasses - in the current context only. Other threads and asyncio
+    tasks keep syncing, and suppression ends when the block is left, also
+    because of an exception
+    """
+    token = _suppressed_models.set(
+        _suppressed_models.get() | frozenset(model_classes))
+    try:
+        yield model_classes
+    finally:
+        _suppressed_models.reset(token)
+
+
+def is_auto_sync_suppressed(instance) -> bool:
+    suppressed_models = _suppressed_models.get()
+    return bool(suppressed_models) and \
+        isinstance(instance, tuple(suppressed_models))
+
 
 def call_with_error_handling_if_condition(
         func: t.Callable,
         handle_errors: bool,
         *args,
+        on_error: t.Optional[t.Callable[[Exception], None]] = None,
         **kwargs) -> bool:
     """
     Utility function to call passed `func`. If `wrap_call` is True, func
     execution is wrapped in `call_with_error_handling`
 
-    *args, **kwargs are passed to `func`
+    *args, **kwargs are passed to `func`, `on_error` to
+    `call_with_error_handling`
 
     Returns function result
     """
 
     if handle_errors:
-        return call_with_error_handling(func, *args, **kwargs)
+        return call_with_error_handling(
+            func, *args, on_error=on_error, **kwargs)
     return func(*args, **kwargs)
 
 
-def call_with_error_handling(func: t.Callable, *args, **kwargs) -> bool:
+def call_with_error_handling(
+        func: t.Callable,
+        *args,
+        on_error: t.Optional[t.Callable[[Exception], None]] = None,
+        **kwargs) -> bool:
     """
     Utility function, wraps `func` invocation in `try..except Exception`
-    block to catch everything and log in this case.
+    block to catch everything and log in this case. `on_error` is called
+    with the caught exception, e.g. to record it for a retry
+
+    `func` runs in a savepoint, so that a caught database error does not
+    leave an outer transaction aborted. Deadlocks are raised anyway: the
+    transaction they abort is retried by :function: `run_locked()`, or
+    by the caller
 
     *args, **kwargs are passed to `func`
 
@@ -34,26 +82,37 @@ def call_with_error_handling(func: t.Callable, *args, **kwargs) -> bool:
     """
 
     try:
-        return func(*args, **kwargs)
+        with transaction.atomic():
+            return func(*args, **kwargs)
     except Exception as exc:
+        if is_deadlock(exc):
+            raise
         logger.error(
             f'Error while calling {func.__name__}: {exc}',
             exc_info=True,
             stack_info=True)
+        if on_error is not None:
+            on_error(exc)
         return False
 
 
 class AutoSynchronizationBase:
     def delete(self, *args, **kwargs):
-        logger.debug(f'AUTO-SYNC: Starting delete for instance: {self} of '
-                     f'class: {self.__class__.__name__}. ')
-
         target = kwargs.pop('target', False)
         is_synching_old_to_new = kwargs.pop('is_synching_old_to_new', False)
 
+        # Before anything that may query the database, e.g. `{self}`
+        if is_auto_sync_suppressed(self):
+            super().delete(*args, **kwargs)
+            return
+
+        logger.debug(f'AUTO-SYNC: Starting delete for instance: {self} of '
+                     f'class: {self.__class__.__name__}. ')
+
         call_post_delete = call_with_error_handling_if_condition(
             func=self._pre_delete,
             handle_errors=is_synching_old_to_new,
+            on_error=partial(self._on_sync_error, operation='delete'),
             target=target,
             *args,
             **kwargs)
@@ -72,6 +131,12 @@ class AutoSynchronizationBase:
         logger.debug(f'AUTO-SYNC: Completed delete for instance: {self} of'
                      f' class: {self.__class__.__name__}. ')
 
+    async def adelete(self, *args, **kwargs):
+        """
+        Async version of :function: `delete()`, see :function: `asave()`
+        """
+        await sync_to_async(self.delete)(*args, **kwargs)
+
     def _pre_delete(self, *args, target: bool, **kwargs) -> bool:
         raise NotImplementedError(
             'AutoSynchronizationBase requires the function _pre_delete() '
@@ -83,6 +148,15 @@ class AutoSynchronizationBase:
             ' to be implemented')
 
     def save(self, *args, **kwargs):
+        target = kwargs.pop('target', False)
+        is_synching_old_to_new = kwargs.pop('is_synching_old_to_new', False)
+
+        # Before anything that may query the database, e.g. `{self}` and
+        # :function: `exists_in_db()`
+        if is_auto_sync_suppressed(self):
+            super().save(*args, **kwargs)
+            return
+
         logger.debug(
             f'AUTO-SYNC: Starting save for instance: {self} of class:'
             f' {self.__class__.__name__}. ')
@@ -93,9 +167,6 @@ class AutoSynchronizationBase:
 
         logger.debug(f'AUTO-SYNC: Update: {update}')
 
-        target = kwargs.pop('target', False)
-        is_synching_old_to_new = kwargs.pop('is_synching_old_to_new', False)
-
         call_post_save = call_with_error_handling_if_condition(
             func=self._pre_save,
             handle_errors=is_synching_old_to_new,
@@ -111,6 +182,9 @@ class AutoSynchronizationBase:
             call_with_error_handling_if_condition(
                 func=self._post_save,
                 handle_errors=is_synching_old_to_new,
+                on_error=partial(
+                    self._on_sync_error,
+                    operation='update' if update else 'create'),
                 update=update,
                 target=target,
                 *args,
@@ -121,6 +195,30 @@ class AutoSynchronizationBase:
             f'AUTO-SYNC: Completed save for instance: {self} of class:'
             f' {self.__class__.__name__}. ')
 
+    async def asave(self, *args, **kwargs):
+        """
+        Async version of :function: `save()`.
+
+        The whole chain - pre-save hook, save, mapping lookup, target write
+        and post-save hook - runs in a single hop to the thread that runs
+        synchronous code, so that the event loop is never blocked and the
+        chain keeps sharing one connection and transaction. Suppression by
+        :function: `suppress_auto_sync()` carries over, since the context is
+        copied.
+
+        Overridden rather than inherited: `Model.asave()` only exists since
+        Django 4.2, while this needs nothing but `asgiref`, which Django
+        depends on since 3.0
+        """
+        await sync_to_async(self.save)(*args, **kwargs)
+
+    def _on_sync_error(self, exc: Exception, operation: str) -> None:
+        """
+        Called with the errors swallowed by :function: `save()` and
+        :function: `delete()` when `is_synching_old_to_new` is set
+        :param operation: 'create', 'update' or 'delete'
+        """
+
     def _pre_save(self, *args, update: bool, target: bool, **kwargs) -> bool:
         raise NotImplementedError(
             'AutoSynchronizationBase requires the function _pre_save() '
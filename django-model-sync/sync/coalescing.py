@@ -0,0 +1,172 @@
+"""
+Coalescing of repeated auto sync updates of the same source instance.
+
+Inside a :function: `coalesce_auto_sync()` block, updates of synced
+instances do not write their target right away. The last saved instance of
+every (descriptor pair, source pk) is kept instead, and each target is
+written once, with the values the instance has when the outermost block is
+left:
+
+    with transaction.atomic(), coalesce_auto_sync():
+        order.status = 'paid'
+        order.save()
+        order.total = total
+        order.save()
+    # the target of `order` has been written once
+
+Instances must thus not be changed without being saved within the block.
+
+Each target is written the way the save would have written it: in the
+locks of :function: `run_locked()` for pairs with `lock_ordering`, and in
+:function: `call_with_error_handling()`, failures being recorded as dead
+letters by the `_on_sync_error()` of the instance. Creations and deletions
+are synced right away, since other instances may need their mapping within
+the block. Coalescing is scoped to the current thread or asyncio task
+"""
+import typing as t
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+import structlog as logging
+from django.db import transaction
+
+from apps.b3_migration.sync.auto_synchronization_base import \
+    call_with_error_handling
+from apps.b3_migration.sync.locking import run_locked, uses_lock_ordering
+from apps.b3_migration.sync.slow_sync import detect_slow_sync
+from apps.b3_migration.sync.stamps import record, uses_stamps
+from apps.b3_migration.sync.utils import sync_source_and_target_models
+
+logger = logging.getLogger(__name__)
+
+_coalescer: ContextVar[t.Optional['Coalescer']] = ContextVar(
+    'coalescer', default=None)
+
+
+class Coalescer:
+    """
+    Pending target updates, by (source descriptor, target descriptor,
+    source pk)
+    """
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.deferred = 0
+
+    @staticmethod
+    def _key(source_instance, source_descriptor, target_descriptor):
+        return id(source_descriptor), id(target_descriptor), \
+            source_instance.pk
+
+    def defer(self, source_instance, source_descriptor, target_descriptor):
+        """
+        Remember a saved source instance, replacing a previous save of it
+        """
+        key = self._key(source_instance, source_descriptor, target_descriptor)
+        self.pending[key] = (
+            source_instance, source_descriptor, target_descriptor)
+        self.pending.move_to_end(key)
+        self.deferred += 1
+
+    def discard(self, source_instance, source_descriptor, target_descriptor):
+        self.pending.pop(
+            self._key(source_instance, source_descriptor, target_descriptor),
+            None)
+
+    def flush(self):
+        """
+        Write the pending target updates
+        """
+        logger.debug(f'AUTO-SYNC: Flushing {len(self.pending)} coalesced '
+                     f'updates of {self.deferred} saves')
+        while self.pending:
+            _, pending = self.pending.popitem(last=False)
+            _flush_update(*pending)
+        self.deferred = 0
+
+
+def _flush_update(source_instance, source_descriptor, target_descriptor):
+    sync = partial(
+        call_with_error_handling,
+        _sync_update,
+        source_instance,
+        source_descriptor,
+        target_descriptor,
+        on_error=partial(source_instance._on_sync_error, operation='update'),
+    )
+    if uses_lock_ordering(source_descriptor, target_descriptor):
+        run_locked(sync, source_instance, source_descriptor,
+                   target_descriptor)
+    else:
+        sync()
+
+
+def _sync_update(source_instance, source_descriptor, target_descriptor):
+    with detect_slow_sync('update', source_instance, source_descriptor,
+                          target_descriptor):
+        target_instance = sync_source_and_target_models(
+            source_instance,
+            source_descriptor,
+            target_descriptor,
+            'AUTO-SYNC',
+            update=True,
+        )
+    if uses_stamps(source_descriptor, target_descriptor):
+        record(source_instance, source_descriptor, target_descriptor,
+               target_instance)
+
+
+def get_coalescer() -> t.Optional[Coalescer]:
+    """
+    Get the :class: `Coalescer` of the current context, None outside of a
+    :function: `coalesce_auto_sync()` block
+    """
+    return _coalescer.get()
+
+
+@contextmanager
+def coalesce_auto_sync():
+    """
+    Coalesce the auto sync updates of the block, see the module docstring.
+
+    The pending updates are written when the block raises as well: the
+    source updates are committed if the block was not in a transaction, or
+    if the caller catches the error and commits. They are written in a
+    savepoint, and dropped if the transaction is already marked for
+    rollback - along with the source updates. If the savepoint fails as a
+    whole, the pending updates are recorded as dead letters instead
+    """
+    if _coalescer.get() is not None:
+        # Nested blocks are flushed with the outermost one
+        yield _coalescer.get()
+        return
+
+    coalescer = Coalescer()
+    token = _coalescer.set(coalescer)
+    try:
+        yield coalescer
+    except BaseException:
+        _coalescer.reset(token)
+        _flush_after_error(coalescer)
+        raise
+    _coalescer.reset(token)
+    coalescer.flush()
+
+
+def _flush_after_error(coalescer):
+    if transaction.get_connection().needs_rollback:
+        logger.debug(f'AUTO-SYNC: Dropping {len(coalescer.pending)} '
+                     f'coalesced updates of a rolled back transaction')
+        return
+    # Failures recorded within the savepoint are rolled back with it
+    pending = list(coalescer.pending.values())
+    try:
+        with transaction.atomic():
+            coalescer.flush()
+    except Exception as exc:
+        # The error of the block is raised instead
+        logger.error(f'AUTO-SYNC: Failed to flush coalesced updates after '
+                     f'an error: {exc!r}', exc_info=True)
+        for source_instance, _, _ in pending:
+            source_instance._on_sync_error(exc, operation='update')
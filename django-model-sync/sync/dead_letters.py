@@ -0,0 +1,147 @@
+"""
+Dead letters of failed syncs.
+
+Auto syncs run with `is_synching_old_to_new=True` swallow their errors, see
+:function: `call_with_error_handling()`, and source instances that fail in
+a bulk sync are left unsynced. Both are recorded as a
+:model: `SyncDeadLetter` per (descriptor pair, source pk, operation), to be
+retried in batches by the `retry_failed_syncs` command with an
+exponential backoff: the n-th retry is due `MODEL_SYNC_RETRY_BACKOFF`
+* 2 ** (n - 1) seconds after the n-th failure, at most
+`MODEL_SYNC_RETRY_MAX_BACKOFF` seconds. A dead letter is given up on after
+`MODEL_SYNC_RETRY_MAX_ATTEMPTS` failures - until its source instance fails
+to sync again - and deleted once its retry succeeds
+"""
+import typing as t
+from datetime import timedelta
+
+import structlog as logging
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
+from apps.b3_migration.sync.mappings import get_mapping_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_BACKOFF = 60
+DEFAULT_RETRY_MAX_BACKOFF = 24 * 60 * 60
+DEFAULT_RETRY_MAX_ATTEMPTS = 10
+
+
+def get_max_attempts() -> int:
+    return getattr(settings, 'MODEL_SYNC_RETRY_MAX_ATTEMPTS',
+                   DEFAULT_RETRY_MAX_ATTEMPTS)
+
+
+def get_next_attempt_at(attempts, max_attempts=None, now=None) \
+        -> t.Optional[timezone.datetime]:
+    """
+    :param attempts: number of failed attempts so far
+    :return: date of the next retry, None if retries are exhausted
+    """
+    if max_attempts is None:
+        max_attempts = get_max_attempts()
+    if attempts >= max_attempts:
+        return None
+    backoff = min(
+        getattr(settings, 'MODEL_SYNC_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF)
+        * 2 ** (attempts - 1),
+        getattr(settings, 'MODEL_SYNC_RETRY_MAX_BACKOFF',
+                DEFAULT_RETRY_MAX_BACKOFF),
+    )
+    return (now or timezone.now()) + timedelta(seconds=backoff)
+
+
+def _get_error_class(exc):
+    return f'{exc.__class__.__module__}.{exc.__class__.__qualname__}'
+
+
+def record_failure(descriptor_id, source_pk, operation, exc,
+                   target_pk=None):
+    """
+    Record a failed sync, or one more failure of an already recorded one.
+    A dead letter that was given up on is retried again, since this is a
+    new sync of its source instance rather than a retry
+    :param descriptor_id: id of the registered descriptor pair
+    :param source_pk: pk of the source instance
+    :param operation: one of the operations of :model: `SyncDeadLetter`
+    :param exc: the error the sync failed with
+    :param target_pk: pk of the target instance, if known
+    """
+    with transaction.atomic():
+        # Serializes concurrent failures of the same sync; retry batches
+        # only lock dead letters while claiming them, see
+        # :function: `claim_due_dead_letters()`
+        dead_letter, created = \
+            SyncDeadLetter.objects.select_for_update().get_or_create(
+                descriptor_id=descriptor_id,
+                source_pk=source_pk,
+                operation=operation,
+                defaults={
+                    'error_class': _get_error_class(exc),
+                    'error_message': str(exc),
+                    'next_attempt_at': get_next_attempt_at(1),
+                    'target_pk': target_pk,
+                },
+            )
+        if created:
+            return
+        if dead_letter.next_attempt_at is None:
+            dead_letter.attempts = 0
+        record_retry_failure(dead_letter, exc)
+
+
+def record_failures(descriptor_id, operation, errors: t.Dict):
+    """
+    Record the failures of a bulk sync
+    :param errors: dict of source pk to error, see :class: `SyncStats`
+    """
+    for source_pk, exc in errors.items():
+        record_failure(descriptor_id, source_pk, operation, exc)
+
+
+def record_retry_failure(dead_letter, exc, max_attempts=None):
+    dead_letter.attempts += 1
+    dead_letter.error_class = _get_error_class(exc)
+    dead_letter.error_message = str(exc)
+    dead_letter.next_attempt_at = get_next_attempt_at(
+        dead_letter.attempts, max_attempts)
+    dead_letter.save(update_fields=[
+        'attempts', 'error_class', 'error_message', 'next_attempt_at',
+        'last_modified'])
+    if dead_letter.next_attempt_at is None:
+        logger.error(f'RETRY: Giving up on {dead_letter}')
+
+
+def record_auto_sync_failure(
+    source_instance,
+    source_descriptor,
+    target_descriptor,
+    operation,
+    exc,
+):
+    """
+    Record a failed auto sync once the transaction of the source write
+    commits - if it rolls back, there is nothing left to sync
+    """
+    pair = registry.get_pair_for_descriptors(
+        source_descriptor, target_descriptor)
+    if pair is None:
+        logger.warning(f'AUTO-SYNC: Cannot record failed {operation} of '
+                       f'{source_instance}, its descriptors are not '
+                       f'registered')
+        return
+    source_pk = source_instance.pk
+    target_pk = None
+    if operation == SyncDeadLetter.DELETE:
+        # Buddy instances are deleted along with the source instance
+        try:
+            target_pk = get_mapping_store(
+                source_descriptor, target_descriptor).get_target_pk(source_pk)
+        except DatabaseError:
+            pass
+    transaction.on_commit(lambda: record_failure(
+        pair.id, source_pk, operation, exc, target_pk=target_pk))
@@ -0,0 +1,360 @@
+"""
+Bulk initial synchronization: creates target and buddy instances for all
+source instances that are not in sync yet, a chunk at a time.
+
+A chunk that fails is bisected in savepoints until the failing source
+instances are isolated: all other instances of the chunk are still synced
+in bulk, and the failing ones are logged and left unsynced
+"""
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+import structlog as logging
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (
+    InterfaceError,
+    OperationalError,
+    connections,
+    router,
+    transaction,
+)
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.model_descriptors.utils import get_model_class
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.sync.auto_synchronization_base import \
+    AutoSynchronizationBase
+from apps.b3_migration.sync.initial_sync.replicas import get_replica_check
+from apps.b3_migration.sync.initial_sync.streaming import get_row_plan
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.sync.utils import (
+    build_target_model_dict,
+    translate_foreign_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class SyncStats:
+    """
+    Counters of a bulk sync run. `errors` are the errors of the source
+    instances that failed to create their target, `update_errors` of those
+    that failed to update it
+    """
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    errors: t.Dict = field(default_factory=dict)
+    update_errors: t.Dict = field(default_factory=dict)
+
+    @property
+    def failed_pks(self) -> t.List:
+        return list(self.errors)
+
+
+def get_source_queryset(source_descriptor, organization=None):
+    """
+    Get the queryset of all source instances of a descriptor
+    :param source_descriptor: source model descriptor
+    :param organization: optional organization (or pk) to restrict the
+        queryset to, using the descriptor's `organization_lookup`
+    :return: queryset
+    """
+    compiled = registry.get_compiled(source_descriptor)
+    queryset = compiled.manager.all()
+
+    if organization is not None:
+        organization_lookup = source_descriptor.get('organization_lookup')
+        if not organization_lookup:
+            raise ImproperlyConfigured(
+                f'Descriptor of {compiled.model_class.__name__} has no '
+                f'organization_lookup and cannot be synced per organization')
+        queryset = queryset.filter(**{organization_lookup: organization})
+    return queryset
+
+
+def iterate_chunks(queryset, chunk_size, start_after=None, before_chunk=None) \
+        -> t.Iterator[list]:
+    """
+    Iterate over a queryset in chunks, using keyset pagination on the pk.
+    Only one chunk is held in memory, see the docstring of
+    :module: `streaming` for why no server-side cursor is used
+    :param queryset: queryset to iterate over
+    :param chunk_size: maximal number of instances per chunk, or a callable
+        returning it - called before every chunk
+    :param start_after: only iterate over instances with a greater pk
+    :param before_chunk: optional callable called before every chunk is
+        loaded
+    :return: iterator over lists of instances - or of tuples starting with
+        the pk, for :function: `values_list()` querysets
+    """
+    get_chunk_size = chunk_size if callable(chunk_size) \
+        else lambda: chunk_size
+    queryset = queryset.order_by('pk')
+    last_pk = start_after
+    while True:
+        if before_chunk is not None:
+            before_chunk()
+        if last_pk is not None:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:get_chunk_size()])
+        else:
+            chunk = list(queryset[:get_chunk_size()])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = get_pk(chunk[-1])
+
+
+def get_pk(row):
+    """
+    Get the pk of an instance or of a row of :function: `values_list()`
+    """
+    return row[0] if isinstance(row, tuple) else row.pk
+
+
+def bulk_sync(
+    source_descriptor,
+    target_descriptor,
+    queryset=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    logging_prefix='INIT-SYNC',
+    checkpoint_id=None,
+    throttle=None,
+    read_using=None,
+    max_lag=None,
+) -> SyncStats:
+    """
+    Create target and buddy instances for every source instance in
+    `queryset` that is not mapped to a target yet.
+
+    Every chunk is synced in its own transaction. Target and buddy instances
+    are created with :function: `bulk_create()`, which does not call
+    :function: `save()` and thus does not trigger auto sync. If the target
+    descriptor only copies columns, source rows are read as tuples and never
+    instantiated, see :class: `RowPlan`. Source instances that fail to sync
+    are isolated, see :function: `sync_chunk_isolated()`, and counted in
+    `failed` - their errors are in `errors`, by source pk
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param queryset: source instances to sync, defaults to all of them
+    :param chunk_size: number of source instances per chunk
+    :param logging_prefix: string prefix used in log messages
+    :param checkpoint_id: if given, progress is saved in the
+        :model: `SyncCheckpoint` with this id after every chunk, and a
+        previous run with the same id is resumed after its last source pk
+    :param throttle: optional :class: `Throttle` limiting the rate and
+        adapting the size of the chunks, `chunk_size` is ignored if given
+    :param read_using: database alias the source instances are read from,
+        e.g. a read replica. Writes always go to the default database
+    :param max_lag: if given, wait before every chunk until the replication
+        lag of `read_using` is at most this many seconds
+    :return: :class: `SyncStats`
+    """
+    if throttle is None:
+        throttle = Throttle(chunk_size)
+    checkpoint = None
+    start_after = None
+    if checkpoint_id is not None:
+        checkpoint, _ = SyncCheckpoint.objects.get_or_create(
+            descriptor_id=checkpoint_id)
+        start_after = checkpoint.last_pk
+        if start_after is not None:
+            logger.info(f'{logging_prefix}: Resuming {checkpoint_id} after '
+                        f'pk {start_after}')
+
+    if queryset is None:
+        queryset = get_source_queryset(source_descriptor)
+    mapping_store = get_mapping_store(source_descriptor, target_descriptor)
+    unsynced = mapping_store.filter_unsynced(queryset)
+    row_plan = get_row_plan(source_descriptor, target_descriptor)
+    if row_plan is not None:
+        unsynced = row_plan.get_queryset(unsynced)
+    if read_using is not None:
+        unsynced = unsynced.using(read_using)
+
+    stats = SyncStats()
+    started = time.monotonic()
+    for chunk in iterate_chunks(
+            unsynced, throttle.get_chunk_size, start_after,
+            get_replica_check(read_using, max_lag, logging_prefix)):
+        last_pk = get_pk(chunk[-1])
+        if read_using is not None:
+            # The replica may not have seen the latest mappings yet
+            mapped_pks = mapping_store.get_target_pks(
+                [get_pk(row) for row in chunk])
+            chunk = [row for row in chunk if get_pk(row) not in mapped_pks]
+            if not chunk:
+                if checkpoint is not None:
+                    checkpoint.advance(last_pk, 0, 0)
+                continue
+        throttle.before_chunk(len(chunk))
+        chunk_started = time.monotonic()
+        with transaction.atomic():
+            created, errors = sync_chunk_isolated(
+                chunk, source_descriptor, target_descriptor, logging_prefix,
+                row_plan=row_plan)
+            if checkpoint is not None:
+                checkpoint.advance(last_pk, len(chunk), created)
+        throttle.after_chunk(time.monotonic() - chunk_started)
+        stats.created += created
+        stats.failed += len(errors)
+        stats.errors.update(errors)
+        stats.processed += len(chunk)
+        logger.info(f'{logging_prefix}: Synced chunk of {len(chunk)} '
+                    f'{queryset.model.__name__} instances, '
+                    f'{stats.processed} processed so far '
+                    f'({throttle.describe()})')
+    stats.duration = time.monotonic() - started
+    return stats
+
+
+def run_isolated(func, rows, logging_prefix) -> t.Tuple[int, t.Dict]:
+    """
+    Call `func` with a list of rows in a savepoint. If it fails, it is
+    called with both halves of the list the same way, down to single rows:
+    a list with one bad row costs about 2 * log2(len(rows)) additional
+    calls rather than one call per row. Connection errors are raised, since
+    no part of the list can succeed
+    :param func: callable taking a list of source instances - or of rows -
+        and returning the number of synced ones
+    :param rows: list of source instances, or of rows
+    :param logging_prefix: string prefix used in log messages
+    :return: tuple of the sum of the results of `func` and a dict of the
+        pks of the failed rows to their errors
+    """
+    try:
+        with transaction.atomic():
+            return func(rows), {}
+    except (InterfaceError, OperationalError):
+        raise
+    except Exception as exc:
+        if len(rows) == 1:
+            logger.error(f'{logging_prefix}: Failed to sync '
+                         f'{get_pk(rows[0])}: {exc!r}')
+            return 0, {get_pk(rows[0]): exc}
+        logger.warning(f'{logging_prefix}: Chunk of {len(rows)} failed, '
+                       f'bisecting: {exc!r}')
+
+    middle = len(rows) // 2
+    synced, errors = run_isolated(func, rows[:middle], logging_prefix)
+    second_synced, second_errors = run_isolated(
+        func, rows[middle:], logging_prefix)
+    errors.update(second_errors)
+    return synced + second_synced, errors
+
+
+def sync_chunk_isolated(
+    source_instances,
+    source_descriptor,
+    target_descriptor,
+    logging_prefix,
+    row_plan=None,
+) -> t.Tuple[int, t.Dict]:
+    """
+    Same as :function: `sync_chunk()`, isolating the source instances that
+    fail with :function: `run_isolated()`
+    :return: tuple of the number of created target instances and a dict of
+        the pks of the failed source instances to their errors
+    """
+    return run_isolated(
+        lambda rows: sync_chunk(
+            rows, source_descriptor, target_descriptor, logging_prefix,
+            row_plan=row_plan),
+        source_instances,
+        logging_prefix,
+    )
+
+
+def sync_chunk(
+    source_instances,
+    source_descriptor,
+    target_descriptor,
+    logging_prefix,
+    row_plan=None,
+) -> int:
+    """
+    Create target and buddy instances for a chunk of source instances
+    :param source_instances: list of source instances without a buddy, or
+        of rows if `row_plan` is given
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param logging_prefix: string prefix used in log messages
+    :param row_plan: :class: `RowPlan` the rows were read with
+    :return: number of created target instances
+    """
+    target_model_class = get_model_class(target_descriptor)
+    target_instances = [
+        target_model_class(**target_model_dict)
+        for target_model_dict in build_target_model_dicts(
+            source_instances, target_descriptor, logging_prefix, row_plan)
+    ]
+
+    if can_bulk_create(target_model_class):
+        target_model_class._default_manager.bulk_create(target_instances)
+    else:
+        # Target instances assigned related source instances read from
+        # another database would be routed there otherwise
+        using = router.db_for_write(target_model_class)
+        for target_instance in target_instances:
+            if isinstance(target_instance, AutoSynchronizationBase):
+                target_instance.save(target=True, using=using)
+            else:
+                target_instance.save(using=using)
+
+    get_mapping_store(source_descriptor, target_descriptor).bulk_create(
+        (get_pk(source_instance), target_instance.pk)
+        for source_instance, target_instance
+        in zip(source_instances, target_instances)
+    )
+    return len(target_instances)
+
+
+def build_target_model_dicts(
+    source_instances,
+    target_descriptor,
+    logging_prefix,
+    row_plan=None,
+) -> t.List[t.Dict]:
+    """
+    Build the target model dictionaries of a chunk of source instances, with
+    their foreign keys translated in bulk
+    :param source_instances: list of source instances, or of rows if
+        `row_plan` is given
+    :param target_descriptor: target model descriptor
+    :param logging_prefix: string prefix used in log messages
+    :param row_plan: :class: `RowPlan` the rows were read with
+    :return: list of target model dictionaries, in the order of the chunk
+    """
+    if row_plan is not None:
+        translations = row_plan.get_translations(source_instances)
+        return [
+            row_plan.build_target_model_dict(row, translations)
+            for row in source_instances
+        ]
+    translations = translate_foreign_keys(source_instances, target_descriptor)
+    return [
+        build_target_model_dict(
+            source_instance, target_descriptor, logging_prefix,
+            translations=translations)
+        for source_instance in source_instances
+    ]
+
+
+def can_bulk_create(model_class) -> bool:
+    """
+    Whether the pks of instances created with :function: `bulk_create()` are
+    set on them, which is needed to create the buddy instances. This is not
+    the case for multi-table inheritance or on backends that cannot return
+    rows from a bulk insert
+    """
+    if model_class._meta.parents:
+        return False
+    connection = connections[router.db_for_write(model_class)]
+    return connection.features.can_return_rows_from_bulk_insert
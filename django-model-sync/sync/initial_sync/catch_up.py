@@ -0,0 +1,216 @@
+"""
+Incremental catch-up sync of source instances modified since the last run.
+
+Writes that bypass :function: `save()` - :function: `update()`, raw SQL,
+other services - are not auto synced. Source descriptors that declare the
+column holding their modification date:
+
+    OLD_ADDRESS_DESCRIPTOR = {
+        ...
+        'modified_field': 'last_modified',
+    }
+
+can be caught up by syncing only the instances modified since a watermark
+saved in the :model: `SyncCheckpoint` of the pair, so that the cost of a run
+is proportional to the number of changed rows rather than to the size of
+the table
+"""
+import time
+from datetime import timedelta
+
+import structlog as logging
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+
+from apps.b3_migration.model_descriptors.utils import get_model_class
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.sync.initial_sync.bulk import (
+    DEFAULT_CHUNK_SIZE,
+    SyncStats,
+    build_target_model_dicts,
+    bulk_sync,
+    get_pk,
+    get_source_queryset,
+    iterate_chunks,
+    run_isolated,
+)
+from apps.b3_migration.sync.initial_sync.streaming import get_row_plan
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.sync.utils import update_instance
+
+logger = logging.getLogger(__name__)
+
+# Transactions still open when a run starts may commit rows with an earlier
+# modification date afterwards, so every run looks back a bit further than
+# the watermark
+DEFAULT_OVERLAP = 60
+
+
+def catch_up_sync(
+    source_descriptor,
+    target_descriptor,
+    checkpoint_id,
+    overlap=DEFAULT_OVERLAP,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    throttle=None,
+    logging_prefix='CATCH-UP',
+) -> SyncStats:
+    """
+    Sync the source instances modified since the watermark of
+    `checkpoint_id`: targets of mapped instances are updated in bulk,
+    missing targets are created with :function: `bulk_sync()`. Source
+    instances that fail are isolated with :function: `run_isolated()` and
+    returned in the stats, to be recorded as dead letters. The watermark is
+    advanced once all chunks are committed, past the failed source
+    instances as well. Without a watermark, all source instances are
+    caught up
+    :param source_descriptor: source model descriptor with `modified_field`
+    :param target_descriptor: target model descriptor
+    :param checkpoint_id: id of the :model: `SyncCheckpoint` holding the
+        watermark
+    :param overlap: seconds before the watermark that are synced again
+    :param chunk_size: number of source instances per chunk
+    :param throttle: optional :class: `Throttle` limiting the rate and
+        adapting the size of the chunks, `chunk_size` is ignored if given
+    :param logging_prefix: string prefix used in log messages
+    :return: :class: `SyncStats`
+    """
+    modified_field = source_descriptor.get('modified_field')
+    if not modified_field:
+        raise ImproperlyConfigured(
+            f'Descriptor of {source_descriptor["model_name"]} has no '
+            f'modified_field and cannot be caught up')
+    if throttle is None:
+        throttle = Throttle(chunk_size)
+
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(
+        descriptor_id=checkpoint_id)
+    watermark = timezone.now()
+    queryset = get_source_queryset(source_descriptor).filter(
+        **{f'{modified_field}__lt': watermark})
+    if checkpoint.watermark is not None:
+        queryset = queryset.filter(**{
+            f'{modified_field}__gte':
+                checkpoint.watermark - timedelta(seconds=overlap)
+        })
+    logger.info(f'{logging_prefix}: Catching up {checkpoint_id} from '
+                f'{checkpoint.watermark} to {watermark}')
+
+    started = time.monotonic()
+    stats = SyncStats()
+    row_plan = get_row_plan(source_descriptor, target_descriptor)
+    chunks = row_plan.get_queryset(queryset) if row_plan else queryset
+    for chunk in iterate_chunks(chunks, throttle.get_chunk_size):
+        throttle.before_chunk(len(chunk))
+        chunk_started = time.monotonic()
+        updated, errors = run_isolated(
+            lambda rows: update_targets(
+                rows, source_descriptor, target_descriptor, logging_prefix,
+                row_plan=row_plan),
+            chunk,
+            logging_prefix,
+        )
+        stats.updated += updated
+        stats.failed += len(errors)
+        stats.update_errors.update(errors)
+        throttle.after_chunk(time.monotonic() - chunk_started)
+        stats.processed += len(chunk)
+        logger.info(f'{logging_prefix}: Caught up chunk of {len(chunk)} '
+                    f'{queryset.model.__name__} instances, '
+                    f'{stats.updated} updated so far '
+                    f'({throttle.describe()})')
+
+    # Runs after the updates, so that the targets it creates are not
+    # updated again
+    created_stats = bulk_sync(
+        source_descriptor,
+        target_descriptor,
+        queryset=queryset,
+        logging_prefix=logging_prefix,
+        throttle=throttle,
+    )
+    stats.created = created_stats.created
+    stats.failed += created_stats.failed
+    stats.errors = created_stats.errors
+
+    checkpoint.advance_watermark(watermark)
+    stats.duration = time.monotonic() - started
+    return stats
+
+
+def update_targets(
+    source_instances,
+    source_descriptor,
+    target_descriptor,
+    logging_prefix,
+    row_plan=None,
+) -> int:
+    """
+    Update the targets of a chunk of source instances in bulk. Source
+    instances without a target are ignored, and so are targets that are
+    already up to date
+    :param source_instances: list of source instances, or of rows if
+        `row_plan` is given
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param logging_prefix: string prefix used in log messages
+    :param row_plan: :class: `RowPlan` the rows were read with
+    :return: number of updated target instances
+    """
+    target_pks = get_mapping_store(
+        source_descriptor, target_descriptor).get_target_pks(
+        [get_pk(source_instance) for source_instance in source_instances])
+    source_instances = [
+        source_instance for source_instance in source_instances
+        if get_pk(source_instance) in target_pks
+    ]
+    if not source_instances:
+        return 0
+
+    target_model_class = get_model_class(target_descriptor)
+    target_instances = target_model_class._base_manager.in_bulk(
+        target_pks.values())
+    target_model_dicts = build_target_model_dicts(
+        source_instances, target_descriptor, logging_prefix, row_plan)
+
+    updated = 0
+    changed_instances = []
+    changed_fields = set()
+    for source_instance, target_model_dict in zip(
+            source_instances, target_model_dicts):
+        target_instance = target_instances.get(
+            target_pks[get_pk(source_instance)])
+        if target_instance is None:
+            # Stale mapping, left to the reconciliation
+            continue
+        fields = [
+            field_name for field_name, value in target_model_dict.items()
+            if getattr(target_instance, field_name) != value
+        ]
+        if not fields:
+            continue
+        if not all(_is_concrete_field(target_model_class, field_name)
+                   for field_name in fields):
+            # Properties cannot be updated in bulk
+            update_instance(target_instance, target_model_dict)
+            updated += 1
+            continue
+        for field_name in fields:
+            setattr(target_instance, field_name,
+                    target_model_dict[field_name])
+        changed_instances.append(target_instance)
+        changed_fields.update(fields)
+
+    if changed_instances:
+        # Does not call save() and thus does not trigger auto sync
+        target_model_class._base_manager.bulk_update(
+            changed_instances, sorted(changed_fields))
+    return updated + len(changed_instances)
+
+
+def _is_concrete_field(model_class, field_name):
+    try:
+        return model_class._meta.get_field(field_name).concrete
+    except FieldDoesNotExist:
+        return False
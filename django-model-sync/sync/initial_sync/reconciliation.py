@@ -0,0 +1,177 @@
+"""
+Verification of source and target models being in sync, and repair of the
+instances that are not
+"""
+import time
+import typing as t
+from dataclasses import dataclass, field
+
+import structlog as logging
+from django.db import models
+
+from apps.b3_migration.model_descriptors.utils import (
+    get_model_class,
+)
+from apps.b3_migration.sync.initial_sync.bulk import (
+    DEFAULT_CHUNK_SIZE,
+    bulk_sync,
+    get_source_queryset,
+    iterate_chunks,
+)
+from apps.b3_migration.sync.initial_sync.replicas import get_replica_check
+from apps.b3_migration.sync.initial_sync.throttling import Throttle
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.sync.utils import (
+    build_target_model_dict,
+    sync_source_and_target_models,
+    translate_foreign_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReconciliationReport:
+    """
+    Result of comparing source instances with their targets
+    """
+    source_count: int = 0
+    synced_count: int = 0
+    missing_pks: t.List = field(default_factory=list)
+    mismatched_pks: t.List = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        return not self.missing_pks and not self.mismatched_pks
+
+
+def _comparable_value(value):
+    if isinstance(value, models.Model):
+        return value.pk
+    return value
+
+
+def compare(
+    source_descriptor,
+    target_descriptor,
+    queryset=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    read_using=None,
+    max_lag=None,
+) -> ReconciliationReport:
+    """
+    Compare source instances with their target instances
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param queryset: source instances to compare, defaults to all of them
+    :param chunk_size: number of source instances loaded at once
+    :param read_using: database alias the source instances are read from
+    :param max_lag: if given, wait before every chunk until the replication
+        lag of `read_using` is at most this many seconds
+    :return: :class: `ReconciliationReport`
+    """
+    if queryset is None:
+        queryset = get_source_queryset(source_descriptor)
+    if read_using is not None:
+        queryset = queryset.using(read_using)
+    mapping_store = get_mapping_store(source_descriptor, target_descriptor)
+    target_manager = get_model_class(target_descriptor)._base_manager
+
+    report = ReconciliationReport()
+
+    for chunk in iterate_chunks(
+            queryset, chunk_size,
+            before_chunk=get_replica_check(read_using, max_lag, 'RECONCILE')):
+        target_pks = mapping_store.get_target_pks(
+            [source_instance.pk for source_instance in chunk])
+        target_instances = target_manager.in_bulk(target_pks.values())
+        translations = translate_foreign_keys(chunk, target_descriptor)
+
+        for source_instance in chunk:
+            report.source_count += 1
+            target_instance = target_instances.get(
+                target_pks.get(source_instance.pk))
+            if target_instance is None:
+                report.missing_pks.append(source_instance.pk)
+                continue
+            report.synced_count += 1
+
+            expected = build_target_model_dict(
+                source_instance, target_descriptor, 'RECONCILE',
+                translations=translations)
+            expected_row = [
+                (field_name, _comparable_value(value))
+                for field_name, value in sorted(expected.items())
+            ]
+            actual_row = [
+                (field_name, _comparable_value(
+                    getattr(target_instance, field_name)))
+                for field_name, _ in expected_row
+            ]
+            if expected_row != actual_row:
+                report.mismatched_pks.append(source_instance.pk)
+
+    logger.info(f'RECONCILE: Compared {report.source_count} '
+                f'{queryset.model.__name__} instances, '
+                f'{len(report.missing_pks)} missing, '
+                f'{len(report.mismatched_pks)} mismatched')
+    return report
+
+
+def repair(
+    source_descriptor,
+    target_descriptor,
+    report,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    throttle=None,
+    read_using=None,
+    max_lag=None,
+):
+    """
+    Bring the instances found by :function: `compare()` back in sync:
+    missing targets are created in bulk, mismatched ones are updated
+    :param source_descriptor: source model descriptor
+    :param target_descriptor: target model descriptor
+    :param report: :class: `ReconciliationReport` returned by `compare()`
+    :param chunk_size: number of source instances per chunk
+    :param throttle: optional :class: `Throttle` limiting the rate and
+        adapting the size of the chunks, `chunk_size` is ignored if given
+    :param read_using: database alias the source instances are read from
+    :param max_lag: if given, wait before every chunk until the replication
+        lag of `read_using` is at most this many seconds
+    """
+    if throttle is None:
+        throttle = Throttle(chunk_size)
+    source_queryset = get_source_queryset(source_descriptor)
+
+    if report.missing_pks:
+        bulk_sync(
+            source_descriptor,
+            target_descriptor,
+            queryset=source_queryset.filter(pk__in=report.missing_pks),
+            logging_prefix='REPAIR',
+            throttle=throttle,
+            read_using=read_using,
+            max_lag=max_lag,
+        )
+
+    mismatched = source_queryset.filter(pk__in=report.mismatched_pks)
+    if read_using is not None:
+        mismatched = mismatched.using(read_using)
+    for chunk in iterate_chunks(
+            mismatched, throttle.get_chunk_size,
+            before_chunk=get_replica_check(read_using, max_lag, 'REPAIR')):
+        throttle.before_chunk(len(chunk))
+        chunk_started = time.monotonic()
+        for source_instance in chunk:
+            sync_source_and_target_models(
+                source_instance,
+                source_descriptor,
+                target_descriptor,
+                'REPAIR',
+                update=True,
+            )
+        throttle.after_chunk(time.monotonic() - chunk_started)
+        logger.info(f'REPAIR: Updated chunk of {len(chunk)} '
+                    f'{source_queryset.model.__name__} instances '
+                    f'({throttle.describe()})')
@@ -0,0 +1,65 @@
+"""
+Reading source instances from a read replica while writing to the primary
+"""
+import time
+import typing as t
+from functools import partial
+
+import structlog as logging
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def get_replica_lag(alias) -> t.Optional[float]:
+    """
+    Get the replication lag of a database
+    :param alias: database alias
+    :return: lag in seconds, None if it is unknown - which is the case for
+        primaries and backends other than PostgreSQL
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN EXTRACT(EPOCH FROM now() - '
+            'pg_last_xact_replay_timestamp()) END')
+        lag, = cursor.fetchone()
+    return float(lag) if lag is not None else None
+
+
+def wait_for_replica(alias, max_lag, logging_prefix,
+                     poll_interval=DEFAULT_POLL_INTERVAL, sleep=time.sleep):
+    """
+    Block until the replication lag of a database is at most `max_lag`
+    :param alias: database alias
+    :param max_lag: maximal lag in seconds
+    :param logging_prefix: string prefix used in log messages
+    :param poll_interval: seconds to wait between two lag checks
+    :return: seconds waited
+    """
+    waited = 0.0
+    while True:
+        lag = get_replica_lag(alias)
+        if lag is None or lag <= max_lag:
+            return waited
+        logger.info(f'{logging_prefix}: Replica {alias} lags {lag:.1f}s '
+                    f'behind, waiting')
+        sleep(poll_interval)
+        waited += poll_interval
+
+
+def get_replica_check(read_using, max_lag, logging_prefix) \
+        -> t.Optional[t.Callable]:
+    """
+    Get the callable waiting for the replica `read_using` to catch up,
+    to be called before every chunk read from it
+    :return: callable, None if there is nothing to check
+    """
+    if read_using is None or max_lag is None:
+        return None
+    return partial(wait_for_replica, read_using, max_lag, logging_prefix)
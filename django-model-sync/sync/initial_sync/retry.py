@@ -0,0 +1,260 @@
+"""
+Batched retries of the syncs recorded as :model: `SyncDeadLetter`, see
+:module: `dead_letters`.
+
+The due dead letters of a batch are grouped by descriptor pair and
+operation. Creations and updates of a group are retried with the bulk
+engine - mapped source instances have their targets updated with
+:function: `update_targets()`, the others get one created with
+:function: `bulk_sync()` - and failing source instances are isolated by
+bisection. Deletions are retried one at a time, since they are rare.
+
+A batch is claimed in a short transaction of its own, which puts the next
+attempt of its dead letters off by `MODEL_SYNC_RETRY_LEASE` seconds: the
+syncs then run without holding any lock, so that failures recorded
+meanwhile do not wait for them. A dead letter whose retry never completes
+is due again once its lease expires
+"""
+import typing as t
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+import structlog as logging
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.utils import timezone
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.model_descriptors.utils import get_model_class
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
+from apps.b3_migration.sync.auto_synchronization_base import \
+    AutoSynchronizationBase
+from apps.b3_migration.sync.dead_letters import (
+    get_max_attempts,
+    record_retry_failure,
+)
+from apps.b3_migration.sync.initial_sync.bulk import (
+    bulk_sync,
+    get_source_queryset,
+    run_isolated,
+)
+from apps.b3_migration.sync.initial_sync.catch_up import update_targets
+from apps.b3_migration.sync.mappings import get_mapping_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_RETRY_LEASE = 10 * 60
+
+
+@dataclass
+class RetryStats:
+    """
+    Counters of a retry run
+    """
+    resolved: int = 0
+    failed: int = 0
+    exhausted: int = 0
+
+
+def get_due_dead_letters(now=None):
+    """
+    Due dead letters, locked - skipping the ones locked by a concurrent
+    retry run. Must be evaluated inside a transaction
+    """
+    return SyncDeadLetter.objects.select_for_update(skip_locked=True).filter(
+        next_attempt_at__lte=now or timezone.now()
+    ).order_by('next_attempt_at', 'pk')
+
+
+def claim_due_dead_letters(batch_size=DEFAULT_BATCH_SIZE, lease=None,
+                           now=None) -> t.List[SyncDeadLetter]:
+    """
+    Claim a batch of due dead letters, putting their next attempt off by
+    the lease, in a transaction of its own - see the module docstring
+    :param lease: seconds, defaults to `MODEL_SYNC_RETRY_LEASE`
+    :return: the claimed dead letters
+    """
+    if lease is None:
+        lease = getattr(settings, 'MODEL_SYNC_RETRY_LEASE',
+                        DEFAULT_RETRY_LEASE)
+    now = now or timezone.now()
+    leased_until = now + timedelta(seconds=lease)
+    with transaction.atomic():
+        dead_letters = list(get_due_dead_letters(now)[:batch_size])
+        SyncDeadLetter.objects.filter(
+            pk__in=[dead_letter.pk for dead_letter in dead_letters]
+        ).update(next_attempt_at=leased_until)
+    for dead_letter in dead_letters:
+        dead_letter.next_attempt_at = leased_until
+    return dead_letters
+
+
+def retry_dead_letters(batch_size=DEFAULT_BATCH_SIZE, max_attempts=None) \
+        -> RetryStats:
+    """
+    Retry the due dead letters, a batch at a time, until none is due.
+    Claimed and failed dead letters are due later, so every one of them is
+    retried at most once per run, and concurrent runs skip them
+    :param batch_size: maximal number of dead letters per batch
+    :param max_attempts: number of failures after which a dead letter is
+        given up on, defaults to `MODEL_SYNC_RETRY_MAX_ATTEMPTS`
+    :return: :class: `RetryStats`
+    """
+    if max_attempts is None:
+        max_attempts = get_max_attempts()
+    stats = RetryStats()
+    while True:
+        dead_letters = claim_due_dead_letters(batch_size)
+        if not dead_letters:
+            return stats
+        retry_batch(dead_letters, max_attempts, stats)
+        logger.info(f'RETRY: Retried batch of {len(dead_letters)}, '
+                    f'{stats.resolved} resolved and {stats.failed} failed '
+                    f'so far')
+
+
+def retry_batch(dead_letters, max_attempts, stats):
+    """
+    Retry a batch of dead letters claimed by
+    :function: `claim_due_dead_letters()`. Resolved dead letters are
+    deleted, the others record their new failure - unless a failure was
+    recorded for them since they were claimed, which is kept as is
+    """
+    groups = defaultdict(list)
+    for dead_letter in dead_letters:
+        groups[dead_letter.descriptor_id, dead_letter.operation].append(
+            dead_letter)
+
+    for (descriptor_id, operation), group in groups.items():
+        source_pks = [dead_letter.source_pk for dead_letter in group]
+        try:
+            pair = registry.get_pair(descriptor_id)
+            if operation == SyncDeadLetter.DELETE:
+                errors = retry_deletes(pair, {
+                    dead_letter.source_pk: dead_letter.target_pk
+                    for dead_letter in group
+                })
+            else:
+                errors = retry_syncs(pair, source_pks)
+        except (InterfaceError, OperationalError):
+            raise
+        except Exception as exc:
+            logger.error(f'RETRY: Failed to retry {descriptor_id} '
+                         f'{operation}s: {exc!r}')
+            errors = dict.fromkeys(source_pks, exc)
+
+        resolved = [
+            dead_letter for dead_letter in group
+            if dead_letter.source_pk not in errors
+        ]
+        _get_unchanged(resolved).delete()
+        stats.resolved += len(resolved)
+        for dead_letter in group:
+            if dead_letter.source_pk in errors:
+                stats.failed += 1
+                dead_letter = _record_retry_failure(
+                    dead_letter, errors[dead_letter.source_pk], max_attempts)
+                if dead_letter is not None and \
+                        dead_letter.next_attempt_at is None:
+                    stats.exhausted += 1
+
+
+def _get_unchanged(dead_letters):
+    """
+    Claimed dead letters that no failure was recorded for since, i.e. that
+    still have the next attempt of their claim
+    """
+    pks_by_next_attempt_at = defaultdict(list)
+    for dead_letter in dead_letters:
+        pks_by_next_attempt_at[dead_letter.next_attempt_at].append(
+            dead_letter.pk)
+    queryset = SyncDeadLetter.objects.none()
+    for next_attempt_at, pks in pks_by_next_attempt_at.items():
+        queryset |= SyncDeadLetter.objects.filter(
+            pk__in=pks, next_attempt_at=next_attempt_at)
+    return queryset
+
+
+def _record_retry_failure(dead_letter, exc, max_attempts) \
+        -> t.Optional[SyncDeadLetter]:
+    with transaction.atomic():
+        dead_letter = _get_unchanged([dead_letter]).select_for_update() \
+            .first()
+        if dead_letter is not None:
+            record_retry_failure(dead_letter, exc, max_attempts)
+    return dead_letter
+
+
+def retry_syncs(pair, source_pks) -> t.Dict:
+    """
+    Sync source instances to their targets, creating the missing ones.
+    Source instances that do not exist anymore have nothing left to sync
+    :return: dict of the pks of the failed source instances to their errors
+    """
+    source_descriptor = pair.source.descriptor
+    target_descriptor = pair.target.descriptor
+    queryset = get_source_queryset(source_descriptor).filter(
+        pk__in=source_pks)
+
+    _, errors = run_isolated(
+        lambda source_instances: update_targets(
+            source_instances, source_descriptor, target_descriptor, 'RETRY'),
+        list(queryset.order_by('pk')),
+        'RETRY',
+    ) if queryset.exists() else (0, {})
+    errors.update(bulk_sync(
+        source_descriptor,
+        target_descriptor,
+        queryset=queryset.exclude(pk__in=list(errors)),
+        logging_prefix='RETRY',
+    ).errors)
+    return errors
+
+
+def retry_deletes(pair, target_pks) -> t.Dict:
+    """
+    Delete the targets of deleted source instances, and their mappings.
+    Source instances that still exist were not deleted after all
+    :param target_pks: dict of source pk to the pk of its target, None if
+        unknown - it is then looked up in the mappings
+    :return: dict of the pks of the failed source instances to their errors
+    """
+    source_descriptor = pair.source.descriptor
+    target_descriptor = pair.target.descriptor
+    existing_pks = set(get_source_queryset(source_descriptor).filter(
+        pk__in=list(target_pks)).values_list('pk', flat=True))
+    target_pks = {
+        source_pk: target_pk for source_pk, target_pk in target_pks.items()
+        if source_pk not in existing_pks
+    }
+    mapping_store = get_mapping_store(source_descriptor, target_descriptor)
+    target_pks.update(mapping_store.get_target_pks([
+        source_pk for source_pk, target_pk in target_pks.items()
+        if target_pk is None
+    ]))
+    target_model_class = get_model_class(target_descriptor)
+
+    errors = {}
+    for source_pk, target_pk in target_pks.items():
+        if target_pk is None:
+            logger.warning(f'RETRY: Target of deleted {source_pk} is '
+                           f'unknown, nothing to delete')
+            continue
+        try:
+            with transaction.atomic():
+                mapping_store.delete(source_pk, target_pk)
+                target_instance = target_model_class._base_manager.filter(
+                    pk=target_pk).first()
+                if isinstance(target_instance, AutoSynchronizationBase):
+                    target_instance.delete(target=True)
+                elif target_instance is not None:
+                    target_instance.delete()
+        except (InterfaceError, OperationalError):
+            raise
+        except Exception as exc:
+            logger.error(f'RETRY: Failed to delete the target of '
+                         f'{source_pk}: {exc!r}')
+            errors[source_pk] = exc
+    return errors
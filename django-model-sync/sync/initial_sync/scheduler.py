@@ -0,0 +1,122 @@
+"""
+Running the syncs of several descriptor pairs in dependency order.
+
+A pair is started once all pairs it depends on - see
+:function: `get_dependencies()` - have finished. Independent pairs run
+concurrently in a thread pool. Pairs depending on a pair that failed are
+skipped
+"""
+import time
+import typing as t
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import structlog as logging
+from django.db import connections
+
+from apps.b3_migration.model_descriptors.registry import (
+    DescriptorPair,
+    registry,
+)
+from apps.b3_migration.sync.initial_sync.bulk import SyncStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PairResult:
+    """
+    Outcome of the sync of a descriptor pair
+    """
+    pair: DescriptorPair
+    stats: t.Optional[SyncStats] = None
+    error: t.Optional[Exception] = None
+    skipped: bool = False
+    duration: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and not self.skipped
+
+
+def _run(sync_pair, pair, close_connections):
+    started = time.monotonic()
+    try:
+        stats = sync_pair(pair)
+    except Exception as exc:
+        logger.error(f'INIT-SYNC: {pair.id} failed: {exc}', exc_info=True)
+        return PairResult(
+            pair, error=exc, duration=time.monotonic() - started)
+    finally:
+        if close_connections:
+            # Every worker thread has its own connection
+            connections.close_all()
+    return PairResult(pair, stats=stats, duration=time.monotonic() - started)
+
+
+def run_in_dependency_order(
+    descriptor_ids,
+    sync_pair: t.Callable[[DescriptorPair], SyncStats],
+    workers=1,
+    on_result: t.Optional[t.Callable[[PairResult], None]] = None,
+) -> t.List[PairResult]:
+    """
+    Sync descriptor pairs after the pairs they depend on
+    :param descriptor_ids: ids of the pairs to sync, None for all pairs.
+        Dependencies on pairs that are not synced are assumed to be in sync
+    :param sync_pair: callable syncing a pair
+    :param workers: number of pairs synced concurrently
+    :param on_result: optional callable called with the :class: `PairResult`
+        of every pair as soon as it is finished or skipped
+    :return: list of :class: `PairResult` in the order the pairs finished
+    """
+    pending = {
+        pair.id: pair for pair in registry.get_sync_order(descriptor_ids)}
+    dependencies = {
+        pair.id: {
+            dependency for dependency in pair.dependencies
+            if dependency in pending
+        }
+        for pair in pending.values()
+    }
+    waiting_on = {
+        pair_id: set(pair_dependencies)
+        for pair_id, pair_dependencies in dependencies.items()
+    }
+    results = []
+
+    def finish(result):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+        for pair_dependencies in waiting_on.values():
+            pair_dependencies.discard(result.pair.id)
+        if result.succeeded:
+            return
+        for pair_id in list(pending):
+            if pair_id in pending and result.pair.id in dependencies[pair_id]:
+                finish(PairResult(pending.pop(pair_id), skipped=True))
+
+    def pop_ready():
+        return [
+            pending.pop(pair_id) for pair_id in list(pending)
+            if not waiting_on[pair_id]
+        ]
+
+    if workers <= 1:
+        while pending:
+            for pair in pop_ready():
+                finish(_run(sync_pair, pair, close_connections=False))
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            for pair in pop_ready():
+                running[executor.submit(
+                    _run, sync_pair, pair, close_connections=True)] = pair
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                finish(future.result())
+    return results
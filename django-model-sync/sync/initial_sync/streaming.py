@@ -0,0 +1,117 @@
+"""
+Bulk syncing of plain column values, without instantiating source models.
+
+Target descriptors that only copy columns - through `fields_mapping` and
+`fields_translated`, without `fields_funcs` - do not need the source
+instance: the columns are read with :function: `values_list()` and mapped
+positionally into the target instances.
+
+The rows are read a chunk at a time by :function: `iterate_chunks()`, with
+keyset pagination rather than a server-side cursor: memory stays bounded
+by the chunk size either way, but every chunk is a short query of its own
+that can resume after a checkpoint, adapt its size to the throttle and
+wait for the replica in between, without holding a cursor - and the
+snapshot it pins - open for the whole table
+"""
+import typing as t
+
+from django.core.exceptions import FieldDoesNotExist
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.sync.utils import translate_pks
+
+
+class RowPlan:
+    """
+    Positions of the source columns in a row and the target fields they are
+    copied to. The first column of every row is the source pk
+    """
+    def __init__(self, columns, target_fields, translated):
+        self.columns = columns
+        self.target_fields = target_fields
+        self.translated = translated
+
+    def get_queryset(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def get_translations(self, rows) -> t.Dict:
+        """
+        Translate the foreign keys of a chunk of rows, with one query per
+        related descriptor pair
+        """
+        source_pks_by_descriptor = {}
+        for index, _, descriptor_id in self.translated:
+            source_pks = source_pks_by_descriptor.setdefault(
+                descriptor_id, set())
+            source_pks.update(
+                row[index] for row in rows if row[index] is not None)
+        return translate_pks(source_pks_by_descriptor)
+
+    def build_target_model_dict(self, row, translations) -> t.Dict:
+        """
+        Same as :function: `build_target_model_dict()` for a row
+        """
+        target_model_dict = {
+            target_field: value
+            for target_field, value in zip(self.target_fields, row[1:])
+        }
+        for index, target_field, descriptor_id in self.translated:
+            source_pk = row[index]
+            if source_pk is None:
+                target_model_dict[target_field] = None
+                continue
+            try:
+                target_model_dict[target_field] = \
+                    translations[descriptor_id][source_pk]
+            except KeyError:
+                raise ValueError(
+                    f'{self.columns[index]}={source_pk} of row {row[0]} '
+                    f'is not synced through {descriptor_id} yet')
+        return target_model_dict
+
+
+def _get_attname(model_class, field_name):
+    field = model_class._meta.get_field(field_name)
+    if not field.concrete or field.many_to_many:
+        raise FieldDoesNotExist(field_name)
+    return field.attname
+
+
+def get_row_plan(source_descriptor, target_descriptor) \
+        -> t.Optional[RowPlan]:
+    """
+    Get the :class: `RowPlan` of a descriptor pair
+    :return: :class: `RowPlan`, None if the target descriptor needs source
+        instances - because of `fields_funcs`, or fields that are not
+        concrete model fields
+    """
+    if target_descriptor.get('fields_funcs'):
+        return None
+    source_class = registry.get_compiled(source_descriptor).model_class
+    target_class = registry.get_compiled(target_descriptor).model_class
+    fields_optional = set(target_descriptor.get('fields_optional', []))
+
+    columns = ['pk']
+    target_fields = []
+    try:
+        for source_field_name, target_field_name in target_descriptor.get(
+                'fields_mapping', {}).items():
+            if source_field_name in fields_optional and \
+                    not hasattr(source_class, source_field_name):
+                continue
+            columns.append(_get_attname(source_class, source_field_name))
+            try:
+                target_fields.append(
+                    _get_attname(target_class, target_field_name))
+            except FieldDoesNotExist:
+                target_fields.append(target_field_name)
+
+        translated = []
+        for source_field_name, target_field_name, descriptor_id in \
+                target_descriptor.get('fields_translated', []):
+            columns.append(_get_attname(source_class, source_field_name))
+            translated.append(
+                (len(columns) - 1, target_field_name, descriptor_id))
+    except FieldDoesNotExist:
+        return None
+    return RowPlan(tuple(columns), tuple(target_fields), tuple(translated))
@@ -0,0 +1,108 @@
+"""
+Throttling of bulk syncs running next to live traffic: a token bucket caps
+the number of rows synced per second, and the chunk size adapts to the
+time it takes to commit a chunk
+"""
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled with `rate` tokens per second, holding at most
+    `capacity` tokens. Taking more tokens than available blocks until the
+    bucket has been refilled accordingly
+    """
+    def __init__(self, rate, capacity=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last_refill = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def consume(self, tokens):
+        """
+        Take `tokens` from the bucket, sleeping as long as needed
+        :return: seconds slept
+        """
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        self._sleep(wait)
+        self._refill()
+        return wait
+
+
+class Throttle:
+    """
+    Chunk size and rate control of a bulk sync.
+
+    After every chunk the commit latency is compared with
+    `target_latency`: above it the chunk size is halved, below half of it
+    the chunk size grows by a quarter, always within
+    [`min_chunk_size`, `max_chunk_size`]. Without `target_latency` the chunk
+    size stays fixed, without `rows_per_second` the rate is not limited
+    """
+    def __init__(self, chunk_size, rows_per_second=None, target_latency=None,
+                 min_chunk_size=10, max_chunk_size=10000,
+                 sleep=time.sleep):
+        self.chunk_size = chunk_size
+        self.rows_per_second = rows_per_second
+        self.target_latency = target_latency
+        self.min_chunk_size = min(min_chunk_size, chunk_size)
+        self.max_chunk_size = max(max_chunk_size, chunk_size)
+        self.last_latency = None
+        self.waited = 0.0
+        if rows_per_second:
+            self._bucket = TokenBucket(
+                rows_per_second,
+                capacity=max(rows_per_second, chunk_size),
+                sleep=sleep,
+            )
+        else:
+            self._bucket = None
+
+    def get_chunk_size(self):
+        return self.chunk_size
+
+    def before_chunk(self, rows):
+        """
+        Wait until the rate budget allows to write `rows` rows
+        """
+        if self._bucket is not None:
+            self.waited += self._bucket.consume(rows)
+
+    def after_chunk(self, latency):
+        """
+        Adapt the chunk size to the commit latency of the last chunk
+        :param latency: seconds it took to write and commit the chunk
+        """
+        self.last_latency = latency
+        if not self.target_latency:
+            return
+        if latency > self.target_latency:
+            self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+        elif latency < self.target_latency / 2:
+            self.chunk_size = min(
+                self.max_chunk_size,
+                self.chunk_size + max(1, self.chunk_size // 4))
+
+    def describe(self):
+        parts = [f'chunk size {self.chunk_size}']
+        if self.rows_per_second:
+            parts.append(f'budget {self.rows_per_second} rows/s')
+        if self.last_latency is not None:
+            parts.append(f'last commit {self.last_latency * 1000:.0f}ms')
+        if self.waited:
+            parts.append(f'throttled {self.waited:.1f}s')
+        return ', '.join(parts)
@@ -0,0 +1,163 @@
+"""
+Deadlock-free auto sync of pairs written to from both sides.
+
+An auto synced save locks the row of the saved instance, then the row of
+its target. A concurrent save of the target locks the same two rows in the
+opposite order, and the database aborts one of the two transactions. Pairs
+whose two descriptors opt in with:
+
+    OLD_ADDRESS_DESCRIPTOR = {
+        ...
+        'lock_ordering': True,
+    }
+    ADDRESS_DESCRIPTOR = {
+        ...
+        'lock_ordering': True,
+    }
+
+run every save and delete of a synced instance together with its sync in
+one transaction, which first locks both rows with
+:function: `select_for_update()` in a canonical order - the order of the
+model labels - so that both directions of the pair wait on each other
+instead of deadlocking. Deadlocks involving other rows are retried with
+jitter, up to `MODEL_SYNC_DEADLOCK_RETRIES` times, and counted in
+:data: `deadlock_retries`.
+
+Inside an outer transaction the rows are still locked in order, but the
+deadlock is left to the caller: the outer transaction is aborted and
+cannot be retried from here
+"""
+import random
+import threading
+import time
+import typing as t
+
+import structlog as logging
+from django.conf import settings
+from django.db import OperationalError, router, transaction
+
+from apps.b3_migration.model_descriptors.utils import get_model_class
+from apps.b3_migration.sync.mappings import get_mapping_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLOCK_RETRIES = 3
+# Upper bound of the jitter before the first retry, doubled on every retry
+DEFAULT_RETRY_DELAY = 0.05
+
+# PostgreSQL SQLSTATE and MySQL error code of a deadlock
+DEADLOCK_PGCODE = '40P01'
+DEADLOCK_MYSQL_ERRNO = 1213
+
+
+class RetryCounter:
+    """
+    Thread-safe count of deadlock retries, and of operations given up on
+    after exhausting their retries
+    """
+    def __init__(self):
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+
+    def clear(self):
+        with self._lock:
+            self.retries = 0
+            self.failures = 0
+
+    def stats(self):
+        return {'retries': self.retries, 'failures': self.failures}
+
+
+deadlock_retries = RetryCounter()
+
+
+def uses_lock_ordering(source_descriptor, target_descriptor) -> bool:
+    return bool(source_descriptor.get('lock_ordering')) and \
+        bool(target_descriptor.get('lock_ordering'))
+
+
+def is_deadlock(exc: Exception) -> bool:
+    if not isinstance(exc, OperationalError):
+        return False
+    cause = exc.__cause__
+    if getattr(cause, 'pgcode', None) == DEADLOCK_PGCODE:
+        return True
+    args = getattr(cause, 'args', None) or exc.args
+    return bool(args) and args[0] == DEADLOCK_MYSQL_ERRNO
+
+
+def lock_in_order(source_instance, source_descriptor, target_descriptor):
+    """
+    Lock the rows of a source instance and of its target, if it has one,
+    in the order of their model labels. Must be called inside a transaction
+    """
+    rows = [(source_instance._meta.label_lower, source_instance.__class__,
+             source_instance.pk)]
+    target_pk = get_mapping_store(
+        source_descriptor, target_descriptor).get_target_pk(source_instance.pk)
+    if target_pk is not None:
+        target_model_class = get_model_class(target_descriptor)
+        rows.append((target_model_class._meta.label_lower,
+                     target_model_class, target_pk))
+    for _, model_class, pk in sorted(rows, key=lambda row: row[0]):
+        list(model_class._base_manager.select_for_update().filter(
+            pk=pk).values_list('pk'))
+
+
+def run_locked(
+    func: t.Callable,
+    source_instance,
+    source_descriptor,
+    target_descriptor,
+    retries=None,
+    sleep=time.sleep,
+):
+    """
+    Call `func` - the save or delete of a synced instance - in a transaction
+    holding the locks of the instance and of its target, see the module
+    docstring. Unsaved instances have no row to lock yet
+    :return: result of `func`
+    """
+    if retries is None:
+        retries = getattr(settings, 'MODEL_SYNC_DEADLOCK_RETRIES',
+                          DEFAULT_DEADLOCK_RETRIES)
+    using = router.db_for_write(source_instance.__class__)
+    in_outer_transaction = transaction.get_connection(using).in_atomic_block
+
+    # Restored before every retry, since a rolled back insert leaves its pk
+    # on the instance
+    pk, adding = source_instance.pk, source_instance._state.adding
+    attempt = 0
+    while True:
+        source_instance.pk, source_instance._state.adding = pk, adding
+        try:
+            with transaction.atomic(using=using):
+                if pk is not None:
+                    lock_in_order(
+                        source_instance, source_descriptor, target_descriptor)
+                return func()
+        except OperationalError as exc:
+            if in_outer_transaction or not is_deadlock(exc):
+                raise
+            if attempt >= retries:
+                deadlock_retries.failed()
+                logger.error(f'AUTO-SYNC: Deadlock while syncing '
+                             f'{source_instance}, giving up after '
+                             f'{attempt} retries')
+                raise
+            deadlock_retries.retried()
+            delay = random.uniform(0, DEFAULT_RETRY_DELAY * 2 ** attempt)
+            attempt += 1
+            logger.info(f'AUTO-SYNC: Deadlock while syncing '
+                        f'{source_instance}, retry {attempt} of {retries} in '
+                        f'{delay * 1000:.0f}ms')
+            sleep(delay)
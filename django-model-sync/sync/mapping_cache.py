@@ -0,0 +1,103 @@
+"""
+In-memory LRU cache of source pk -> target pk mappings.
+
+A mapping never changes once it is created, so it can be cached for the
+lifetime of the process - it only has to be evicted when it is deleted.
+Descriptor pairs opt in with `'cache_mappings': True` in the source
+descriptor. The size of the cache is set with the
+`MODEL_SYNC_MAPPING_CACHE_SIZE` setting, and its hit rate is counted per
+descriptor pair as well
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+DEFAULT_MAPPING_CACHE_SIZE = 10000
+
+_MISSING = object()
+
+
+class MappingCache:
+    """
+    Bounded, thread-safe LRU cache with hit-rate statistics, in total and
+    per scope. Keys are (source model label, target model label, source pk)
+    tuples, scopes are descriptor pair ids
+    """
+    def __init__(self, max_size=DEFAULT_MAPPING_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Scope to [hits, misses]
+        self._scope_counts = defaultdict(lambda: [0, 0])
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, scope=None):
+        """
+        :param scope: descriptor pair id the lookup is counted for
+        """
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            hit = value is not _MISSING
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            if scope is not None:
+                self._scope_counts[scope][0 if hit else 1] += 1
+            return value if hit else default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scope_counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        return _get_hit_rate(self.hits, self.misses)
+
+    def stats(self):
+        with self._lock:
+            scopes = {
+                scope: {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': _get_hit_rate(hits, misses),
+                }
+                for scope, (hits, misses) in self._scope_counts.items()
+            }
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'scopes': scopes,
+        }
+
+
+def _get_hit_rate(hits, misses):
+    lookups = hits + misses
+    return hits / lookups if lookups else 0.0
+
+
+mapping_cache = MappingCache(getattr(
+    settings, 'MODEL_SYNC_MAPPING_CACHE_SIZE', DEFAULT_MAPPING_CACHE_SIZE))
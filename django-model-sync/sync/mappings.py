@@ -0,0 +1,272 @@
+"""
+Lookups of the mapping between source and target instances.
+
+A mapping is stored either in a buddy model of the descriptor pair - one
+model per pair, with a one-to-one field to each of the two models - or in
+the generic :model: `SyncMapping` table shared by all pairs. Descriptors
+opt into the generic table with:
+
+    OLD_ADDRESS_DESCRIPTOR = {
+        ...
+        'mapping_name': 'address',
+        'mapping_side': 'source',
+    }
+    ADDRESS_DESCRIPTOR = {
+        ...
+        'mapping_name': 'address',
+        'mapping_side': 'target',
+    }
+
+All lookups of a :class: `MappingStore` take lists of pks and run a single
+query, regardless of the storage. Pairs with `'cache_mappings': True` in
+the source descriptor additionally keep the mappings they looked up or
+created in the process-wide :data: `mapping_cache`
+"""
+import typing as t
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.model_descriptors.utils import (
+    get_buddy_class,
+    get_model_class,
+)
+from apps.b3_migration.models.sync_mapping import SyncMapping
+from apps.b3_migration.sync.mapping_cache import mapping_cache
+
+
+class MappingStore:
+    source_column = None
+    target_column = None
+
+    def __init__(self, source_descriptor, target_descriptor):
+        self.source_label = \
+            get_model_class(source_descriptor)._meta.label_lower
+        self.target_label = \
+            get_model_class(target_descriptor)._meta.label_lower
+        self.use_cache = source_descriptor.get('cache_mappings', False)
+        self.cache_scope = registry.get_pair_id(
+            source_descriptor, target_descriptor)
+
+    def get_queryset(self):
+        raise NotImplementedError(
+            'MappingStore requires the function get_queryset() '
+            'to be implemented')
+
+    def build(self, source_pk, target_pk):
+        raise NotImplementedError(
+            'MappingStore requires the function build() '
+            'to be implemented')
+
+    def get_stamp_key(self, source_pk, target_pk) -> t.Tuple[str, int]:
+        """
+        Get the key of the :model: `SyncStamp` of a mapping, which is the
+        same in both directions of the pair
+        :return: tuple of the scope and the pk of the instance on the
+            canonical side of the mapping
+        """
+        raise NotImplementedError(
+            'MappingStore requires the function get_stamp_key() '
+            'to be implemented')
+
+    def _cache_key(self, source_pk):
+        return self.source_label, self.target_label, source_pk
+
+    def _reverse_cache_key(self, target_pk):
+        return self.target_label, self.source_label, target_pk
+
+    def get_target_pks(self, source_pks) -> t.Dict:
+        """
+        Translate source pks to target pks
+        :param source_pks: iterable of source pks
+        :return: dict of source pk to target pk, for mapped source pks only
+        """
+        target_pks = {}
+        if self.use_cache:
+            uncached_pks = []
+            for source_pk in source_pks:
+                target_pk = mapping_cache.get(
+                    self._cache_key(source_pk), scope=self.cache_scope)
+                if target_pk is None:
+                    uncached_pks.append(source_pk)
+                else:
+                    target_pks[source_pk] = target_pk
+            source_pks = uncached_pks
+            if not source_pks:
+                return target_pks
+
+        queried = dict(
+            self.get_queryset().filter(
+                **{f'{self.source_column}__in': source_pks}
+            ).values_list(self.source_column, self.target_column)
+        )
+        self._cache_on_commit(queried)
+        target_pks.update(queried)
+        return target_pks
+
+    def get_source_pks(self, target_pks) -> t.Dict:
+        """
+        Translate target pks to source pks
+        :param target_pks: iterable of target pks
+        :return: dict of target pk to source pk, for mapped target pks only
+        """
+        return dict(
+            self.get_queryset().filter(
+                **{f'{self.target_column}__in': target_pks}
+            ).values_list(self.target_column, self.source_column)
+        )
+
+    def get_target_pk(self, source_pk):
+        """
+        :return: target pk mapped to `source_pk`, None if there is none
+        """
+        return self.get_target_pks([source_pk]).get(source_pk)
+
+    def create(self, source_pk, target_pk):
+        self.build(source_pk, target_pk).save()
+        self._cache_on_commit({source_pk: target_pk})
+
+    def claim(self, source_pk, target_pk):
+        """
+        Create the mapping of a source pk, unless another process created
+        one first. Relies on the unique constraint of the source column, so
+        that concurrent creations cannot both succeed: the insert of the
+        loser does nothing - waiting for the winner's transaction if needed
+        :return: target pk the source pk is mapped to, which is not
+            `target_pk` if another process won
+        :raises IntegrityError: if `target_pk` is mapped to another source
+            pk already
+        """
+        self.get_queryset().model._default_manager.bulk_create(
+            [self.build(source_pk, target_pk)], ignore_conflicts=True)
+        mapped_target_pk = self.get_queryset().filter(
+            **{self.source_column: source_pk}
+        ).values_list(self.target_column, flat=True).first()
+        if mapped_target_pk is None:
+            # The insert conflicted on the target column instead, which
+            # no retry can resolve
+            raise IntegrityError(
+                f'Cannot map {self.source_label} {source_pk}: '
+                f'{self.target_label} {target_pk} is mapped to another '
+                f'{self.source_label} already')
+        self._cache_on_commit({source_pk: mapped_target_pk})
+        return mapped_target_pk
+
+    def _cache_on_commit(self, target_pks):
+        """
+        Cache mappings once the transaction commits - right away outside
+        of one. A mapping created, or read, in a transaction that is rolled
+        back would outlive it otherwise
+        :param target_pks: dict of source pk to target pk
+        """
+        if self.use_cache and target_pks:
+            transaction.on_commit(lambda: self._cache(target_pks))
+
+    def _cache(self, target_pks):
+        for source_pk, target_pk in target_pks.items():
+            mapping_cache.set(self._cache_key(source_pk), target_pk)
+
+    def bulk_create(self, pk_pairs):
+        """
+        :param pk_pairs: iterable of (source pk, target pk) tuples
+        """
+        instances = [
+            self.build(source_pk, target_pk)
+            for source_pk, target_pk in pk_pairs
+        ]
+        self.get_queryset().model._default_manager.bulk_create(instances)
+
+    def delete(self, source_pk, target_pk=None):
+        """
+        Delete the mapping of a source pk, and evict it from the cache
+        :param source_pk: source pk
+        :param target_pk: target pk the source pk is mapped to, if known -
+            used to evict the mapping of the reverse direction as well
+        """
+        self.get_queryset().filter(**{self.source_column: source_pk}).delete()
+        self.evict(source_pk, target_pk)
+
+    def evict(self, source_pk, target_pk=None):
+        mapping_cache.evict(self._cache_key(source_pk))
+        if target_pk is not None:
+            mapping_cache.evict(self._reverse_cache_key(target_pk))
+
+    def filter_unsynced(self, queryset):
+        """
+        Restrict a queryset of source instances to those without a mapping
+        """
+        return queryset.filter(~Exists(self.get_queryset().filter(
+            **{self.source_column: OuterRef('pk')})))
+
+
+class BuddyMappingStore(MappingStore):
+    """
+    Mappings stored in the buddy model of a descriptor pair
+    """
+    def __init__(self, source_descriptor, target_descriptor):
+        super().__init__(source_descriptor, target_descriptor)
+        self.buddy_class = get_buddy_class(target_descriptor)
+        self.source_column = f'{source_descriptor["field_name_in_buddy"]}_id'
+        self.target_column = f'{target_descriptor["field_name_in_buddy"]}_id'
+
+    def get_queryset(self):
+        return self.buddy_class._default_manager.all()
+
+    def build(self, source_pk, target_pk):
+        return self.buddy_class(**{
+            self.source_column: source_pk,
+            self.target_column: target_pk,
+        })
+
+    def get_stamp_key(self, source_pk, target_pk):
+        if self.source_column < self.target_column:
+            return self.buddy_class._meta.label_lower, source_pk
+        return self.buddy_class._meta.label_lower, target_pk
+
+
+class GenericMappingStore(MappingStore):
+    """
+    Mappings stored in the :model: `SyncMapping` table
+    """
+    def __init__(self, source_descriptor, target_descriptor):
+        super().__init__(source_descriptor, target_descriptor)
+        self.mapping_name = source_descriptor['mapping_name']
+        self.source_column = f'{source_descriptor["mapping_side"]}_pk'
+        self.target_column = f'{target_descriptor["mapping_side"]}_pk'
+
+    def get_queryset(self):
+        return SyncMapping.objects.filter(mapping_name=self.mapping_name)
+
+    def build(self, source_pk, target_pk):
+        return SyncMapping(**{
+            'mapping_name': self.mapping_name,
+            self.source_column: source_pk,
+            self.target_column: target_pk,
+        })
+
+    def get_stamp_key(self, source_pk, target_pk):
+        if self.source_column == 'source_pk':
+            return self.mapping_name, source_pk
+        return self.mapping_name, target_pk
+
+
+def get_mapping_store(source_descriptor, target_descriptor) -> MappingStore:
+    """
+    Get the mapping store of a descriptor pair. The store of a registered
+    pair is created once and reused
+    """
+    pair = registry.get_pair_for_descriptors(
+        source_descriptor, target_descriptor)
+    if pair is not None:
+        if pair.mapping_store is None:
+            pair.mapping_store = _create_mapping_store(
+                source_descriptor, target_descriptor)
+        return pair.mapping_store
+    return _create_mapping_store(source_descriptor, target_descriptor)
+
+
+def _create_mapping_store(source_descriptor, target_descriptor):
+    if 'mapping_name' in source_descriptor:
+        return GenericMappingStore(source_descriptor, target_descriptor)
+    return BuddyMappingStore(source_descriptor, target_descriptor)
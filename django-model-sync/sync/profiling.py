@@ -0,0 +1,148 @@
+"""
+Opt-in profiling of auto syncs.
+
+When enabled - for the whole process with the `MODEL_SYNC_PROFILE` setting,
+or for a block with :function: `profile_auto_sync()` - every auto synced
+save and delete is run under :mod: `cProfile`: the hook chain from
+:function: `save()` through :function: `_pre_save()`,
+:function: `_post_save()`, :function: `sync_source_and_target_models()` and
+:function: `update_instance()`, including the `fields_funcs`, logging, model
+instantiation and SQL it runs. Profiles are aggregated per descriptor pair
+in :data: `profiles`, and written as a report with
+:function: `dump_profiles()`:
+
+    with profile_auto_sync('/tmp/auto_sync.prof.txt'):
+        order.save()
+
+Profiling slows syncs down several times, it is meant for investigations,
+not to be left on
+"""
+import cProfile
+import io
+import pstats
+import threading
+import typing as t
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import structlog as logging
+from django.conf import settings
+
+from apps.b3_migration.model_descriptors.registry import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SORT = 'cumulative'
+DEFAULT_LIMIT = 40
+
+_enabled: ContextVar[bool] = ContextVar('profiling_enabled', default=False)
+# Set while a sync is profiled, since profilers cannot be nested
+_profiling: ContextVar[bool] = ContextVar('profiling', default=False)
+
+
+class ProfileAggregate:
+    """
+    Thread-safe aggregate of the profiles of the auto syncs, by descriptor
+    pair id
+    """
+    def __init__(self):
+        self.calls = Counter()
+        self._stats: t.Dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    def add(self, pair_id, profile: cProfile.Profile):
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:
+            # Nothing was profiled
+            return
+        with self._lock:
+            if pair_id in self._stats:
+                self._stats[pair_id].add(stats)
+            else:
+                self._stats[pair_id] = stats
+            self.calls[pair_id] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self.calls.clear()
+
+    def report(self, sort=DEFAULT_SORT, limit=DEFAULT_LIMIT) -> str:
+        """
+        :return: the `limit` most expensive functions of every pair, by
+            `sort` - any sort key of :class: `pstats.Stats`
+        """
+        stream = io.StringIO()
+        with self._lock:
+            for pair_id in sorted(self._stats):
+                stats = self._stats[pair_id]
+                stream.write(f'=== {pair_id}: {self.calls[pair_id]} syncs in '
+                             f'{stats.total_tt:.3f}s ===\n')
+                stats.stream = stream
+                stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+profiles = ProfileAggregate()
+
+
+def is_profiling_enabled() -> bool:
+    return _enabled.get() or getattr(settings, 'MODEL_SYNC_PROFILE', False)
+
+
+def dump_profiles(path, sort=DEFAULT_SORT, limit=DEFAULT_LIMIT):
+    """
+    Write the report of the aggregated profiles to a file, see
+    :function: `ProfileAggregate.report()`
+    """
+    with open(path, 'w') as report_file:
+        report_file.write(profiles.report(sort, limit))
+    logger.info(f'AUTO-SYNC: Profiles of {sum(profiles.calls.values())} '
+                f'syncs written to {path}')
+
+
+@contextmanager
+def profile_auto_sync(path=None, sort=DEFAULT_SORT, limit=DEFAULT_LIMIT):
+    """
+    Profile the auto syncs of the block, in the current thread or asyncio
+    task only
+    :param path: if given, the aggregated profiles are written to this file
+        when the block is left
+    """
+    token = _enabled.set(True)
+    try:
+        yield profiles
+    finally:
+        _enabled.reset(token)
+        if path is not None:
+            dump_profiles(path, sort, limit)
+
+
+@contextmanager
+def profile_sync(source_descriptor, target_descriptor):
+    """
+    Profile the block if profiling is enabled, as a sync of the descriptor
+    pair
+    """
+    if _profiling.get() or not is_profiling_enabled():
+        yield
+        return
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is active in this thread
+        yield
+        return
+    token = _profiling.set(True)
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiling.reset(token)
+        profiles.add(
+            registry.get_pair_id(source_descriptor, target_descriptor),
+            profile)
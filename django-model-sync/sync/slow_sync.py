@@ -0,0 +1,111 @@
+"""
+Detection of slow auto syncs.
+
+With the `MODEL_SYNC_SLOW_THRESHOLD_MS` setting, auto syncs - the sync of
+a saved instance and the deletion of the target of a deleted one - taking
+longer than the threshold are logged as slow, with their descriptor pair
+and operation, and with the SQL statements they ran and their durations:
+since whether a sync is slow is only known once it is done, every sync
+captures its statements with :function: `execute_wrapper()` by default.
+Where that costs too much, `MODEL_SYNC_SLOW_SAMPLE_RATE` - between 0 and 1,
+1 by default - limits the capture to a share of the syncs, and slow syncs
+that are not sampled are logged without statements. Without a threshold
+nothing is measured, and syncs that are not sampled only read the clock
+twice
+"""
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+import structlog as logging
+from django.conf import settings
+from django.db import connections, router
+
+from apps.b3_migration.model_descriptors.registry import registry
+from apps.b3_migration.model_descriptors.utils import get_model_class
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_SAMPLE_RATE = 1.0
+# Statements logged for a slow sync, the slowest first
+MAX_LOGGED_STATEMENTS = 20
+
+
+class QueryCapture:
+    """
+    Execute wrapper recording the SQL statements and their durations in
+    milliseconds
+    """
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, (time.perf_counter() - started) * 1000))
+
+    def describe(self):
+        slowest = sorted(
+            self.queries, key=lambda query: query[1], reverse=True)
+        return ''.join(
+            f'\n    {duration:.1f}ms {sql}'
+            for sql, duration in slowest[:MAX_LOGGED_STATEMENTS])
+
+
+def _get_aliases(source_instance, target_descriptor):
+    return {
+        router.db_for_write(source_instance.__class__),
+        router.db_for_write(get_model_class(target_descriptor)),
+    }
+
+
+@contextmanager
+def detect_slow_sync(operation, source_instance, source_descriptor,
+                     target_descriptor):
+    """
+    Log the block as slow if it takes longer than
+    `MODEL_SYNC_SLOW_THRESHOLD_MS`, see the module docstring
+    :param operation: 'create', 'update' or 'delete'
+    """
+    threshold = getattr(settings, 'MODEL_SYNC_SLOW_THRESHOLD_MS', None)
+    if threshold is None:
+        yield
+        return
+
+    capture = None
+    with ExitStack() as stack:
+        if random.random() < getattr(settings, 'MODEL_SYNC_SLOW_SAMPLE_RATE',
+                                     DEFAULT_SLOW_SAMPLE_RATE):
+            capture = QueryCapture()
+            for alias in _get_aliases(source_instance, target_descriptor):
+                stack.enter_context(
+                    connections[alias].execute_wrapper(capture))
+        started = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            # Failing syncs are often the slowest ones, e.g. after waiting
+            # for a lock
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= threshold:
+                _log_slow_sync(
+                    f'failed {operation}' if failed else operation,
+                    source_instance, source_descriptor, target_descriptor,
+                    duration, capture)
+
+
+def _log_slow_sync(operation, source_instance, source_descriptor,
+                   target_descriptor, duration, capture):
+    message = f'AUTO-SYNC: Slow {operation} of {source_instance} through ' \
+        f'{registry.get_pair_id(source_descriptor, target_descriptor)}: ' \
+        f'{duration:.0f}ms'
+    if capture is not None:
+        message += f', {len(capture.queries)} statements in ' \
+            f'{sum(query[1] for query in capture.queries):.0f}ms' \
+            f'{capture.describe()}'
+    logger.warning(message)
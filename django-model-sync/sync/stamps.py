@@ -0,0 +1,172 @@
+"""
+Version stamps dropping echo auto syncs.
+
+When both models of a pair are written to and synced in both directions,
+a save of a target that merely repeats the values it was synced with - by
+a service replicating the table, or code saving the instance it just read -
+is synced back to the source for nothing: an echo. Pairs whose two
+descriptors opt in with:
+
+    OLD_ADDRESS_DESCRIPTOR = {
+        ...
+        'sync_stamps': True,
+        'modified_field': 'last_modified',  # optional
+    }
+    ADDRESS_DESCRIPTOR = {
+        ...
+        'sync_stamps': True,
+    }
+
+keep one :model: `SyncStamp` per mapped couple of instances, holding the
+model the last sync originated from, a digest of the instance it wrote and
+the modification date of the instance it read. Auto syncs of an unchanged
+instance back to its origin are dropped, without reading or writing the
+other model.
+
+Saves of an instance read before the last synced save are synced all the
+same: they have been written to the source, which the target has to
+follow. Dropping them would leave the two models apart for good
+"""
+import hashlib
+import typing as t
+
+import structlog as logging
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+
+from apps.b3_migration.models.sync_stamp import SyncStamp
+from apps.b3_migration.sync.mappings import get_mapping_store
+
+logger = logging.getLogger(__name__)
+
+
+def uses_stamps(source_descriptor, target_descriptor) -> bool:
+    return bool(source_descriptor.get('sync_stamps')) and \
+        bool(target_descriptor.get('sync_stamps'))
+
+
+def get_digest(instance, descriptor) -> str:
+    """
+    Digest of the values of the concrete fields of an instance, except its
+    pk and its modification dates, which differ between the two models of a
+    pair and change on every save
+    """
+    modified_field = descriptor.get('modified_field')
+    values = []
+    for field in sorted(instance._meta.concrete_fields,
+                        key=lambda field: field.attname):
+        if field.primary_key or field.name == modified_field or \
+                getattr(field, 'auto_now', False):
+            continue
+        values.append(f'{field.attname}={getattr(instance, field.attname)!r}')
+    return hashlib.sha256('\n'.join(values).encode()).hexdigest()
+
+
+def get_modified(instance, descriptor):
+    """
+    Get the value of the `modified_field` of an instance, None if its
+    descriptor has none
+    """
+    modified_field = descriptor.get('modified_field')
+    return getattr(instance, modified_field) if modified_field else None
+
+
+def _get_stamp_filter(source_instance, source_descriptor, target_descriptor,
+                      target_pk=None) -> t.Optional[t.Dict]:
+    mapping_store = get_mapping_store(source_descriptor, target_descriptor)
+    if target_pk is None:
+        target_pk = mapping_store.get_target_pk(source_instance.pk)
+        if target_pk is None:
+            return None
+    scope, key = mapping_store.get_stamp_key(source_instance.pk, target_pk)
+    return {'scope': scope, 'key': key}
+
+
+def should_sync(source_instance, source_descriptor,
+                target_descriptor) -> bool:
+    """
+    Check whether the auto sync of an updated source instance is needed
+    :return: False if the source instance is an echo of the last sync
+    """
+    stamp_filter = _get_stamp_filter(
+        source_instance, source_descriptor, target_descriptor)
+    if stamp_filter is None:
+        return True
+    stamp = SyncStamp.objects.filter(**stamp_filter).first()
+    if stamp is None:
+        return True
+
+    origin = source_instance._meta.label_lower
+    if stamp.origin != origin and \
+            stamp.digest == get_digest(source_instance, source_descriptor):
+        logger.debug(f'AUTO-SYNC: Dropping echo of {stamp.origin} from '
+                     f'{source_instance}')
+        return False
+    return True
+
+
+def record(source_instance, source_descriptor, target_descriptor,
+           target_instance):
+    """
+    Stamp a completed auto sync with its origin and the digest of the
+    written target instance, incrementing the version. The stamp is created
+    or updated with a single upsert on PostgreSQL and SQLite
+    """
+    stamp_filter = _get_stamp_filter(
+        source_instance, source_descriptor, target_descriptor,
+        target_pk=target_instance.pk)
+    values = {
+        **stamp_filter,
+        'origin': source_instance._meta.label_lower,
+        'digest': get_digest(target_instance, target_descriptor),
+        'source_modified': get_modified(source_instance, source_descriptor),
+        'last_modified': timezone.now(),
+    }
+    connection = connections[router.db_for_write(SyncStamp)]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        _record_without_upsert(stamp_filter, values)
+        return
+
+    meta = SyncStamp._meta
+    quote_name = connection.ops.quote_name
+    table = quote_name(meta.db_table)
+    columns = {
+        name: quote_name(meta.get_field(name).column) for name in values
+    }
+    version = quote_name(meta.get_field('version').column)
+    params = [
+        meta.get_field(name).get_db_prep_save(value, connection)
+        for name, value in values.items()
+    ]
+    # A source without modification date keeps the one of the last source
+    # that had one
+    updates = [
+        f'{columns["origin"]} = EXCLUDED.{columns["origin"]}',
+        f'{version} = {table}.{version} + 1',
+        f'{columns["digest"]} = EXCLUDED.{columns["digest"]}',
+        f'{columns["source_modified"]} = COALESCE('
+        f'EXCLUDED.{columns["source_modified"]}, '
+        f'{table}.{columns["source_modified"]})',
+        f'{columns["last_modified"]} = EXCLUDED.{columns["last_modified"]}',
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns.values())}, {version}) '
+            f'VALUES ({", ".join(["%s"] * len(params))}, 1) '
+            f'ON CONFLICT ({columns["scope"]}, {columns["key"]}) '
+            f'DO UPDATE SET {", ".join(updates)}',
+            params,
+        )
+
+
+def _record_without_upsert(stamp_filter, values):
+    update = {
+        'origin': values['origin'],
+        'version': F('version') + 1,
+        'digest': values['digest'],
+    }
+    if values['source_modified'] is not None:
+        update['source_modified'] = values['source_modified']
+    SyncStamp.objects.get_or_create(**stamp_filter)
+    SyncStamp.objects.filter(**stamp_filter).update(**update)
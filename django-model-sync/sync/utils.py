@@ -3,11 +3,15 @@ import structlog as logging
 from contextlib import contextmanager
 from django.db import models
 
+from apps.b3_migration.model_descriptors.registry import registry
 from apps.b3_migration.model_descriptors.utils import (
     get_model_class,
 )
-from apps.b3_migration.sync.auto_synchronization_base \
-    import AutoSynchronizationBase
+from apps.b3_migration.sync.auto_synchronization_base import (
+    AutoSynchronizationBase,
+    suppress_auto_sync,
+)
+from apps.b3_migration.sync.mappings import get_mapping_store
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +20,9 @@ def sync_source_and_target_models(
     source_instance,
     source_model_descriptor,
     target_model_descriptor,
-    buddy_model_class,
     logging_prefix,
     update=False,
+    target_model_dict=None,
 ):
     """
     Create/update an instance of the target model based on the source model
@@ -38,7 +42,6 @@ def sync_source_and_target_models(
         from :model instance: `source_instance`
     2. Using the target model's :list of dicts: `fields_funcs` run the
     functions on the source instance and use the return value to populate
-    :param buddy_model_class:
     :dict: `target_model_dict`
 
     When calling :function: `save()` on the target instance the
@@ -54,11 +57,101 @@ def sync_source_and_target_models(
         indicate the context of the function caller e.g. INIT-SYNC for
         the initial sync
     :param update: boolean identifying whether it is an update or a create
+    :param target_model_dict: target values built beforehand with
+        :function: `build_target_model_dict()`, built from `source_instance`
+        if not given
     :return instance of the new model
     """
     logger.debug(f'{logging_prefix}: Starting syncing instance: '
                  f'{source_instance}. Instance class:'
                  f' {source_instance.__class__.__name__}. Is update: {update}')
+    if target_model_dict is None:
+        target_model_dict = build_target_model_dict(
+            source_instance, target_model_descriptor, logging_prefix)
+
+    mapping_store = get_mapping_store(
+        source_model_descriptor, target_model_descriptor)
+    target_model_class = get_model_class(target_model_descriptor)
+
+    target_instance = None
+    if update:
+        target_pk = mapping_store.get_target_pk(source_instance.pk)
+        if target_pk is not None:
+            target_instance = target_model_class._base_manager.filter(
+                pk=target_pk).first()
+            if target_instance is None:
+                # The target was deleted behind its mapping - e.g. by another
+                # process after the mapping got cached. The stale mapping
+                # would be claimed instead of the one of the new target
+                mapping_store.delete(source_instance.pk, target_pk)
+
+    if target_instance is not None:
+        logger.debug(f'{logging_prefix}: Starting update on'
+                     f'target instance because a buddy instance exists')
+
+        update_instance(target_instance, target_model_dict)
+        target_instance.refresh_from_db()
+
+        logger.debug(f'{logging_prefix}: Completed update on target instance')
+    else:
+        logger.debug(f'{logging_prefix}: Starting creation of target instance')
+
+        target_instance = target_model_class(**target_model_dict)
+
+        if isinstance(target_instance, AutoSynchronizationBase):
+            # Prevents ending up in synchronization loop
+            target_instance.save(target=True)
+        else:
+            # target_instance does not sync anymore. Normal save is enough.
+            target_instance.save()
+
+        logger.debug(f'{logging_prefix}: Completed creation of target '
+                     f'instance')
+
+        logger.debug(f'{logging_prefix}: Starting creation of buddy instance')
+
+        mapped_target_pk = mapping_store.claim(
+            source_instance.pk, target_instance.pk)
+
+        logger.debug(f'{logging_prefix}: Completed creation of buddy instance')
+
+        if mapped_target_pk != target_instance.pk:
+            # Another process synced the same source instance concurrently
+            # and created its buddy first. Its target is kept and updated
+            logger.info(f'{logging_prefix}: {source_instance} was synced '
+                        f'concurrently, dropping duplicate target instance')
+            if isinstance(target_instance, AutoSynchronizationBase):
+                target_instance.delete(target=True)
+            else:
+                target_instance.delete()
+            target_instance = target_model_class._base_manager.get(
+                pk=mapped_target_pk)
+            update_instance(target_instance, target_model_dict)
+
+    logger.debug(f'{logging_prefix}: Completed sync. '
+                 f'Target instance: {target_instance}')
+    return target_instance
+
+
+def build_target_model_dict(
+    source_instance,
+    target_model_descriptor,
+    logging_prefix,
+    translations=None,
+):
+    """
+    Build the dictionary of target model field values for a source instance,
+    using the target model's :dict: `fields_mapping`,
+    :list of tuples: `fields_funcs` and :list of tuples: `fields_translated`
+
+    :param source_instance: instance of the source model
+    :param target_model_descriptor: target model descriptor dictionary
+    :param logging_prefix: string prefix used in log messages
+    :param translations: foreign keys translated in bulk by
+        :function: `translate_foreign_keys()`. If not given, every foreign
+        key in `fields_translated` is looked up on its own
+    :return: dictionary of target field names to values
+    """
     target_model_dict = {}
     fields_mapping = target_model_descriptor.get('fields_mapping', {})
     fields_optional = target_model_descriptor.get('fields_optional', [])
@@ -84,59 +177,81 @@ def sync_source_and_target_models(
         target_model_dict[key] = func(source_instance)
     logger.debug(f'{logging_prefix}: Completed using fields functions')
 
+    fields_translated = target_model_descriptor.get('fields_translated', [])
+    if fields_translated:
+        logger.debug(f'{logging_prefix}: Starting translating foreign keys')
+        if translations is None:
+            translations = translate_foreign_keys(
+                [source_instance], target_model_descriptor)
+        for source_field_name, target_field_name, descriptor_id \
+                in fields_translated:
+            source_pk = getattr(source_instance, source_field_name)
+            if source_pk is None:
+                target_model_dict[target_field_name] = None
+                continue
+            try:
+                target_model_dict[target_field_name] = \
+                    translations[descriptor_id][source_pk]
+            except KeyError:
+                raise ValueError(
+                    f'{source_field_name}={source_pk} of {source_instance} '
+                    f'is not synced through {descriptor_id} yet')
+        logger.debug(f'{logging_prefix}: Completed translating foreign keys')
+
     logger.debug(f'{logging_prefix}: Completed building target dictionary, '
                  f'target dictionary: {target_model_dict}')
+    return target_model_dict
 
-    source_related_name_in_buddy = source_model_descriptor[
-        'related_name_in_buddy']
-
-    if update and hasattr(source_instance, source_related_name_in_buddy):
-        logger.debug(f'{logging_prefix}: Starting update on'
-                     f'target instance because a buddy instance exists')
-
-        buddy_instance = getattr(
-            source_instance, source_related_name_in_buddy)
-
-        target_field_name_in_buddy = target_model_descriptor[
-            'field_name_in_buddy']
-        target_instance = getattr(buddy_instance, target_field_name_in_buddy)
 
-        update_instance(target_instance, target_model_dict)
-        target_instance.refresh_from_db()
-
-        logger.debug(f'{logging_prefix}: Completed update on target instance')
-    else:
-        logger.debug(f'{logging_prefix}: Starting creation of target instance')
-
-        target_model_class = get_model_class(target_model_descriptor)
-        target_instance = target_model_class(**target_model_dict)
-
-        if isinstance(target_instance, AutoSynchronizationBase):
-            # Prevents ending up in synchronization loop
-            target_instance.save(target=True)
-        else:
-            # target_instance does not sync anymore. Normal save is enough.
-            target_instance.save()
+def translate_foreign_keys(source_instances, target_model_descriptor):
+    """
+    Translate the foreign keys declared in the target descriptor's
+    :list of tuples: `fields_translated` through the mappings of the related
+    descriptor pairs, with one query per related descriptor pair.
 
-        logger.debug(f'{logging_prefix}: Completed creation of target '
-                     f'instance')
+    Every entry of `fields_translated` is a tuple of the source field - the
+    foreign key's attribute, e.g. `shipping_address_id` -, the target field
+    and the id of the registered descriptor pair of the related models, e.g.
 
-        logger.debug(f'{logging_prefix}: Starting creation of buddy instance')
+        'fields_translated': [
+            ('shipping_address_id', 'address_id',
+             'address.oldaddress->b3_address.address'),
+        ]
 
-        target_field_name_in_buddy = target_model_descriptor[
-            'field_name_in_buddy']
-        source_field_name_in_buddy = source_model_descriptor[
-            'field_name_in_buddy']
+    :param source_instances: list of source instances
+    :param target_model_descriptor: target model descriptor dictionary
+    :return: dict of descriptor pair id to a dict of related source pk to
+        related target pk
+    """
+    source_pks_by_descriptor = {}
+    for source_field_name, _, descriptor_id in target_model_descriptor.get(
+            'fields_translated', []):
+        source_pks = source_pks_by_descriptor.setdefault(descriptor_id, set())
+        for source_instance in source_instances:
+            source_pk = getattr(source_instance, source_field_name)
+            if source_pk is not None:
+                source_pks.add(source_pk)
 
-        buddy_model_class.objects.create(**{
-            f'{source_field_name_in_buddy}_id': source_instance.pk,
-            f'{target_field_name_in_buddy}_id': target_instance.pk})
+    return translate_pks(source_pks_by_descriptor)
 
-        logger.debug(f'{logging_prefix}: Completed creation of buddy instance')
 
-    logger.debug(f'{logging_prefix}: Completed sync. '
-                 f'Target instance: {target_instance}')
-    return target_instance
+def translate_pks(source_pks_by_descriptor):
+    """
+    Translate related source pks through the mappings of their descriptor
+    pairs, with one query per descriptor pair
+    :param source_pks_by_descriptor: dict of descriptor pair id to a set of
+        related source pks
+    :return: dict of descriptor pair id to a dict of related source pk to
+        related target pk
+    """
+    translations = {}
+    for descriptor_id, source_pks in source_pks_by_descriptor.items():
+        pair = registry.get_pair(descriptor_id)
+        mapping_store = get_mapping_store(
+            pair.source.descriptor, pair.target.descriptor)
+        translations[descriptor_id] = \
+            mapping_store.get_target_pks(source_pks) if source_pks else {}
+    return translations
 
 
 def update_instance(instance, update_dict):
@@ -147,7 +262,10 @@ def update_instance(instance, update_dict):
     """
     for field_name, field_val in update_dict.items():
         setattr(instance, field_name, field_val)
-    instance.save(target=True)
+    if isinstance(instance, AutoSynchronizationBase):
+        instance.save(target=True)
+    else:
+        instance.save()
 
 
 @contextmanager
@@ -171,27 +289,10 @@ def disable_auto_sync(*model_classes: t.Type[models.Model]):
             )
 
     In this case, PartnerPaymentMethod for 'invoice' and 'po_upload' will not
-    be auto-created
+    be auto-created.
+
+    Auto sync is only disabled in the current thread or asyncio task, see
+    :function: `suppress_auto_sync()`
     """
-    original_pre_saves_deletes = []
-
-    for model_class in model_classes:
-        original_pre_saves_deletes.append(
-            (model_class,
-             getattr(model_class, '_pre_save', None),
-             getattr(model_class, '_post_save', None),
-             getattr(model_class, '_pre_delete', None),
-             getattr(model_class, '_post_delete', None))
-        )
-
-        model_class._pre_save = model_class._pre_delete = \
-            model_class._post_save = model_class._post_delete = \
-            lambda *args, **kwargs: None
-    yield model_classes
-
-    for model_class, pre_save, post_save, pre_delete, post_delete \
-            in original_pre_saves_deletes:
-        model_class._pre_save = pre_save
-        model_class._post_save = post_save
-        model_class._pre_delete = pre_delete
-        model_class._post_delete = post_delete
+    with suppress_auto_sync(*model_classes):
+        yield model_classes
@@ -0,0 +1,27 @@
+"""
+Descriptors of the test pairs, syncing :model: `Switch` to
+:model: `RetiredSwitch` through the generic mapping table. Tests needing
+more options extend them, e.g.
+
+    SWITCH_DESCRIPTOR = {**descriptors.SWITCH_DESCRIPTOR, 'sync_stamps': True}
+"""
+SWITCH_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'Switch',
+    'mapping_name': 'retired_switch',
+    'mapping_side': 'source',
+}
+
+RETIRED_SWITCH_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'RetiredSwitch',
+    'mapping_name': 'retired_switch',
+    'mapping_side': 'target',
+    'fields_mapping': {
+        'organization_id': 'organization_id',
+        'feature': 'feature',
+        'active': 'active',
+        'creation_date': 'creation_date',
+        'last_modified': 'last_modified',
+    },
+}
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.contrib import admin
+from django.test import RequestFactory
+
+from apps.b3_migration.admin import SwitchAdmin
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import Switch
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+class SwitchAdminTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.switch_admin = SwitchAdmin(Switch, admin.site)
+        self.request = RequestFactory().get('/')
+        self.organization = Organization.objects.first()
+
+        Switch.objects.all().delete()
+        self.existing_switch = SwitchFactory(
+            feature=Switch.NEW_BASKET,
+            organization=self.organization,
+        )
+
+    @mock.patch.object(SwitchAdmin, 'message_user')
+    def test_create_all_switches(self, message_user):
+        """
+        Asserts that every missing (organization, feature) switch is created
+        inactive, and that existing switches are left untouched
+        """
+        self.switch_admin.create_all_switches(self.request)
+
+        expected_count = \
+            Organization.objects.count() * len(Switch.FEATURE_CHOICES)
+        self.assertEqual(Switch.objects.count(), expected_count)
+        self.assertEqual(
+            Switch.objects.exclude(pk=self.existing_switch.pk).filter(
+                active=True).count(),
+            0
+        )
+        self.existing_switch.refresh_from_db()
+        self.assertTrue(self.existing_switch.active)
+        message_user.assert_called_once_with(
+            self.request, f'Created {expected_count - 1} switches')
+
+    @mock.patch.object(SwitchAdmin, 'message_user')
+    def test_create_all_switches_is_idempotent(self, message_user):
+        """
+        Asserts that a second run creates nothing
+        """
+        self.switch_admin.create_all_switches(self.request)
+        count = Switch.objects.count()
+
+        self.switch_admin.create_all_switches(self.request)
+
+        self.assertEqual(Switch.objects.count(), count)
+        message_user.assert_called_with(self.request, 'Created 0 switches')
+
+    def test_bulk_create_switches_skips_conflicts(self):
+        """
+        Asserts that switches created concurrently, after the anti-join ran,
+        are skipped as conflicts and left untouched
+        """
+        switches = [
+            Switch(organization=self.organization, feature=feature)
+            for feature, _ in Switch.FEATURE_CHOICES
+        ]
+
+        with self.assertNumQueries(1):
+            self.switch_admin._bulk_create_switches(switches)
+
+        self.assertEqual(
+            Switch.objects.filter(organization=self.organization).count(),
+            len(switches))
+        self.existing_switch.refresh_from_db()
+        self.assertTrue(self.existing_switch.active)
+
+
+class SwitchChangelistTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.switch_admin = SwitchAdmin(Switch, admin.site)
+        self.request = RequestFactory().get('/')
+        self.request.user = mock.MagicMock(is_superuser=True)
+
+        Switch.objects.all().delete()
+
+    def _render_rows(self):
+        changelist = self.switch_admin.get_changelist_instance(self.request)
+        return [
+            (str(switch), str(self.switch_admin.site(switch)))
+            for switch in changelist.result_list
+        ]
+
+    def test_constant_queries(self):
+        """
+        Asserts that the number of queries of a changelist page does not
+        grow with the number of switches of different organizations
+        """
+        SwitchFactory(organization=Organization.objects.first())
+        with self.assertNumQueries(2):
+            self._render_rows()
+
+        for organization in Organization.objects.all():
+            for feature, _ in Switch.FEATURE_CHOICES:
+                Switch.objects.get_or_create(
+                    organization=organization, feature=feature)
+        with self.assertNumQueries(2):
+            rows = self._render_rows()
+
+        self.assertEqual(len(rows), Switch.objects.count())
+
+    def test_substring_search(self):
+        """
+        Asserts that switches are found by a substring of the name of their
+        organization
+        """
+        organization = Organization.objects.first()
+        switch = SwitchFactory(organization=organization)
+        self.request = RequestFactory().get(
+            '/', {'q': organization.showname[1:]})
+        self.request.user = mock.MagicMock(is_superuser=True)
+
+        changelist = self.switch_admin.get_changelist_instance(self.request)
+
+        self.assertIn(switch, changelist.result_list)
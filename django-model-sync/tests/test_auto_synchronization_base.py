@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from apps.b3_migration.sync.auto_synchronization_base import (
+    AutoSynchronizationBase,
+    suppress_auto_sync,
+)
+
+
+class FakeModel:
+    def __init__(self):
+        self.pk = None
+        self.calls = []
+
+    def save(self, *args, **kwargs):
+        self.calls.append(('save', threading.get_ident()))
+        self.pk = 1
+
+    def delete(self, *args, **kwargs):
+        self.calls.append(('delete', threading.get_ident()))
+
+
+class FakeSyncedModel(AutoSynchronizationBase, FakeModel):
+    def _pre_save(self, *args, update, target, **kwargs):
+        self.calls.append(('pre_save', threading.get_ident()))
+        return True
+
+    def _post_save(self, *args, update, target, **kwargs):
+        self.calls.append(('post_save', threading.get_ident()))
+
+    def _pre_delete(self, *args, target, **kwargs):
+        self.calls.append(('pre_delete', threading.get_ident()))
+        return True
+
+    def _post_delete(self, *args, target, **kwargs):
+        self.calls.append(('post_delete', threading.get_ident()))
+
+
+class AsyncAutoSynchronizationTests(SimpleTestCase):
+    def test_asave_runs_chain_in_one_thread(self):
+        """
+        Asserts that the hooks and the save run in the same thread, off the
+        event loop's thread
+        """
+        instance = FakeSyncedModel()
+
+        asyncio.run(instance.asave())
+
+        self.assertEqual(
+            [name for name, _ in instance.calls],
+            ['pre_save', 'save', 'post_save'])
+        threads = {thread for _, thread in instance.calls}
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_adelete(self):
+        """Asserts that the delete hooks run with adelete()"""
+        instance = FakeSyncedModel()
+
+        asyncio.run(instance.adelete())
+
+        self.assertEqual(
+            [name for name, _ in instance.calls],
+            ['pre_delete', 'delete', 'post_delete'])
+
+    def test_asave_respects_suppression(self):
+        """Asserts that suppression carries over to the sync thread"""
+        instance = FakeSyncedModel()
+
+        async def save():
+            with suppress_auto_sync(FakeSyncedModel):
+                await instance.asave()
+
+        asyncio.run(save())
+
+        self.assertEqual([name for name, _ in instance.calls], ['save'])
+
+    def test_adelete_respects_suppression(self):
+        """Asserts that suppression carries over to adelete() as well"""
+        instance = FakeSyncedModel()
+
+        async def delete():
+            with suppress_auto_sync(FakeSyncedModel):
+                await instance.adelete()
+
+        asyncio.run(delete())
+
+        self.assertEqual([name for name, _ in instance.calls], ['delete'])
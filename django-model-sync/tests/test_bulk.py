@@ -0,0 +1,162 @@
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.sync.initial_sync import bulk
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+def fake_sync_chunk(bad_pks):
+    def sync_chunk(rows, *args, **kwargs):
+        sync_chunk.calls.append([row[0] for row in rows])
+        if any(row[0] in bad_pks for row in rows):
+            raise ValueError('corrupt row')
+        return len(rows)
+    sync_chunk.calls = []
+    return sync_chunk
+
+
+@mock.patch.object(bulk, 'transaction')
+class SyncChunkIsolatedTests(SimpleTestCase):
+    def setUp(self):
+        self.rows = [(pk, f'feature {pk}') for pk in range(1, 9)]
+
+    def _prepare(self, transaction):
+        transaction.atomic.return_value.__exit__.return_value = False
+
+    def test_bad_rows_are_isolated(self, transaction):
+        """
+        Asserts that the good rows of a failing chunk are synced in bulk,
+        and that only the bad rows fail
+        """
+        self._prepare(transaction)
+        sync_chunk = fake_sync_chunk({3, 8})
+
+        with mock.patch.object(bulk, 'sync_chunk', sync_chunk):
+            created, errors = bulk.sync_chunk_isolated(
+                self.rows, {}, {}, 'INIT-SYNC')
+
+        self.assertEqual((created, list(errors)), (6, [3, 8]))
+        self.assertIsInstance(errors[3], ValueError)
+        self.assertIn([1, 2], sync_chunk.calls)
+        self.assertIn([5, 6], sync_chunk.calls)
+
+    def test_good_chunk_is_synced_once(self, transaction):
+        """Asserts that a chunk without bad rows is not bisected"""
+        self._prepare(transaction)
+        sync_chunk = fake_sync_chunk(set())
+
+        with mock.patch.object(bulk, 'sync_chunk', sync_chunk):
+            self.assertEqual(
+                bulk.sync_chunk_isolated(self.rows, {}, {}, 'INIT-SYNC'),
+                (8, {}))
+
+        self.assertEqual(len(sync_chunk.calls), 1)
+
+    def test_connection_errors_are_raised(self, transaction):
+        """Asserts that a chunk is not bisected if the database is down"""
+        self._prepare(transaction)
+
+        with mock.patch.object(
+                bulk, 'sync_chunk',
+                mock.Mock(side_effect=OperationalError('server closed'))):
+            with self.assertRaises(OperationalError):
+                bulk.sync_chunk_isolated(self.rows, {}, {}, 'INIT-SYNC')
+
+
+class BulkSyncTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        Switch.objects.all().delete()
+        self.switches = [
+            SwitchFactory(organization=organization)
+            for organization in Organization.objects.all()
+        ]
+
+    def test_bulk_sync(self):
+        """
+        Asserts that a target is created and mapped for every source
+        instance, and that a second run has nothing left to sync
+        """
+        stats = bulk.bulk_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, chunk_size=2)
+
+        self.assertEqual(
+            (stats.processed, stats.created, stats.failed),
+            (len(self.switches), len(self.switches), 0))
+        target_pks = get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR
+        ).get_target_pks([switch.pk for switch in self.switches])
+        for switch in self.switches:
+            retired_switch = RetiredSwitch.objects.get(
+                pk=target_pks[switch.pk])
+            self.assertEqual(
+                (retired_switch.organization_id, retired_switch.feature),
+                (switch.organization_id, switch.feature))
+
+        stats = bulk.bulk_sync(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+        self.assertEqual((stats.processed, stats.created), (0, 0))
+        self.assertEqual(RetiredSwitch.objects.count(), len(self.switches))
+
+    def test_bad_row_is_rolled_back(self):
+        """
+        Asserts that the target already created for a source instance
+        failing later in the chunk is rolled back, and that the other
+        source instances of the chunk are synced
+        """
+        bad_switch = self.switches[1]
+        mapping_store = get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+        # Mapping the target created for it fails on the unique source pk
+        mapping_store.create(bad_switch.pk, 0)
+
+        created, errors = bulk.sync_chunk_isolated(
+            self.switches, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+            'INIT-SYNC')
+
+        self.assertEqual(
+            (created, list(errors)), (len(self.switches) - 1, [bad_switch.pk]))
+        self.assertEqual(RetiredSwitch.objects.count(), len(self.switches) - 1)
+        self.assertFalse(RetiredSwitch.objects.filter(
+            organization_id=bad_switch.organization_id).exists())
+        self.assertEqual(mapping_store.get_target_pk(bad_switch.pk), 0)
+
+    def test_checkpoint(self):
+        """
+        Asserts that a run resumes after the last pk of its checkpoint, and
+        that a reset checkpoint starts from the first pk again
+        """
+        first_switch = self.switches[0]
+        SyncCheckpoint.objects.create(
+            descriptor_id='switches', last_pk=first_switch.pk)
+
+        stats = bulk.bulk_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+            checkpoint_id='switches')
+
+        self.assertEqual(stats.created, len(self.switches) - 1)
+        self.assertFalse(RetiredSwitch.objects.filter(
+            organization_id=first_switch.organization_id).exists())
+        checkpoint = SyncCheckpoint.objects.get(descriptor_id='switches')
+        self.assertEqual(checkpoint.last_pk, self.switches[-1].pk)
+        self.assertEqual(checkpoint.created, len(self.switches) - 1)
+
+        checkpoint.reset()
+        stats = bulk.bulk_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+            checkpoint_id='switches')
+
+        self.assertEqual(stats.created, 1)
+        self.assertEqual(RetiredSwitch.objects.count(), len(self.switches))
@@ -0,0 +1,109 @@
+from django.utils import timezone
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.models.sync_checkpoint import SyncCheckpoint
+from apps.b3_migration.sync.initial_sync.catch_up import catch_up_sync
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.tests import descriptors
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+SWITCH_DESCRIPTOR = {
+    **descriptors.SWITCH_DESCRIPTOR,
+    'modified_field': 'last_modified',
+}
+RETIRED_SWITCH_DESCRIPTOR = descriptors.RETIRED_SWITCH_DESCRIPTOR
+
+
+class CatchUpSyncTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.organization = Organization.objects.first()
+        self.switch = SwitchFactory(
+            feature='new_checkout',
+            organization=self.organization,
+            active=True,
+        )
+        self.mapping_store = get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+    def _get_target(self):
+        return RetiredSwitch.objects.get(
+            pk=self.mapping_store.get_target_pk(self.switch.pk))
+
+    def test_catch_up(self):
+        """
+        Asserts that the first run creates the missing targets, and that
+        later runs update the targets of rows modified since then
+        """
+        stats = catch_up_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, 'switches')
+        self.assertEqual(stats.created, Switch.objects.count())
+        target = self._get_target()
+        self.assertTrue(target.active)
+        watermark = SyncCheckpoint.objects.get(
+            descriptor_id='switches').watermark
+        self.assertIsNotNone(watermark)
+
+        Switch.objects.filter(pk=self.switch.pk).update(
+            active=False, last_modified=timezone.now())
+        stats = catch_up_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, 'switches')
+
+        self.assertEqual(stats.created, 0)
+        self.assertGreaterEqual(stats.updated, 1)
+        self.assertEqual(self._get_target().pk, target.pk)
+        self.assertFalse(self._get_target().active)
+        self.assertGreater(
+            SyncCheckpoint.objects.get(descriptor_id='switches').watermark,
+            watermark)
+
+    def test_rows_before_watermark_are_skipped(self):
+        """
+        Asserts that rows modified before the watermark, minus the overlap,
+        are not synced
+        """
+        SyncCheckpoint.objects.create(
+            descriptor_id='switches', watermark=timezone.now())
+
+        stats = catch_up_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, 'switches',
+            overlap=0)
+
+        self.assertEqual(stats.processed, 0)
+        self.assertIsNone(self.mapping_store.get_target_pk(self.switch.pk))
+
+    def test_failing_row_is_isolated(self):
+        """
+        Asserts that a source instance failing to update its target does not
+        fail the others, and that the watermark is advanced past it
+        """
+        other_switch = SwitchFactory(
+            feature='new_checkout', active=True,
+            organization=Organization.objects.exclude(
+                pk=self.organization.pk).first())
+        catch_up_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, 'switches')
+        Switch.objects.update(active=False, last_modified=timezone.now())
+
+        def fail_for_switch(switch):
+            if switch.pk == self.switch.pk:
+                raise ValueError('corrupt')
+            return switch.note
+        target_descriptor = dict(
+            RETIRED_SWITCH_DESCRIPTOR,
+            fields_funcs=[('note', fail_for_switch, False)])
+        stats = catch_up_sync(
+            SWITCH_DESCRIPTOR, target_descriptor, 'switches')
+        watermark = SyncCheckpoint.objects.get(
+            descriptor_id='switches').watermark
+
+        self.assertEqual(list(stats.update_errors), [self.switch.pk])
+        self.assertEqual(stats.failed, 1)
+        self.assertTrue(self._get_target().active)
+        self.assertFalse(RetiredSwitch.objects.get(
+            pk=self.mapping_store.get_target_pk(other_switch.pk)).active)
+        self.assertGreater(
+            watermark, Switch.objects.get(pk=self.switch.pk).last_modified)
@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.db import OperationalError
+
+from apps.b3_migration.sync import coalescing
+from apps.b3_migration.sync.locking import DEADLOCK_MYSQL_ERRNO
+from apps.b3_tests.testcases import B3TestCase
+
+SOURCE_DESCRIPTOR = {'model_name': 'Order'}
+TARGET_DESCRIPTOR = {'model_name': 'NewOrder'}
+
+
+class FakeInstance:
+    def __init__(self, pk, status):
+        self.pk = pk
+        self.status = status
+        self.errors = []
+
+    def _on_sync_error(self, exc, operation):
+        self.errors.append((operation, exc))
+
+
+@mock.patch.object(coalescing, 'sync_source_and_target_models')
+class CoalesceAutoSyncTests(B3TestCase):
+    def _save(self, instance, source_descriptor=SOURCE_DESCRIPTOR,
+              target_descriptor=TARGET_DESCRIPTOR):
+        coalescing.get_coalescer().defer(
+            instance, source_descriptor, target_descriptor)
+
+    def test_one_write_per_instance(self, sync):
+        """
+        Asserts that every target is written once, with the values of the
+        last save
+        """
+        written = []
+        sync.side_effect = lambda instance, *args, **kwargs: \
+            written.append((instance.pk, instance.status))
+        order = FakeInstance(1, 'new')
+        other_order = FakeInstance(2, 'new')
+
+        with coalescing.coalesce_auto_sync():
+            self._save(order)
+            order.status = 'paid'
+            self._save(order)
+            self._save(other_order)
+            sync.assert_not_called()
+
+        self.assertEqual(written, [(1, 'paid'), (2, 'new')])
+        self.assertTrue(all(
+            call.kwargs['update'] for call in sync.call_args_list))
+
+    def test_nested_blocks_flush_once(self, sync):
+        """Asserts that nested blocks are flushed with the outermost one"""
+        with coalescing.coalesce_auto_sync():
+            with coalescing.coalesce_auto_sync():
+                self._save(FakeInstance(1, 'new'))
+            sync.assert_not_called()
+
+        self.assertEqual(sync.call_count, 1)
+        self.assertIsNone(coalescing.get_coalescer())
+
+    def test_discard(self, sync):
+        """Asserts that updates of deleted instances are not written"""
+        order = FakeInstance(1, 'new')
+
+        with coalescing.coalesce_auto_sync() as coalescer:
+            self._save(order)
+            coalescer.discard(order, SOURCE_DESCRIPTOR, TARGET_DESCRIPTOR)
+
+        sync.assert_not_called()
+
+    def test_lock_ordering(self, sync):
+        """
+        Asserts that updates of pairs with lock ordering are written in the
+        locks of `run_locked()`
+        """
+        order = FakeInstance(1, 'new')
+        source_descriptor = dict(SOURCE_DESCRIPTOR, lock_ordering=True)
+        target_descriptor = dict(TARGET_DESCRIPTOR, lock_ordering=True)
+
+        with mock.patch.object(coalescing, 'run_locked') as run_locked:
+            with coalescing.coalesce_auto_sync():
+                self._save(order, source_descriptor, target_descriptor)
+            sync.assert_not_called()
+
+        func, *args = run_locked.call_args.args
+        self.assertEqual(args, [order, source_descriptor, target_descriptor])
+        func()
+        self.assertEqual(sync.call_count, 1)
+
+    def test_flush_error(self, sync):
+        """
+        Asserts that a failed update is recorded by the instance, and does
+        not keep the other updates from being written
+        """
+        sync.side_effect = [RuntimeError, None]
+        order = FakeInstance(1, 'new')
+        other_order = FakeInstance(2, 'new')
+
+        with coalescing.coalesce_auto_sync():
+            self._save(order)
+            self._save(other_order)
+
+        self.assertEqual(sync.call_count, 2)
+        self.assertEqual(
+            [(operation, type(exc)) for operation, exc in order.errors],
+            [('update', RuntimeError)])
+        self.assertEqual(other_order.errors, [])
+
+    def _raise_in_block(self, *instances, needs_rollback=False):
+        with mock.patch.object(coalescing, 'transaction') as transaction:
+            transaction.get_connection.return_value.needs_rollback = \
+                needs_rollback
+            with self.assertRaises(ValueError):
+                with coalescing.coalesce_auto_sync():
+                    for instance in instances or [FakeInstance(1, 'new')]:
+                        self._save(instance)
+                    raise ValueError
+        return transaction
+
+    def test_flushed_after_exception(self, sync):
+        """
+        Asserts that the pending updates are written in a savepoint when
+        the block raises, since the source updates may be committed anyway
+        """
+        transaction = self._raise_in_block()
+
+        self.assertEqual(sync.call_count, 1)
+        transaction.atomic.assert_called_once_with()
+        self.assertIsNone(coalescing.get_coalescer())
+
+    def test_dropped_after_exception_in_rolled_back_transaction(self, sync):
+        """
+        Asserts that the pending updates are dropped when the transaction
+        is rolled back anyway
+        """
+        self._raise_in_block(needs_rollback=True)
+
+        sync.assert_not_called()
+        self.assertIsNone(coalescing.get_coalescer())
+
+    def test_flush_error_after_exception(self, sync):
+        """
+        Asserts that when the savepoint of the pending updates fails after
+        an exception, all of them are recorded by their instances, and the
+        exception of the block is raised
+        """
+        sync.side_effect = OperationalError(DEADLOCK_MYSQL_ERRNO)
+        order = FakeInstance(1, 'new')
+        other_order = FakeInstance(2, 'new')
+
+        self._raise_in_block(order, other_order)
+
+        self.assertEqual(sync.call_count, 1)
+        for instance in (order, other_order):
+            self.assertEqual(
+                [(operation, type(exc)) for operation, exc
+                 in instance.errors],
+                [('update', OperationalError)])
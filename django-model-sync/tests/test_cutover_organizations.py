@@ -0,0 +1,126 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.management.commands import cutover_organizations
+from apps.b3_migration.model_descriptors.registry import DescriptorRegistry
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.sync.initial_sync.reconciliation import \
+    ReconciliationReport
+from apps.b3_migration.tests import descriptors
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+SWITCH_DESCRIPTOR = {
+    **descriptors.SWITCH_DESCRIPTOR,
+    'organization_lookup': 'organization',
+}
+
+
+@override_settings(MODEL_SYNC_CUTOVER_DESCRIPTORS={
+    Switch.NEW_BASKET: ['switches'],
+})
+class CutoverOrganizationsTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        registry = DescriptorRegistry()
+        registry.register(
+            SWITCH_DESCRIPTOR, descriptors.RETIRED_SWITCH_DESCRIPTOR,
+            'switches')
+        registry.compile()
+        patcher = mock.patch.object(
+            cutover_organizations, 'registry', registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        Switch.objects.all().delete()
+        self.organization, self.other_organization = \
+            Organization.objects.all()[:2]
+        self.switch = SwitchFactory(
+            feature=Switch.NEW_USER_PANEL, organization=self.organization)
+        SwitchFactory(
+            feature=Switch.NEW_USER_PANEL,
+            organization=self.other_organization)
+
+    def _cutover(self, *args):
+        stdout = StringIO()
+        call_command(
+            'cutover_organizations', Switch.NEW_BASKET, '--organization',
+            str(self.organization.pk), *args, stdout=stdout,
+            stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_cutover(self):
+        """
+        Asserts that the rows of the organization are synced and that its
+        switch is activated, and that other organizations are left alone
+        """
+        output = self._cutover()
+
+        self.assertIn('Cut over 1 organizations', output)
+        self.assertEqual(
+            list(RetiredSwitch.objects.values_list(
+                'organization_id', 'feature')),
+            [(self.organization.pk, Switch.NEW_USER_PANEL)]
+        )
+        self.assertTrue(
+            Switch.is_active(Switch.NEW_BASKET, self.organization))
+        self.assertFalse(
+            Switch.is_active(Switch.NEW_BASKET, self.other_organization))
+
+    def test_not_in_sync(self):
+        """
+        Asserts that the switch of an organization that is not in sync
+        after the sync is not activated
+        """
+        with mock.patch.object(
+                cutover_organizations, 'compare',
+                return_value=ReconciliationReport(
+                    mismatched_pks=[self.switch.pk])):
+            with self.assertRaisesMessage(
+                    CommandError, '1 organizations failed'):
+                self._cutover()
+
+        self.assertFalse(
+            Switch.is_active(Switch.NEW_BASKET, self.organization))
+
+    @override_settings(MODEL_SYNC_CUTOVER_DESCRIPTORS={
+        Switch.NEW_BASKET: ['unknown'],
+    })
+    def test_unknown_descriptor_pair(self):
+        """
+        Asserts that a pair id that is not registered fails with a command
+        error
+        """
+        with self.assertRaisesMessage(CommandError, 'unknown'):
+            self._cutover()
+
+    @override_settings(MODEL_SYNC_CUTOVER_DESCRIPTORS={
+        Switch.NEW_BASKET: ['retired_switches'],
+    })
+    def test_no_organization_lookup(self):
+        """
+        Asserts that a pair whose source descriptor has no
+        organization_lookup fails with a command error
+        """
+        cutover_organizations.registry.register(
+            descriptors.SWITCH_DESCRIPTOR,
+            descriptors.RETIRED_SWITCH_DESCRIPTOR, 'retired_switches')
+        cutover_organizations.registry.compile()
+
+        with self.assertRaisesMessage(
+                CommandError, 'retired_switches has no organization_lookup'):
+            self._cutover()
+
+    def test_not_configured(self):
+        """Asserts that a feature without descriptors cannot be cut over"""
+        with self.assertRaisesMessage(
+                CommandError, 'No descriptors configured'):
+            call_command(
+                'cutover_organizations', Switch.NEW_USER_PANEL,
+                stdout=StringIO())
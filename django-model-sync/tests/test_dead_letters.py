@@ -0,0 +1,225 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.models.sync_dead_letter import SyncDeadLetter
+from apps.b3_migration.sync import dead_letters
+from apps.b3_migration.sync.auto_synchronization import \
+    ModelToModelAutoSynchronizationMixin
+from apps.b3_migration.sync.dead_letters import (
+    get_next_attempt_at,
+    record_failure,
+)
+from apps.b3_migration.sync.initial_sync import retry
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_tests.testcases import B3TestCase
+
+PAIR = SimpleNamespace(
+    id='retired_switch',
+    source=SimpleNamespace(descriptor=SWITCH_DESCRIPTOR),
+    target=SimpleNamespace(descriptor=RETIRED_SWITCH_DESCRIPTOR),
+)
+
+
+@override_settings(MODEL_SYNC_RETRY_BACKOFF=60,
+                   MODEL_SYNC_RETRY_MAX_BACKOFF=600)
+class DeadLetterTests(B3TestCase):
+    def _record_due(self, source_pk, operation=SyncDeadLetter.CREATE):
+        record_failure('retired_switch', source_pk, operation,
+                       ValueError('corrupt'))
+        SyncDeadLetter.objects.update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_backoff(self):
+        """
+        Asserts that the delay between retries doubles up to a maximum, and
+        that retries end after the maximal number of attempts
+        """
+        now = timezone.now()
+
+        self.assertEqual(
+            [get_next_attempt_at(attempts, 6, now) - now
+             for attempts in range(1, 6)],
+            [timedelta(seconds=seconds)
+             for seconds in (60, 120, 240, 480, 600)])
+        self.assertIsNone(get_next_attempt_at(6, 6, now))
+
+    def test_record_failure_again(self):
+        """Asserts that a failed sync is recorded once, with its attempts"""
+        record_failure('retired_switch', 1, SyncDeadLetter.UPDATE,
+                       ValueError('corrupt'))
+        record_failure('retired_switch', 1, SyncDeadLetter.UPDATE,
+                       KeyError('organization'))
+
+        dead_letter = SyncDeadLetter.objects.get()
+        self.assertEqual(dead_letter.attempts, 2)
+        self.assertEqual(dead_letter.error_class, 'builtins.KeyError')
+
+    def test_record_failure_after_giving_up(self):
+        """
+        Asserts that a new failure of a dead letter that was given up on is
+        retried again, from its first attempt
+        """
+        SyncDeadLetter.objects.create(
+            descriptor_id='retired_switch', source_pk=1,
+            operation=SyncDeadLetter.UPDATE, error_class='builtins.ValueError',
+            attempts=10, next_attempt_at=None)
+
+        record_failure('retired_switch', 1, SyncDeadLetter.UPDATE,
+                       KeyError('organization'))
+
+        dead_letter = SyncDeadLetter.objects.get()
+        self.assertEqual(dead_letter.attempts, 1)
+        self.assertIsNotNone(dead_letter.next_attempt_at)
+
+    @mock.patch.object(dead_letters.registry, 'get_pair_for_descriptors',
+                       return_value=PAIR)
+    def test_auto_sync_failure(self, get_pair_for_descriptors):
+        """
+        Asserts that an auto sync error swallowed by the mixin is recorded
+        once the transaction commits
+        """
+        switch = SwitchFactory()
+        switch.get_source_and_target_descriptors = \
+            lambda: (SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            ModelToModelAutoSynchronizationMixin._on_sync_error(
+                switch, ValueError('corrupt'), SyncDeadLetter.UPDATE)
+            self.assertFalse(SyncDeadLetter.objects.exists())
+        for callback in callbacks:
+            callback()
+
+        dead_letter = SyncDeadLetter.objects.get()
+        self.assertEqual(
+            (dead_letter.descriptor_id, dead_letter.source_pk,
+             dead_letter.operation, dead_letter.error_class),
+            ('retired_switch', switch.pk, SyncDeadLetter.UPDATE,
+             'builtins.ValueError'))
+
+    def test_retry_deletes(self):
+        """
+        Asserts that the targets of deleted source instances are deleted
+        with their mappings, and that source instances that still exist keep
+        theirs
+        """
+        mapping_store = get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+        deleted_switch, kept_switch = SwitchFactory(), SwitchFactory()
+        retired_switches = {}
+        for switch in (deleted_switch, kept_switch):
+            retired_switches[switch.pk] = RetiredSwitch.objects.create(
+                organization_id=switch.organization_id,
+                feature=switch.feature,
+                active=switch.active,
+                creation_date=switch.creation_date,
+                last_modified=switch.last_modified,
+            )
+            mapping_store.create(switch.pk, retired_switches[switch.pk].pk)
+        Switch.objects.filter(pk=deleted_switch.pk).delete()
+
+        errors = retry.retry_deletes(
+            PAIR, {deleted_switch.pk: None, kept_switch.pk: None})
+
+        self.assertEqual(errors, {})
+        self.assertEqual(
+            list(RetiredSwitch.objects.values_list('pk', flat=True)),
+            [retired_switches[kept_switch.pk].pk])
+        self.assertIsNone(mapping_store.get_target_pk(deleted_switch.pk))
+        self.assertEqual(mapping_store.get_target_pk(kept_switch.pk),
+                         retired_switches[kept_switch.pk].pk)
+
+    @mock.patch.object(retry.registry, 'get_pair', return_value=PAIR)
+    def test_retry(self, get_pair):
+        """
+        Asserts that retried syncs create the missing targets, and that
+        dead letters of deleted source instances are resolved as well
+        """
+        switch = SwitchFactory(feature='new_checkout', active=True)
+        self._record_due(switch.pk)
+        self._record_due(0)
+
+        stats = retry.retry_dead_letters()
+
+        self.assertEqual((stats.resolved, stats.failed), (2, 0))
+        self.assertFalse(SyncDeadLetter.objects.exists())
+        self.assertTrue(RetiredSwitch.objects.filter(
+            organization_id=switch.organization_id,
+            feature='new_checkout').exists())
+
+    def test_claim(self):
+        """
+        Asserts that claimed dead letters are not due anymore until their
+        lease expires, so that concurrent runs skip them
+        """
+        self._record_due(1)
+        self._record_due(2)
+
+        dead_letters = retry.claim_due_dead_letters(batch_size=1, lease=60)
+
+        self.assertEqual(
+            [dead_letter.source_pk for dead_letter in dead_letters], [1])
+        self.assertEqual(
+            SyncDeadLetter.objects.get(source_pk=1).next_attempt_at,
+            dead_letters[0].next_attempt_at)
+        self.assertGreater(dead_letters[0].next_attempt_at, timezone.now())
+        self.assertEqual(
+            [dead_letter.source_pk
+             for dead_letter in retry.claim_due_dead_letters(lease=60)],
+            [2])
+        self.assertEqual(retry.claim_due_dead_letters(lease=60), [])
+
+    @mock.patch.object(retry.registry, 'get_pair', return_value=PAIR)
+    def test_failure_recorded_during_retry(self, get_pair):
+        """
+        Asserts that a failure recorded while a dead letter is retried is
+        kept, whether the retry succeeds or fails
+        """
+        self._record_due(1)
+        self._record_due(2)
+
+        def retry_syncs(pair, source_pks):
+            for source_pk in source_pks:
+                record_failure('retired_switch', source_pk,
+                               SyncDeadLetter.CREATE, KeyError('new'))
+            return {2: ValueError('corrupt')}
+
+        with mock.patch.object(retry, 'retry_syncs', retry_syncs):
+            stats = retry.retry_dead_letters()
+
+        self.assertEqual((stats.resolved, stats.failed), (1, 1))
+        self.assertEqual(
+            list(SyncDeadLetter.objects.order_by('source_pk').values_list(
+                'source_pk', 'attempts', 'error_class')),
+            [(1, 2, 'builtins.KeyError'), (2, 2, 'builtins.KeyError')])
+
+    @mock.patch.object(retry.registry, 'get_pair',
+                       side_effect=LookupError('unknown pair'))
+    def test_retry_fails_again(self, get_pair):
+        """
+        Asserts that a failing retry is due later, and given up on after the
+        maximal number of attempts
+        """
+        self._record_due(1)
+
+        stats = retry.retry_dead_letters(max_attempts=3)
+
+        dead_letter = SyncDeadLetter.objects.get()
+        self.assertEqual((stats.failed, stats.exhausted), (1, 0))
+        self.assertEqual(dead_letter.attempts, 2)
+        self.assertGreater(dead_letter.next_attempt_at, timezone.now())
+
+        self._record_due(1)
+        stats = retry.retry_dead_letters(max_attempts=3)
+
+        self.assertEqual(stats.exhausted, 1)
+        self.assertIsNone(SyncDeadLetter.objects.get().next_attempt_at)
@@ -0,0 +1,194 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from apps.b3_migration.models.switch import RetiredSwitch
+from apps.b3_migration.sync import locking
+from apps.b3_migration.sync.auto_synchronization_base import \
+    call_with_error_handling
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+
+
+class FakeDeadlock(Exception):
+    pgcode = locking.DEADLOCK_PGCODE
+
+
+def _deadlock():
+    try:
+        raise FakeDeadlock
+    except FakeDeadlock as cause:
+        exc = OperationalError('deadlock detected')
+        exc.__cause__ = cause
+        return exc
+
+
+@mock.patch.object(locking, 'lock_in_order')
+@mock.patch.object(locking, 'transaction')
+class RunLockedTests(SimpleTestCase):
+    def setUp(self):
+        locking.deadlock_retries.clear()
+        self.instance = SimpleNamespace(
+            pk=None, _state=SimpleNamespace(adding=True))
+        self.sleep = mock.Mock()
+
+    def _prepare(self, transaction, in_atomic_block=False):
+        transaction.get_connection.return_value.in_atomic_block = \
+            in_atomic_block
+        transaction.atomic.return_value.__exit__.return_value = False
+
+    def _run(self, func, retries=2):
+        return locking.run_locked(
+            func, self.instance, {}, {}, retries=retries, sleep=self.sleep)
+
+    def test_retry_on_deadlock(self, transaction, lock_in_order):
+        """
+        Asserts that deadlocks are retried with a jittered delay, and that
+        the instance is reset before every retry
+        """
+        self._prepare(transaction)
+
+        def func():
+            if func.calls < 2:
+                func.calls += 1
+                self.instance.pk = 42
+                raise _deadlock()
+            return 'saved'
+        func.calls = 0
+
+        self.assertEqual(self._run(func), 'saved')
+        self.assertIsNone(self.instance.pk)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(
+            locking.deadlock_retries.stats(), {'retries': 2, 'failures': 0})
+        lock_in_order.assert_not_called()
+
+    def test_give_up(self, transaction, lock_in_order):
+        """Asserts that the deadlock is raised once retries are exhausted"""
+        self._prepare(transaction)
+
+        with self.assertRaises(OperationalError):
+            self._run(mock.Mock(side_effect=_deadlock()))
+
+        self.assertEqual(
+            locking.deadlock_retries.stats(), {'retries': 2, 'failures': 1})
+
+    def test_no_retry_in_outer_transaction(self, transaction, lock_in_order):
+        """
+        Asserts that a deadlock aborting an outer transaction is not retried
+        """
+        self._prepare(transaction, in_atomic_block=True)
+        func = mock.Mock(side_effect=_deadlock())
+
+        with self.assertRaises(OperationalError):
+            self._run(func)
+
+        self.assertEqual(func.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_other_errors_are_raised(self, transaction, lock_in_order):
+        """Asserts that errors other than deadlocks are not retried"""
+        self._prepare(transaction)
+        func = mock.Mock(side_effect=OperationalError('disk full'))
+
+        with self.assertRaises(OperationalError):
+            self._run(func)
+
+        self.assertEqual(func.call_count, 1)
+
+
+def _retired_switch(**kwargs):
+    return RetiredSwitch(
+        organization_id=1,
+        feature='new_checkout',
+        active=True,
+        creation_date=timezone.now(),
+        last_modified=timezone.now(),
+        **kwargs
+    )
+
+
+class RunLockedDatabaseTests(TransactionTestCase):
+    def setUp(self):
+        locking.deadlock_retries.clear()
+
+    def _run(self, func, instance):
+        return locking.run_locked(
+            func, instance, RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR,
+            sleep=mock.Mock())
+
+    def test_locked_save(self):
+        """
+        Asserts that the row of a saved instance is locked, and that the
+        result of the save is returned once committed
+        """
+        retired_switch = _retired_switch()
+        retired_switch.save()
+        retired_switch.active = False
+
+        def save():
+            retired_switch.save()
+            return 'saved'
+
+        self.assertEqual(self._run(save, retired_switch), 'saved')
+        self.assertFalse(
+            RetiredSwitch.objects.get(pk=retired_switch.pk).active)
+
+    def test_deadlock_in_handled_hook_is_retried(self):
+        """
+        Asserts that a deadlock is not swallowed by
+        :function: `call_with_error_handling()`, and that the writes of the
+        failed attempt are rolled back before the retry
+        """
+        retired_switch = _retired_switch()
+        on_error = mock.Mock()
+
+        def save():
+            retired_switch.save()
+            if not save.calls:
+                save.calls += 1
+                raise _deadlock()
+            return 'saved'
+        save.calls = 0
+
+        result = self._run(
+            lambda: call_with_error_handling(save, on_error=on_error),
+            retired_switch)
+
+        self.assertEqual(result, 'saved')
+        self.assertEqual(RetiredSwitch.objects.count(), 1)
+        on_error.assert_not_called()
+        self.assertEqual(
+            locking.deadlock_retries.stats(), {'retries': 1, 'failures': 0})
+
+    def test_handled_database_error(self):
+        """
+        Asserts that a database error swallowed by
+        :function: `call_with_error_handling()` only rolls back its own
+        writes, and leaves the locked transaction usable
+        """
+        retired_switch = _retired_switch()
+        retired_switch.save()
+        on_error = mock.Mock()
+
+        def create_twice():
+            _retired_switch(pk=retired_switch.pk + 1).save()
+            _retired_switch(pk=retired_switch.pk + 1).save(force_insert=True)
+
+        def save():
+            handled = call_with_error_handling(
+                create_twice, on_error=on_error)
+            retired_switch.active = False
+            retired_switch.save()
+            return handled
+
+        self.assertFalse(self._run(save, retired_switch))
+        self.assertIsInstance(on_error.call_args[0][0], IntegrityError)
+        self.assertEqual(
+            list(RetiredSwitch.objects.values_list('pk', 'active')),
+            [(retired_switch.pk, False)])
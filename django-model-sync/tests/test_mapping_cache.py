@@ -0,0 +1,59 @@
+from django.test import SimpleTestCase
+
+from apps.b3_migration.sync.mapping_cache import MappingCache
+
+
+class MappingCacheTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.cache = MappingCache(max_size=2)
+
+    def test_least_recently_used_is_evicted(self):
+        """
+        Asserts that the least recently used entry is dropped once the
+        cache is full
+        """
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_evict(self):
+        """Asserts that evicted entries are not returned anymore"""
+        self.cache.set('a', 1)
+        self.cache.evict('a')
+        self.cache.evict('missing')
+
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_stats(self):
+        """Asserts that hits and misses are counted"""
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('a')
+        self.cache.get('b')
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_stats_per_scope(self):
+        """Asserts that hits and misses are counted per scope as well"""
+        self.cache.set('a', 1)
+        self.cache.get('a', scope='addresses')
+        self.cache.get('b', scope='orders')
+        self.cache.get('b')
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['scopes'], {
+            'addresses': {'hits': 1, 'misses': 0, 'hit_rate': 1.0},
+            'orders': {'hits': 0, 'misses': 1, 'hit_rate': 0.0},
+        })
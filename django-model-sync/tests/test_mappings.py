@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.utils import IntegrityError
+
+from apps.b3_migration.models.sync_mapping import SyncMapping
+from apps.b3_migration.sync.mapping_cache import mapping_cache
+from apps.b3_migration.sync.mappings import GenericMappingStore
+from apps.b3_tests.testcases import B3TestCase
+
+OLD_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'Switch',
+    'mapping_name': 'address',
+    'mapping_side': 'source',
+}
+
+NEW_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'RetiredSwitch',
+    'mapping_name': 'address',
+    'mapping_side': 'target',
+}
+
+
+class GenericMappingStoreTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.old_to_new = GenericMappingStore(OLD_DESCRIPTOR, NEW_DESCRIPTOR)
+        self.new_to_old = GenericMappingStore(NEW_DESCRIPTOR, OLD_DESCRIPTOR)
+        self.old_to_new.bulk_create([(1, 10), (2, 20), (3, 30)])
+
+    def test_lookups_in_both_directions(self):
+        """
+        Asserts that pks are translated in bulk in both directions, with a
+        single query each
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.old_to_new.get_target_pks([1, 3, 4]), {1: 10, 3: 30})
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.new_to_old.get_target_pks([20, 30]), {20: 2, 30: 3})
+        self.assertEqual(self.old_to_new.get_source_pks([10]), {10: 1})
+        self.assertIsNone(self.old_to_new.get_target_pk(4))
+
+    def test_mappings_are_scoped_by_name(self):
+        """
+        Asserts that mappings of other descriptor pairs are not returned
+        """
+        other = GenericMappingStore(
+            dict(OLD_DESCRIPTOR, mapping_name='order'),
+            dict(NEW_DESCRIPTOR, mapping_name='order'),
+        )
+
+        self.assertEqual(other.get_target_pks([1, 2, 3]), {})
+
+    def test_delete(self):
+        """Asserts that deleting from either side removes the mapping"""
+        self.old_to_new.delete(1)
+        self.new_to_old.delete(20)
+
+        self.assertEqual(
+            list(SyncMapping.objects.values_list('source_pk', flat=True)),
+            [3]
+        )
+
+    def test_source_pk_is_unique(self):
+        """Asserts that a source pk can only be mapped once"""
+        with self.assertRaises(IntegrityError):
+            self.old_to_new.create(1, 11)
+
+    def test_claim(self):
+        """
+        Asserts that claiming a mapped source pk keeps the existing mapping
+        """
+        self.assertEqual(self.old_to_new.claim(4, 40), 40)
+        self.assertEqual(self.old_to_new.claim(1, 11), 10)
+        self.assertEqual(
+            SyncMapping.objects.filter(source_pk=1).count(), 1)
+
+    def test_claim_mapped_target_pk(self):
+        """
+        Asserts that claiming a target pk that is mapped to another source
+        pk fails instead of returning no mapping
+        """
+        with self.assertRaisesMessage(
+                IntegrityError, 'retiredswitch 10 is mapped to another'):
+            self.old_to_new.claim(4, 10)
+
+        self.assertIsNone(self.old_to_new.get_target_pk(4))
+
+
+class CachedMappingStoreTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        mapping_cache.clear()
+        self.addCleanup(mapping_cache.clear)
+        self.store = GenericMappingStore(
+            dict(OLD_DESCRIPTOR, cache_mappings=True), NEW_DESCRIPTOR)
+
+    def test_cached_on_commit(self):
+        """
+        Asserts that looked up mappings are cached once their transaction
+        commits, and counted for their descriptor pair
+        """
+        self.store.bulk_create([(1, 10)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.store.get_target_pks([1]), {1: 10})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store.get_target_pks([1]), {1: 10})
+
+        self.assertEqual(
+            mapping_cache.stats()['scopes'][self.store.cache_scope],
+            {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_rolled_back_mapping_is_not_cached(self):
+        """
+        Asserts that a mapping looked up in a transaction that is rolled
+        back is not cached
+        """
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.store.create(1, 10)
+                    self.assertEqual(self.store.get_target_pks([1]), {1: 10})
+                    raise IntegrityError
+        except IntegrityError:
+            pass
+
+        self.assertIsNone(self.store.get_target_pk(1))
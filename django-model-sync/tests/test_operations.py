@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection
+from django.db.migrations.state import ProjectState
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.operations import RetireSwitchFeature
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+class RetireSwitchFeatureTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        Switch.objects.all().delete()
+        organizations = Organization.objects.all()[:3]
+        for organization in organizations:
+            SwitchFactory(
+                feature='left_navigation', organization=organization)
+        self.kept_switch = SwitchFactory(
+            feature=Switch.NEW_BASKET, organization=organizations[0])
+        self.retired_count = len(organizations)
+
+    def _apply(self, operation):
+        state = ProjectState.from_apps(apps)
+        schema_editor = mock.Mock(connection=connection)
+        operation.database_forwards(
+            'b3_migration', schema_editor, state, state)
+
+    def test_retire_feature(self):
+        """
+        Asserts that only the switches of the retired feature are deleted,
+        in chunks, and not archived by default
+        """
+        self._apply(RetireSwitchFeature('left_navigation', chunk_size=2))
+
+        self.assertEqual(
+            list(Switch.objects.values_list('pk', flat=True)),
+            [self.kept_switch.pk]
+        )
+        self.assertFalse(RetiredSwitch.objects.exists())
+
+    def test_retire_feature_with_archive(self):
+        """
+        Asserts that the switches of the retired feature are archived
+        before being deleted
+        """
+        self._apply(RetireSwitchFeature(
+            'left_navigation', archive=True, chunk_size=2))
+
+        self.assertFalse(
+            Switch.objects.filter(feature='left_navigation').exists())
+        self.assertEqual(
+            RetiredSwitch.objects.filter(feature='left_navigation').count(),
+            self.retired_count
+        )
+
+    def test_deconstruct(self):
+        """Asserts that the operation can be serialized into migrations"""
+        name, args, kwargs = RetireSwitchFeature(
+            'left_navigation', archive=True).deconstruct()
+
+        self.assertEqual(name, 'RetireSwitchFeature')
+        self.assertEqual(args, ('left_navigation', ))
+        self.assertEqual(kwargs, {'archive': True})
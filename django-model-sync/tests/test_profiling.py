@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.b3_migration.sync import profiling
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+
+
+def fields_func(value):
+    return sum(range(value))
+
+
+class ProfileSyncTests(SimpleTestCase):
+    def setUp(self):
+        profiling.profiles.clear()
+
+    def _sync(self):
+        with profiling.profile_sync(
+                SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR):
+            fields_func(1000)
+
+    def test_disabled(self):
+        """Asserts that nothing is profiled by default"""
+        self._sync()
+
+        self.assertEqual(profiling.profiles.calls, {})
+
+    def test_profile_auto_sync(self):
+        """
+        Asserts that the syncs of the block are aggregated per descriptor
+        pair and written to the file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.txt')
+            with profiling.profile_auto_sync(path):
+                self._sync()
+                self._sync()
+            with open(path) as report_file:
+                report = report_file.read()
+
+        self.assertEqual(
+            profiling.profiles.calls, {'Switch->RetiredSwitch': 2})
+        self.assertIn('=== Switch->RetiredSwitch: 2 syncs', report)
+        self.assertIn('fields_func', report)
+
+    @override_settings(MODEL_SYNC_PROFILE=True)
+    def test_nested(self):
+        """Asserts that nested syncs are profiled with the outer one"""
+        with profiling.profile_sync(
+                SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR):
+            self._sync()
+
+        self.assertEqual(
+            profiling.profiles.calls, {'Switch->RetiredSwitch': 1})
@@ -0,0 +1,71 @@
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.sync.initial_sync.bulk import bulk_sync
+from apps.b3_migration.sync.initial_sync.reconciliation import (
+    compare,
+    repair,
+)
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+class ReconciliationTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        Switch.objects.all().delete()
+        organizations = Organization.objects.all()[:2]
+        self.switch = SwitchFactory(organization=organizations[0])
+        bulk_sync(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+        self.unsynced_switch = SwitchFactory(organization=organizations[1])
+
+    def _compare(self):
+        return compare(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+    def _get_target(self, switch):
+        return RetiredSwitch.objects.get(pk=get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR
+        ).get_target_pk(switch.pk))
+
+    def test_compare_in_sync(self):
+        """Asserts that synced instances are reported in sync"""
+        self.unsynced_switch.delete()
+
+        report = self._compare()
+
+        self.assertTrue(report.in_sync)
+        self.assertEqual((report.source_count, report.synced_count), (1, 1))
+
+    def test_compare(self):
+        """
+        Asserts that source instances without a target are reported
+        missing, and those with a different target mismatched
+        """
+        RetiredSwitch.objects.update(active=not self.switch.active)
+
+        report = self._compare()
+
+        self.assertFalse(report.in_sync)
+        self.assertEqual(report.missing_pks, [self.unsynced_switch.pk])
+        self.assertEqual(report.mismatched_pks, [self.switch.pk])
+
+    def test_repair(self):
+        """
+        Asserts that missing targets are created and mismatched ones
+        updated
+        """
+        RetiredSwitch.objects.update(active=not self.switch.active)
+
+        repair(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, self._compare())
+
+        self.assertTrue(self._compare().in_sync)
+        self.assertEqual(
+            self._get_target(self.switch).active, self.switch.active)
+        self.assertEqual(
+            self._get_target(self.unsynced_switch).feature,
+            self.unsynced_switch.feature)
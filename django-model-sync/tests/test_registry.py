@@ -0,0 +1,173 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from apps.b3_migration.model_descriptors.registry import DescriptorRegistry
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.tests import descriptors
+from apps.b3_organization.models.organization import Organization
+
+ORGANIZATION_DESCRIPTOR = {
+    'app_name': 'b3_organization',
+    'model_name': 'Organization',
+    'related_name_in_buddy': 'switches',
+    'field_name_in_buddy': 'organization',
+}
+
+RETIRED_SWITCH_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'RetiredSwitch',
+    'buddy_app_name': 'b3_migration',
+    'buddy_model_name': 'Switch',
+    'field_name_in_buddy': 'organization',
+    'fields_mapping': {
+        'showname': 'note',
+    },
+}
+
+
+class DescriptorRegistryTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.registry = DescriptorRegistry()
+
+    def test_compile(self):
+        """
+        Asserts that registered pairs are compiled and indexed by source
+        and buddy model
+        """
+        self.registry.register(
+            ORGANIZATION_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+        self.registry.compile()
+
+        pair = self.registry.get_pair(
+            'b3_organization.organization->b3_migration.retiredswitch')
+        self.assertIs(pair.source.model_class, Organization)
+        self.assertIs(pair.target.model_class, RetiredSwitch)
+        self.assertIs(pair.buddy_class, Switch)
+        self.assertEqual(
+            self.registry.get_pairs_for_source_model(Organization), [pair])
+        self.assertEqual(
+            self.registry.get_pairs_for_buddy_model(Switch), [pair])
+        self.assertIs(
+            self.registry.get_compiled(ORGANIZATION_DESCRIPTOR), pair.source)
+        self.assertIs(
+            self.registry.get_pair_for_descriptors(
+                ORGANIZATION_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR),
+            pair
+        )
+
+    def test_compile_invalid_descriptor(self):
+        """
+        Asserts that a typo in a descriptor fails when compiling
+        """
+        self.registry.register(
+            ORGANIZATION_DESCRIPTOR,
+            dict(RETIRED_SWITCH_DESCRIPTOR, fields_mapping={'shwname': 'note'})
+        )
+
+        with self.assertRaisesMessage(
+                ImproperlyConfigured, 'Organization has no field shwname'):
+            self.registry.compile()
+
+    def test_register_after_compile(self):
+        """
+        Asserts that pairs registered after compiling are validated before
+        they are compiled
+        """
+        self.registry.compile()
+
+        with self.assertRaisesMessage(
+                ImproperlyConfigured, 'Organization has no field shwname'):
+            self.registry.register(
+                ORGANIZATION_DESCRIPTOR,
+                dict(RETIRED_SWITCH_DESCRIPTOR,
+                     fields_mapping={'shwname': 'note'}),
+                'invalid')
+        self.registry.register(
+            descriptors.SWITCH_DESCRIPTOR,
+            descriptors.RETIRED_SWITCH_DESCRIPTOR, 'switches')
+
+        self.assertEqual(
+            [pair.id for pair in self.registry.get_pairs()], ['switches'])
+        self.assertIs(
+            self.registry.get_compiled(descriptors.SWITCH_DESCRIPTOR),
+            self.registry.get_pair('switches').source)
+
+    def test_variants_of_a_descriptor(self):
+        """
+        Asserts that descriptors of the same model are compiled separately
+        """
+        variant = dict(descriptors.SWITCH_DESCRIPTOR, lock_ordering=False)
+        self.registry.register(
+            descriptors.SWITCH_DESCRIPTOR,
+            descriptors.RETIRED_SWITCH_DESCRIPTOR, 'switches')
+        self.registry.register(
+            variant, descriptors.RETIRED_SWITCH_DESCRIPTOR, 'variant')
+        self.registry.compile()
+
+        self.assertIs(
+            self.registry.get_pair_for_descriptors(
+                variant, descriptors.RETIRED_SWITCH_DESCRIPTOR),
+            self.registry.get_pair('variant'))
+        self.assertIsNone(self.registry.get_pair_for_descriptors(
+            dict(variant), descriptors.RETIRED_SWITCH_DESCRIPTOR))
+
+    def test_register_twice(self):
+        """Asserts that descriptor pair ids are unique"""
+        self.registry.register(
+            ORGANIZATION_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.registry.register(
+                ORGANIZATION_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+    def test_translated_fields(self):
+        """
+        Asserts that foreign keys translated through a registered pair are
+        valid, and that the pair depends on it
+        """
+        self.registry.register(
+            ORGANIZATION_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+            'organizations')
+        self.registry.register(
+            descriptors.SWITCH_DESCRIPTOR,
+            dict(descriptors.RETIRED_SWITCH_DESCRIPTOR, fields_translated=[
+                ('organization_id', 'organization_id', 'organizations'),
+            ]),
+            'switches',
+        )
+        self.registry.compile()
+
+        self.assertEqual(
+            self.registry.get_pair('switches').dependencies,
+            ('organizations', ))
+        self.assertEqual(
+            [pair.id for pair in self.registry.get_sync_order(
+                ['switches', 'organizations'])],
+            ['organizations', 'switches']
+        )
+
+    def test_invalid_translated_fields(self):
+        """
+        Asserts that translated fields missing on either model, or
+        translated through a pair that is not registered, fail when
+        compiling
+        """
+        self.registry.register(
+            descriptors.SWITCH_DESCRIPTOR,
+            dict(descriptors.RETIRED_SWITCH_DESCRIPTOR, fields_translated=[
+                ('organisation_id', 'organization_id', 'organizations'),
+                ('organization_id', 'organisation_id', 'organizations'),
+            ]),
+        )
+
+        with self.assertRaises(ImproperlyConfigured) as context:
+            self.registry.compile()
+
+        message = str(context.exception)
+        self.assertIn('Switch has no field organisation_id', message)
+        self.assertIn('RetiredSwitch has no field organisation_id', message)
+        self.assertIn(
+            'organization_id is translated through unknown descriptor pair '
+            'organizations', message)
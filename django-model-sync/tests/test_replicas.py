@@ -0,0 +1,123 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.sync.initial_sync import replicas
+from apps.b3_migration.sync.initial_sync.bulk import bulk_sync
+from apps.b3_migration.sync.initial_sync.reconciliation import compare
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+REPLICA = 'replica'
+
+# Reverse of the test pair, since retired switches have no foreign key to
+# rows that only exist on the primary
+RETIRED_SWITCH_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'RetiredSwitch',
+    'mapping_name': 'unretired_switch',
+    'mapping_side': 'source',
+}
+
+SWITCH_DESCRIPTOR = {
+    'app_name': 'b3_migration',
+    'model_name': 'Switch',
+    'mapping_name': 'unretired_switch',
+    'mapping_side': 'target',
+    'fields_mapping': {
+        'organization_id': 'organization_id',
+        'feature': 'feature',
+        'active': 'active',
+    },
+}
+
+
+class WaitForReplicaTests(SimpleTestCase):
+    def test_no_check_without_max_lag(self):
+        """
+        Asserts that nothing is checked without a replica or a maximal lag
+        """
+        self.assertIsNone(replicas.get_replica_check('replica', None, 'TEST'))
+        self.assertIsNone(replicas.get_replica_check(None, 5, 'TEST'))
+
+    def test_waits_until_lag_is_below_max_lag(self):
+        """Asserts that the lag is polled until it is low enough"""
+        sleep = mock.Mock()
+        with mock.patch.object(
+                replicas, 'get_replica_lag', side_effect=[30.0, 12.0, 4.0]):
+            waited = replicas.wait_for_replica(
+                'replica', 5, 'TEST', poll_interval=2, sleep=sleep)
+        self.assertEqual(waited, 4)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_unknown_lag_does_not_wait(self):
+        """
+        Asserts that primaries and other backends, without a known lag, are
+        not waited for
+        """
+        sleep = mock.Mock()
+        with mock.patch.object(
+                replicas, 'get_replica_lag', return_value=None):
+            replicas.wait_for_replica('replica', 5, 'TEST', sleep=sleep)
+        sleep.assert_not_called()
+
+
+@skipUnless(REPLICA in settings.DATABASES, 'No replica database configured')
+class ReadFromReplicaTests(B3TestCase):
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        super().setUp()
+
+        Switch.objects.all().delete()
+        now = timezone.now()
+        self.retired_switches = [
+            RetiredSwitch.objects.using(REPLICA).create(
+                organization_id=organization.pk,
+                feature=Switch.NEW_BASKET,
+                active=True,
+                creation_date=now,
+                last_modified=now,
+            )
+            for organization in Organization.objects.all()
+        ]
+
+    def test_bulk_sync(self):
+        """
+        Asserts that source instances are read from the replica and their
+        targets written to the primary, skipping the source instances
+        mapped on the primary only
+        """
+        mapped = self.retired_switches[0]
+        get_mapping_store(
+            RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR
+        ).bulk_create([(mapped.pk, 0)])
+
+        stats = bulk_sync(
+            RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR, read_using=REPLICA)
+
+        self.assertEqual(stats.created, len(self.retired_switches) - 1)
+        self.assertEqual(
+            set(Switch.objects.values_list('organization_id', flat=True)),
+            {retired_switch.organization_id
+             for retired_switch in self.retired_switches[1:]}
+        )
+        self.assertFalse(Switch.objects.using(REPLICA).exists())
+
+    def test_compare(self):
+        """
+        Asserts that reconciliation compares the source instances of the
+        replica with the targets of the primary
+        """
+        bulk_sync(
+            RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR, read_using=REPLICA)
+
+        report = compare(
+            RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR, read_using=REPLICA)
+
+        self.assertTrue(report.in_sync)
+        self.assertEqual(report.synced_count, len(self.retired_switches))
@@ -0,0 +1,108 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import transaction
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.management.commands.rollout_switch import \
+    is_in_rollout
+from apps.b3_migration.models.switch import Switch
+from apps.b3_migration.signals import switches_toggled
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+class RolloutSwitchTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        Switch.objects.all().delete()
+        self.organization = Organization.objects.first()
+
+    def _rollout(self, *args):
+        call_command(
+            'rollout_switch', Switch.NEW_BASKET, '--pause', '0', *args,
+            stdout=StringIO())
+
+    def test_rollout_to_organizations(self):
+        """
+        Asserts that switches are created or activated for the given
+        organizations only
+        """
+        switch = SwitchFactory(
+            feature=Switch.NEW_BASKET,
+            organization=self.organization,
+            active=False,
+        )
+        last_modified = switch.last_modified
+
+        self._rollout('--organization', str(self.organization.pk))
+
+        switch.refresh_from_db()
+        self.assertTrue(switch.active)
+        self.assertGreater(switch.last_modified, last_modified)
+        self.assertEqual(
+            Switch.objects.filter(feature=Switch.NEW_BASKET).count(), 1)
+
+    def test_rollout_to_all_organizations_in_batches(self):
+        """
+        Asserts that every organization gets an active switch and that an
+        invalidation signal is sent per batch
+        """
+        receiver = mock.Mock()
+        switches_toggled.connect(receiver, sender=Switch)
+        self.addCleanup(switches_toggled.disconnect, receiver, sender=Switch)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._rollout('--batch-size', '1')
+
+        organization_count = Organization.objects.count()
+        self.assertEqual(
+            Switch.objects.filter(
+                feature=Switch.NEW_BASKET, active=True).count(),
+            organization_count
+        )
+        self.assertEqual(receiver.call_count, organization_count)
+
+    def test_toggle_signal_not_sent_on_rollback(self):
+        """
+        Asserts that switches_toggled is only sent once the toggle commits
+        """
+        SwitchFactory(
+            feature=Switch.NEW_BASKET,
+            organization=self.organization,
+            active=False,
+        )
+        receiver = mock.Mock()
+        switches_toggled.connect(receiver, sender=Switch)
+        self.addCleanup(switches_toggled.disconnect, receiver, sender=Switch)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Switch.objects.toggle(True)
+                receiver.assert_not_called()
+                raise RuntimeError
+
+        receiver.assert_not_called()
+        self.assertFalse(Switch.objects.get().active)
+
+    def test_rollout_percentage(self):
+        """
+        Asserts that a percentage rollout only activates the selected
+        organizations
+        """
+        self._rollout('--percentage', '50')
+
+        for organization_id in Organization.objects.values_list(
+                'pk', flat=True):
+            self.assertEqual(
+                Switch.is_active(Switch.NEW_BASKET, organization_id),
+                is_in_rollout(Switch.NEW_BASKET, organization_id, 50)
+            )
+
+    def test_dry_run(self):
+        """Asserts that a dry run does not touch any switch"""
+        self._rollout('--dry-run')
+
+        self.assertFalse(Switch.objects.exists())
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from apps.b3_migration.model_descriptors.registry import (
+    DescriptorRegistry,
+    sort_by_dependencies,
+)
+from apps.b3_migration.sync.initial_sync import scheduler
+
+
+class SortByDependenciesTests(SimpleTestCase):
+    def test_dependencies_first(self):
+        """
+        Asserts that ids come after their dependencies, otherwise in order
+        """
+        ordered, cyclic = sort_by_dependencies({
+            'order': ('address', 'shipping'),
+            'address': (),
+            'shipping': ('organization',),
+            'invoice': ('order',),
+        })
+
+        self.assertEqual(ordered, ['address', 'shipping', 'order', 'invoice'])
+        self.assertEqual(cyclic, [])
+
+    def test_cycle(self):
+        """Asserts that ids in a cycle cannot be sorted"""
+        ordered, cyclic = sort_by_dependencies({
+            'address': (),
+            'order': ('invoice',),
+            'invoice': ('order',),
+        })
+
+        self.assertEqual(ordered, ['address'])
+        self.assertEqual(sorted(cyclic), ['invoice', 'order'])
+
+
+class FakePair:
+    def __init__(self, descriptor_id, index, dependencies=()):
+        self.id = descriptor_id
+        self.index = index
+        self.dependencies = dependencies
+
+
+class RunInDependencyOrderTests(SimpleTestCase):
+    def setUp(self):
+        pairs = [
+            FakePair('address', 0),
+            FakePair('shipping', 1),
+            FakePair('order', 2, ('address', 'shipping')),
+            FakePair('invoice', 3, ('order',)),
+        ]
+        fake_registry = DescriptorRegistry()
+        fake_registry._pairs = {pair.id: pair for pair in pairs}
+        patcher = mock.patch.object(scheduler, 'registry', fake_registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_order(self):
+        """Asserts that pairs are synced after their dependencies"""
+        synced = []
+
+        results = scheduler.run_in_dependency_order(
+            None, lambda pair: synced.append(pair.id))
+
+        self.assertEqual(synced, ['address', 'shipping', 'order', 'invoice'])
+        self.assertTrue(all(result.succeeded for result in results))
+
+    def test_dependents_of_failed_pair_are_skipped(self):
+        """
+        Asserts that pairs depending on a failed pair are skipped, and that
+        independent pairs still run
+        """
+        def sync_pair(pair):
+            if pair.id == 'address':
+                raise ValueError('boom')
+
+        results = {
+            result.pair.id: result
+            for result in scheduler.run_in_dependency_order(
+                None, sync_pair, workers=2)
+        }
+
+        self.assertIsInstance(results['address'].error, ValueError)
+        self.assertTrue(results['shipping'].succeeded)
+        self.assertTrue(results['order'].skipped)
+        self.assertTrue(results['invoice'].skipped)
+
+    def test_subset(self):
+        """Asserts that dependencies outside of the synced pairs are ignored"""
+        synced = []
+
+        scheduler.run_in_dependency_order(
+            ['invoice', 'order'], lambda pair: synced.append(pair.id))
+
+        self.assertEqual(synced, ['order', 'invoice'])
+
+    def test_cycle_is_improperly_configured(self):
+        """Asserts that cyclic dependencies are rejected"""
+        scheduler.registry._pairs['address'].dependencies = ('invoice',)
+
+        with self.assertRaises(ImproperlyConfigured):
+            scheduler.run_in_dependency_order(None, lambda pair: None)
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch
+from apps.b3_migration.sync import slow_sync
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_tests.testcases import B3TestCase
+
+
+@mock.patch.object(slow_sync, 'logger')
+class DetectSlowSyncTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+        self.switch = SwitchFactory()
+
+    def _sync(self):
+        with slow_sync.detect_slow_sync(
+                'update', self.switch, SWITCH_DESCRIPTOR,
+                RETIRED_SWITCH_DESCRIPTOR):
+            RetiredSwitch.objects.count()
+
+    @override_settings(MODEL_SYNC_SLOW_THRESHOLD_MS=0)
+    def test_sampled(self, logger):
+        """
+        Asserts that slow syncs are logged with their statements by default
+        """
+        self._sync()
+
+        message = logger.warning.call_args.args[0]
+        self.assertIn('Slow update', message)
+        self.assertIn('Switch->RetiredSwitch', message)
+        self.assertIn('1 statements', message)
+        self.assertIn('SELECT COUNT(*)', message)
+
+    @override_settings(MODEL_SYNC_SLOW_THRESHOLD_MS=0,
+                       MODEL_SYNC_SLOW_SAMPLE_RATE=0)
+    def test_not_sampled(self, logger):
+        """Asserts that statements are only captured for sampled syncs"""
+        self._sync()
+
+        self.assertNotIn('SELECT', logger.warning.call_args.args[0])
+
+    @override_settings(MODEL_SYNC_SLOW_THRESHOLD_MS=60 * 1000,
+                       MODEL_SYNC_SLOW_SAMPLE_RATE=1)
+    def test_fast(self, logger):
+        """Asserts that syncs below the threshold are not logged"""
+        self._sync()
+
+        logger.warning.assert_not_called()
+
+    @override_settings(MODEL_SYNC_SLOW_THRESHOLD_MS=0,
+                       MODEL_SYNC_SLOW_SAMPLE_RATE=1)
+    def test_failed(self, logger):
+        """
+        Asserts that slow syncs are logged when they fail as well, and that
+        their error is raised
+        """
+        with self.assertRaises(ValueError):
+            with slow_sync.detect_slow_sync(
+                    'update', self.switch, SWITCH_DESCRIPTOR,
+                    RETIRED_SWITCH_DESCRIPTOR):
+                RetiredSwitch.objects.count()
+                raise ValueError('corrupt')
+
+        message = logger.warning.call_args.args[0]
+        self.assertIn('Slow failed update', message)
+        self.assertIn('SELECT COUNT(*)', message)
@@ -0,0 +1,113 @@
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.models.sync_stamp import SyncStamp
+from apps.b3_migration.sync.mappings import get_mapping_store
+from apps.b3_migration.sync.stamps import record, should_sync
+from apps.b3_migration.sync.utils import sync_source_and_target_models
+from apps.b3_migration.tests import descriptors
+from apps.b3_tests.testcases import B3TestCase
+
+SWITCH_DESCRIPTOR = {
+    **descriptors.SWITCH_DESCRIPTOR,
+    'modified_field': 'last_modified',
+    'sync_stamps': True,
+}
+RETIRED_SWITCH_DESCRIPTOR = {
+    **descriptors.RETIRED_SWITCH_DESCRIPTOR,
+    'sync_stamps': True,
+}
+
+
+class SyncStampTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+        self.switch = SwitchFactory(feature='new_checkout', active=True)
+        self.retired_switch = RetiredSwitch.objects.create(
+            organization_id=self.switch.organization_id,
+            feature=self.switch.feature,
+            active=self.switch.active,
+            creation_date=self.switch.creation_date,
+            last_modified=self.switch.last_modified,
+        )
+        get_mapping_store(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR).create(
+            self.switch.pk, self.retired_switch.pk)
+        record(self.switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+               self.retired_switch)
+
+    def test_record(self):
+        """
+        Asserts that both directions of a pair share one stamp, keyed by the
+        canonical side of the mapping
+        """
+        record(self.switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+               self.retired_switch)
+
+        stamp = SyncStamp.objects.get()
+        self.assertEqual(
+            (stamp.scope, stamp.key, stamp.origin, stamp.version),
+            ('retired_switch', self.switch.pk, 'b3_migration.switch', 2))
+        self.assertEqual(stamp.source_modified, self.switch.last_modified)
+
+    def test_record_is_one_upsert(self):
+        """
+        Asserts that an existing stamp is updated with a single query, and
+        keeps its source modification date if the source has none
+        """
+        with self.assertNumQueries(1):
+            record(self.retired_switch, RETIRED_SWITCH_DESCRIPTOR,
+                   SWITCH_DESCRIPTOR, self.switch)
+
+        stamp = SyncStamp.objects.get()
+        self.assertEqual(
+            (stamp.origin, stamp.version),
+            ('b3_migration.retiredswitch', 2))
+        self.assertEqual(stamp.source_modified, self.switch.last_modified)
+
+    def test_echo_is_dropped(self):
+        """
+        Asserts that an unchanged target is not synced back to its origin,
+        while a changed one is
+        """
+        self.assertFalse(should_sync(
+            self.retired_switch, RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR))
+
+        self.retired_switch.active = False
+        self.assertTrue(should_sync(
+            self.retired_switch, RETIRED_SWITCH_DESCRIPTOR, SWITCH_DESCRIPTOR))
+
+    def test_origin_is_synced(self):
+        """Asserts that further updates of the origin are synced"""
+        self.assertTrue(should_sync(
+            self.switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR))
+
+    def _sync(self, switch):
+        if should_sync(switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR):
+            retired_switch = sync_source_and_target_models(
+                switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, 'TEST',
+                update=True)
+            record(switch, SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR,
+                   retired_switch)
+
+    def test_save_of_stale_instance_is_synced(self):
+        """
+        Asserts that the save of an instance read before the last synced
+        save is synced, so that the target ends with the values of the
+        source
+        """
+        stale_switch = Switch.objects.get(pk=self.switch.pk)
+        self.switch.active = False
+        self.switch.save()
+        self._sync(self.switch)
+
+        stale_switch.feature = 'new_basket'
+        stale_switch.save()
+        self._sync(stale_switch)
+
+        self.retired_switch.refresh_from_db()
+        self.assertEqual(
+            Switch.objects.values_list('feature', 'active').get(
+                pk=self.switch.pk),
+            (self.retired_switch.feature, self.retired_switch.active))
+        self.assertEqual(
+            (self.retired_switch.feature, self.retired_switch.active),
+            ('new_basket', True))
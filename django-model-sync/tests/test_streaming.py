@@ -0,0 +1,84 @@
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.models.switch import RetiredSwitch, Switch
+from apps.b3_migration.sync.initial_sync.bulk import (
+    bulk_sync,
+    iterate_chunks,
+)
+from apps.b3_migration.sync.initial_sync.streaming import get_row_plan
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+
+class RowPlanTests(B3TestCase):
+    def test_columns(self):
+        """
+        Asserts that foreign keys are read and written by their attname
+        """
+        row_plan = get_row_plan(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+        self.assertEqual(
+            row_plan.columns,
+            ('pk', 'organization_id', 'feature', 'active', 'creation_date',
+             'last_modified'))
+        self.assertEqual(
+            row_plan.target_fields,
+            ('organization_id', 'feature', 'active', 'creation_date',
+             'last_modified'))
+
+    def test_no_row_plan_with_fields_funcs(self):
+        """
+        Asserts that source instances are used if fields functions need them
+        """
+        target_descriptor = dict(
+            RETIRED_SWITCH_DESCRIPTOR,
+            fields_funcs=[('note', lambda switch: str(switch), False)],
+        )
+
+        self.assertIsNone(
+            get_row_plan(SWITCH_DESCRIPTOR, target_descriptor))
+
+    def test_bulk_sync_rows(self):
+        """
+        Asserts that bulk sync copies the columns of the source rows
+        """
+        for organization in Organization.objects.all():
+            SwitchFactory(
+                feature='new_checkout',
+                organization=organization,
+                active=True,
+            )
+
+        stats = bulk_sync(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR, chunk_size=2)
+
+        self.assertEqual(stats.created, Organization.objects.count())
+        self.assertEqual(
+            set(RetiredSwitch.objects.values_list(
+                'organization_id', 'feature', 'active')),
+            {
+                (organization_id, 'new_checkout', True)
+                for organization_id
+                in Organization.objects.values_list('pk', flat=True)
+            }
+        )
+
+    def test_rows_are_read_a_chunk_at_a_time(self):
+        """
+        Asserts that every chunk of rows is read with a query of its own,
+        so that only one chunk is held in memory
+        """
+        for organization in Organization.objects.all():
+            SwitchFactory(organization=organization)
+        row_plan = get_row_plan(SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+        chunks = iterate_chunks(
+            row_plan.get_queryset(Switch.objects.all()), 2)
+
+        with self.assertNumQueries(1):
+            chunk = next(chunks)
+        self.assertEqual(len(chunk), 2)
+        with self.assertNumQueries(1):
+            next(chunks)
@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from apps.b3_migration.sync.auto_synchronization_base import (
+    AutoSynchronizationBase,
+    is_auto_sync_suppressed,
+    suppress_auto_sync,
+)
+
+
+class Source:
+    pass
+
+
+class SubSource(Source):
+    pass
+
+
+class Other:
+    pass
+
+
+class Model:
+    def save(self, *args, **kwargs):
+        self.saved = True
+
+    def delete(self, *args, **kwargs):
+        self.deleted = True
+
+
+class SyncedModel(AutoSynchronizationBase, Model):
+    """Fails on everything a suppressed save or delete must not touch"""
+    def __str__(self):
+        raise AssertionError('rendered')
+
+    def exists_in_db(self):
+        raise AssertionError('queried')
+
+
+class SuppressAutoSyncTests(SimpleTestCase):
+    def test_scoped_to_block(self):
+        """
+        Asserts that sync is suppressed for the given classes and their
+        subclasses inside the block only
+        """
+        with suppress_auto_sync(Source):
+            self.assertTrue(is_auto_sync_suppressed(Source()))
+            self.assertTrue(is_auto_sync_suppressed(SubSource()))
+            self.assertFalse(is_auto_sync_suppressed(Other()))
+        self.assertFalse(is_auto_sync_suppressed(Source()))
+
+    def test_restored_after_exception(self):
+        """Asserts that suppression ends when the block raises"""
+        with self.assertRaises(ValueError):
+            with suppress_auto_sync(Source):
+                raise ValueError
+
+        self.assertFalse(is_auto_sync_suppressed(Source()))
+
+    def test_nested(self):
+        """Asserts that nested blocks restore the outer suppression"""
+        with suppress_auto_sync(Source):
+            with suppress_auto_sync(Other):
+                self.assertTrue(is_auto_sync_suppressed(Source()))
+                self.assertTrue(is_auto_sync_suppressed(Other()))
+            self.assertFalse(is_auto_sync_suppressed(Other()))
+            self.assertTrue(is_auto_sync_suppressed(Source()))
+
+    def test_other_threads_keep_syncing(self):
+        """Asserts that suppression does not leak into other threads"""
+        with suppress_auto_sync(Source):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                suppressed = executor.submit(
+                    is_auto_sync_suppressed, Source()).result()
+
+        self.assertFalse(suppressed)
+
+    def test_other_tasks_keep_syncing(self):
+        """Asserts that suppression does not leak into other asyncio tasks"""
+        async def suppressed_task(started, done):
+            with suppress_auto_sync(Source):
+                started.set()
+                await done.wait()
+                return is_auto_sync_suppressed(Source())
+
+        async def syncing_task(started, done):
+            await started.wait()
+            suppressed = is_auto_sync_suppressed(Source())
+            done.set()
+            return suppressed
+
+        async def main():
+            started, done = asyncio.Event(), asyncio.Event()
+            return await asyncio.gather(
+                suppressed_task(started, done), syncing_task(started, done))
+
+        self.assertEqual(asyncio.run(main()), [True, False])
+
+
+class SuppressedWriteTests(SimpleTestCase):
+    def test_save(self):
+        """
+        Asserts that a suppressed save does not query whether the instance
+        exists, nor renders it
+        """
+        instance = SyncedModel()
+
+        with suppress_auto_sync(SyncedModel):
+            instance.save(is_synching_old_to_new=True)
+
+        self.assertTrue(instance.saved)
+
+    def test_delete(self):
+        """Asserts that a suppressed delete does not render the instance"""
+        instance = SyncedModel()
+
+        with suppress_auto_sync(SyncedModel):
+            instance.delete(target=True)
+
+        self.assertTrue(instance.deleted)
@@ -0,0 +1,83 @@
+from django.test import SimpleTestCase
+
+from apps.b3_migration.sync.initial_sync.throttling import (
+    Throttle,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_consume_within_capacity_does_not_wait(self):
+        """Asserts that consuming up to the capacity does not wait"""
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+        self.assertEqual(bucket.consume(100), 0.0)
+
+    def test_consume_waits_for_refill(self):
+        """Asserts that consuming more than is left waits for the refill"""
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+        bucket.consume(100)
+        self.assertAlmostEqual(bucket.consume(50), 0.5)
+        self.assertAlmostEqual(clock.now, 0.5)
+
+    def test_refill_is_capped(self):
+        """Asserts that tokens do not accumulate beyond the capacity"""
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+        clock.now = 60
+        self.assertAlmostEqual(bucket.consume(200), 1.0)
+
+
+class ThrottleTests(SimpleTestCase):
+    def test_fixed_chunk_size_without_target_latency(self):
+        """Asserts that chunks keep their size without a target latency"""
+        throttle = Throttle(100)
+        throttle.after_chunk(10)
+        self.assertEqual(throttle.get_chunk_size(), 100)
+
+    def test_chunk_size_shrinks_on_high_latency(self):
+        """
+        Asserts that chunks shrink above the target latency, down to the
+        minimal size
+        """
+        throttle = Throttle(100, target_latency=0.5, min_chunk_size=30)
+        throttle.after_chunk(1)
+        self.assertEqual(throttle.get_chunk_size(), 50)
+        throttle.after_chunk(1)
+        self.assertEqual(throttle.get_chunk_size(), 30)
+
+    def test_chunk_size_grows_on_low_latency(self):
+        """
+        Asserts that chunks grow well below the target latency, up to the
+        maximal size
+        """
+        throttle = Throttle(100, target_latency=0.5, max_chunk_size=140)
+        throttle.after_chunk(0.1)
+        self.assertEqual(throttle.get_chunk_size(), 125)
+        throttle.after_chunk(0.1)
+        self.assertEqual(throttle.get_chunk_size(), 140)
+        throttle.after_chunk(0.4)
+        self.assertEqual(throttle.get_chunk_size(), 140)
+
+    def test_describe(self):
+        """
+        Asserts that the description has the chunk size, budget and
+        latency
+        """
+        throttle = Throttle(100, rows_per_second=500)
+        throttle.after_chunk(0.25)
+        self.assertEqual(
+            throttle.describe(),
+            'chunk size 100, budget 500 rows/s, last commit 250ms')
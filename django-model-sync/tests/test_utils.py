@@ -0,0 +1,184 @@
+from unittest import mock
+
+from apps.b3_migration.factories.switch_factory import SwitchFactory
+from apps.b3_migration.model_descriptors.registry import DescriptorRegistry
+from apps.b3_migration.models.switch import RetiredSwitch
+from apps.b3_migration.models.sync_mapping import SyncMapping
+from apps.b3_migration.sync import utils
+from apps.b3_migration.sync.mappings import (
+    GenericMappingStore,
+    get_mapping_store,
+)
+from apps.b3_migration.sync.utils import (
+    build_target_model_dict,
+    sync_source_and_target_models,
+    translate_foreign_keys,
+)
+from apps.b3_migration.tests.descriptors import (
+    RETIRED_SWITCH_DESCRIPTOR,
+    SWITCH_DESCRIPTOR,
+)
+from apps.b3_organization.models.organization import Organization
+from apps.b3_tests.testcases import B3TestCase
+
+OLD_ORGANIZATION_DESCRIPTOR = {
+    'app_name': 'b3_organization',
+    'model_name': 'Organization',
+    'mapping_name': 'organization',
+    'mapping_side': 'source',
+}
+
+NEW_ORGANIZATION_DESCRIPTOR = {
+    'app_name': 'b3_organization',
+    'model_name': 'Organization',
+    'mapping_name': 'organization',
+    'mapping_side': 'target',
+}
+
+TRANSLATED_RETIRED_SWITCH_DESCRIPTOR = {
+    **RETIRED_SWITCH_DESCRIPTOR,
+    'fields_translated': [
+        ('organization_id', 'organization_id', 'organizations'),
+    ],
+}
+
+
+class SyncSourceAndTargetModelsTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.switch = SwitchFactory()
+        self.mapping_store = get_mapping_store(
+            SWITCH_DESCRIPTOR, RETIRED_SWITCH_DESCRIPTOR)
+
+    def _sync(self, update):
+        return sync_source_and_target_models(
+            self.switch,
+            SWITCH_DESCRIPTOR,
+            RETIRED_SWITCH_DESCRIPTOR,
+            'TEST',
+            update=update,
+        )
+
+    def test_create_and_update(self):
+        """
+        Asserts that the target is created and mapped, then updated through
+        its mapping
+        """
+        target = self._sync(update=False)
+        self.switch.active = not self.switch.active
+
+        updated_target = self._sync(update=True)
+
+        self.assertEqual(updated_target.pk, target.pk)
+        self.assertEqual(updated_target.active, self.switch.active)
+        self.assertEqual(
+            self.mapping_store.get_target_pk(self.switch.pk), target.pk)
+
+    def test_target_deleted_behind_mapping(self):
+        """
+        Asserts that the stale mapping of a target deleted behind it is
+        replaced by the mapping of a new target
+        """
+        target = self._sync(update=False)
+        RetiredSwitch.objects.filter(pk=target.pk).delete()
+
+        new_target = self._sync(update=True)
+
+        self.assertTrue(
+            RetiredSwitch.objects.filter(pk=new_target.pk).exists())
+        self.assertEqual(
+            self.mapping_store.get_target_pk(self.switch.pk), new_target.pk)
+        self.assertEqual(
+            SyncMapping.objects.filter(source_pk=self.switch.pk).count(), 1)
+
+    def test_synced_concurrently(self):
+        """
+        Asserts that when another process maps the source instance first,
+        the duplicate target is deleted and the winner's target updated
+        """
+        winner = RetiredSwitch.objects.create(
+            organization_id=self.switch.organization_id,
+            feature=self.switch.feature,
+            active=not self.switch.active,
+            creation_date=self.switch.creation_date,
+            last_modified=self.switch.last_modified,
+        )
+        claim = GenericMappingStore.claim
+
+        def claim_after_winner(mapping_store, source_pk, target_pk):
+            mapping_store.create(source_pk, winner.pk)
+            return claim(mapping_store, source_pk, target_pk)
+
+        with mock.patch.object(
+                GenericMappingStore, 'claim', claim_after_winner):
+            target = self._sync(update=False)
+
+        self.assertEqual(target.pk, winner.pk)
+        self.assertEqual(target.active, self.switch.active)
+        self.assertEqual(
+            list(RetiredSwitch.objects.filter(
+                organization_id=self.switch.organization_id,
+                feature=self.switch.feature,
+            ).values_list('pk', flat=True)),
+            [winner.pk]
+        )
+
+
+class TranslateForeignKeysTests(B3TestCase):
+    def setUp(self):
+        super().setUp()
+
+        registry = DescriptorRegistry()
+        registry.register(
+            OLD_ORGANIZATION_DESCRIPTOR, NEW_ORGANIZATION_DESCRIPTOR,
+            'organizations')
+        registry.compile()
+        patcher = mock.patch.object(utils, 'registry', registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.organization, self.other_organization = \
+            Organization.objects.all()[:2]
+        self.switches = [
+            SwitchFactory(organization=self.organization),
+            SwitchFactory(organization=self.other_organization),
+        ]
+        self.mapping_store = get_mapping_store(
+            OLD_ORGANIZATION_DESCRIPTOR, NEW_ORGANIZATION_DESCRIPTOR)
+        self.mapping_store.bulk_create([
+            (self.organization.pk, self.other_organization.pk),
+        ])
+
+    def test_translate_foreign_keys(self):
+        """
+        Asserts that the foreign keys of all source instances are
+        translated through the mappings of the related pair with a single
+        query
+        """
+        with self.assertNumQueries(1):
+            translations = translate_foreign_keys(
+                self.switches, TRANSLATED_RETIRED_SWITCH_DESCRIPTOR)
+
+        self.assertEqual(translations, {
+            'organizations': {
+                self.organization.pk: self.other_organization.pk,
+            },
+        })
+        target_model_dict = build_target_model_dict(
+            self.switches[0], TRANSLATED_RETIRED_SWITCH_DESCRIPTOR, 'TEST',
+            translations=translations)
+        self.assertEqual(
+            target_model_dict['organization_id'],
+            self.other_organization.pk)
+
+    def test_missing_related_mapping(self):
+        """
+        Asserts that a foreign key whose related instance is not synced
+        yet cannot be translated
+        """
+        with self.assertRaisesMessage(
+                ValueError, 'is not synced through organizations yet'):
+            build_target_model_dict(
+                self.switches[1], TRANSLATED_RETIRED_SWITCH_DESCRIPTOR,
+                'TEST')